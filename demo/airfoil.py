@@ -79,11 +79,26 @@ def main(opt):
         print "Failed reading mesh: Could not read from %s\n" % opt['mesh']
         sys.exit(1)
 
+    if opt['renumber']:
+        # Renumber nodes and cells with reverse Cuthill-McKee, then
+        # edges and boundary edges by the cells they touch
+        from pyop2 import renumbering
+        renumbering.renumber(renumbering.rcm(nodes, [pcell]),
+                             maps=[pedge, pbedge, pcell], dats=[p_x])
+        renumbering.renumber(renumbering.rcm(cells, [pcell]),
+                             maps=[pcell, pecell, pevcell, pbecell, pbevcell],
+                             dats=[p_q, p_qold, p_adt, p_res])
+        renumbering.renumber(renumbering.rcm(edges, [pecell]),
+                             maps=[pedge, pecell, pevcell])
+        renumbering.renumber(renumbering.rcm(bedges, [pbecell]),
+                             maps=[pbedge, pbecell, pbevcell], dats=[p_bound])
+
     # Main time-marching loop
 
     niter = 1000
+    rms = op2.Global(1, 0.0, np.double, "rms")
 
-    for i in range(1, niter + 1):
+    def step():
 
         # Save old flow solution
         op2.par_loop(save_soln, cells,
@@ -121,18 +136,28 @@ def main(opt):
                          p_res(op2.INC, pbevcell[0]),
                          p_bound(op2.READ))
 
-            # Update flow field
-            rms = op2.Global(1, 0.0, np.double, "rms")
+            # Update flow field, reset the residual first so that the
+            # reset is also captured
+            rms.zero()
             op2.par_loop(update, cells,
                          p_qold(op2.READ),
                          p_q(op2.WRITE),
                          p_res(op2.RW),
                          p_adt(op2.READ),
                          rms(op2.INC))
+
+    if opt['capture']:
+        # Record the loops of one step, replay them afterwards
+        with op2.capture() as captured:
+            step()
+        step = captured.replay
+
+    for i in range(1, niter + 1):
+        if i > 1 or not opt['capture']:
+            step()
         # Print iteration history
-        rms = sqrt(rms.data / cells.size)
         if i % 100 == 0:
-            print " %d  %10.5e " % (i, rms)
+            print " %d  %10.5e " % (i, sqrt(rms.data / cells.size))
 
 if __name__ == '__main__':
     parser = utils.parser(group=True, description="PyOP2 airfoil demo")
@@ -140,6 +165,10 @@ if __name__ == '__main__':
                         help='HDF5 mesh file to use (default: meshes/new_grid.h5)')
     parser.add_argument('-p', '--profile', action='store_true',
                         help='Create a cProfile for the run')
+    parser.add_argument('-r', '--renumber', action='store_true',
+                        help='Renumber the mesh for locality of indirect accesses')
+    parser.add_argument('-c', '--capture', action='store_true',
+                        help='Capture the loops of a time step once and replay them')
     opt = vars(parser.parse_args())
     op2.init(**opt)
 
@@ -0,0 +1,108 @@
+# This file is part of PyOP2
+#
+# PyOP2 is Copyright (c) 2012, Imperial College London and
+# others. Please see the AUTHORS file in the main source directory for
+# a full list of copyright holders.  All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * The name of Imperial College London or that of other
+#       contributors may not be used to endorse or promote products
+#       derived from this software without specific prior written
+#       permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTERS
+# ''AS IS'' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDERS OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED
+# OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Compare colouring and atomic increments for the airfoil res_calc loop
+with the OpenMP backend.
+
+The number of threads is set with ``OMP_NUM_THREADS``."""
+
+from __future__ import absolute_import, print_function, division
+import h5py
+import numpy as np
+from time import time
+
+from pyop2 import op2, utils
+
+
+def res_calc(opt, atomic_inc):
+    from airfoil_kernels import res_calc
+
+    with h5py.File(opt['mesh'], 'r') as f:
+        nodes = op2.Set.fromhdf5(f, "nodes")
+        edges = op2.Set.fromhdf5(f, "edges")
+        cells = op2.Set.fromhdf5(f, "cells")
+
+        pedge = op2.Map.fromhdf5(edges, nodes, f, "pedge")
+        pecell = op2.Map.fromhdf5(edges, cells, f, "pecell")
+
+        p_x = op2.Dat.fromhdf5(nodes ** 2, f, "p_x")
+        p_q = op2.Dat.fromhdf5(cells ** 4, f, "p_q")
+        p_adt = op2.Dat.fromhdf5(cells, f, "p_adt")
+        p_res = op2.Dat(cells ** 4, dtype=np.float64)
+
+        for name in ["gam", "gm1", "cfl", "eps", "mach", "alpha", "qinf"]:
+            op2.Global.fromhdf5(f, name)
+
+    def loop():
+        return op2.par_loop(res_calc, edges,
+                            p_x(op2.READ, pedge[0]),
+                            p_x(op2.READ, pedge[1]),
+                            p_q(op2.READ, pecell[0]),
+                            p_q(op2.READ, pecell[1]),
+                            p_adt(op2.READ, pecell[0]),
+                            p_adt(op2.READ, pecell[1]),
+                            p_res(op2.INC, pecell[0]),
+                            p_res(op2.INC, pecell[1]),
+                            atomic_inc=atomic_inc)
+
+    # Warm up: code generation, compilation and the execution plan
+    pl = loop()
+    p_res.data_ro
+    start = time()
+    for i in range(opt['iterations']):
+        loop()
+    p_res.data_ro
+    elapsed = time() - start
+    return elapsed, pl._plan, p_res.data_ro.copy()
+
+
+def main(opt):
+    t_col, plan, res_col = res_calc(opt, atomic_inc=False)
+    t_atomic, _, res_atomic = res_calc(opt, atomic_inc=True)
+    print("colours: %d, blocks: %d" % (plan.ncolours, plan.nblocks))
+    print("coloured: %.4fs, atomic: %.4fs (%d iterations)" %
+          (t_col, t_atomic, opt['iterations']))
+    print("max difference: %g" % abs(res_col - res_atomic).max())
+
+
+if __name__ == '__main__':
+    parser = utils.parser(group=True, description="Benchmark atomic increments "
+                          "against colouring for the airfoil res_calc loop")
+    parser.add_argument('-m', '--mesh', default='meshes/new_grid.h5',
+                        help='HDF5 mesh file to use (default: meshes/new_grid.h5)')
+    parser.add_argument('-n', '--iterations', type=int, default=100,
+                        help='Number of res_calc invocations to time (default: 100)')
+    opt = vars(parser.parse_args())
+    op2.init(openmp=True, **opt)
+
+    main(opt)
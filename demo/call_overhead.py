@@ -0,0 +1,90 @@
+# This file is part of PyOP2
+#
+# PyOP2 is Copyright (c) 2012, Imperial College London and
+# others. Please see the AUTHORS file in the main source directory for
+# a full list of copyright holders.  All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * The name of Imperial College London or that of other
+#       contributors may not be used to endorse or promote products
+#       derived from this software without specific prior written
+#       permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTERS
+# ''AS IS'' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDERS OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED
+# OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""Measure the overhead of calling the generated code of a par_loop with
+many arguments, with each argument converted by ctypes and with all
+arguments packed into one array (the ``packed_args`` configuration
+option)."""
+
+from __future__ import absolute_import, print_function, division
+import numpy as np
+from time import time
+
+from pyop2 import op2, utils
+from pyop2.configuration import configuration
+
+
+def main(opt):
+    n = opt['dats']
+    s = op2.Set(1, "s")
+    t = op2.Set(1, "t")
+    m = op2.Map(s, t, 1, [0], "m")
+    dats = [op2.Dat(t, dtype=np.float64, name="d%d" % i) for i in range(n)]
+    k = op2.Kernel("void k(%s) { %s }" %
+                   (", ".join("double *a%d" % i for i in range(n)),
+                    " ".join("a%d[0] += 1.0;" % i for i in range(n))), "k")
+
+    for packed in [False, True]:
+        configuration['packed_args'] = packed
+        loop = op2.ParLoopHandle(k, s, *[d(op2.INC, m[0]) for d in dats])
+        loop()
+        dats[0].data_ro
+        fun = loop.loop._jitmodule
+        arglist = loop.loop._packed_arglist if packed else loop.loop.arglist
+
+        start = time()
+        for i in range(opt['iterations']):
+            fun(0, 1, *arglist)
+        call = (time() - start) / opt['iterations']
+
+        start = time()
+        for i in range(opt['iterations']):
+            loop()
+            dats[0].data_ro
+        par_loop = (time() - start) / opt['iterations']
+        print("%s: %.2f us per wrapper call, %.2f us per par_loop" %
+              ("packed" if packed else "ctypes", call * 1e6, par_loop * 1e6))
+
+
+if __name__ == '__main__':
+    parser = utils.parser(group=True, description="Benchmark the call overhead "
+                          "of generated code with and without packed arguments")
+    parser.add_argument('-d', '--dats', type=int, default=20,
+                        help='Number of indirectly accessed Dats (default: 20)')
+    parser.add_argument('-n', '--iterations', type=int, default=100000,
+                        help='Number of calls to time (default: 100000)')
+    opt = vars(parser.parse_args())
+    op2.init(**opt)
+
+    main(opt)
@@ -0,0 +1,90 @@
+# This file is part of PyOP2
+#
+# PyOP2 is Copyright (c) 2012, Imperial College London and
+# others. Please see the AUTHORS file in the main source directory for
+# a full list of copyright holders.  All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * The name of Imperial College London or that of other
+#       contributors may not be used to endorse or promote products
+#       derived from this software without specific prior written
+#       permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTERS
+# ''AS IS'' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDERS OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED
+# OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""Measure the cost of forcing data out of long lazy traces.
+
+Each of the ``--loops`` par_loops reads one Dat and writes another,
+drawn from a pool of ``--dats`` Dats, so every Dat depends on a short
+chain of loops.  The Dats are then read back one by one, each read
+evaluating only the loops it depends on."""
+
+from __future__ import absolute_import, print_function, division
+import numpy as np
+from time import time
+
+from pyop2 import op2, utils
+from pyop2.base import _trace
+from pyop2.configuration import configuration
+
+
+def main(opt):
+    configuration['lazy_max_trace_length'] = 0
+    nodes = op2.Set(opt['size'], "nodes")
+    dats = [op2.Dat(nodes, np.ones(opt['size']), np.float64, "d%d" % i)
+            for i in range(opt['dats'])]
+    k = op2.Kernel("""
+void axpy(double *x, double *y) {
+  *y += 0.5 * *x;
+}""", "axpy")
+    # Warm up: code generation and compilation
+    op2.par_loop(k, nodes, dats[0](op2.READ), dats[1](op2.INC))
+    _trace.evaluate_all()
+
+    rng = np.random.RandomState(0)
+    for nloops in opt['loops']:
+        start = time()
+        for i in range(nloops):
+            x, y = rng.choice(len(dats), 2, replace=False)
+            op2.par_loop(k, nodes, dats[x](op2.READ), dats[y](op2.INC))
+        queued = time() - start
+        start = time()
+        for d in dats:
+            d.data_ro
+        print("%d loops: queued in %.3fs, forced in %.3fs" %
+              (nloops, queued, time() - start))
+
+
+if __name__ == '__main__':
+    parser = utils.parser(group=True, description="Benchmark forcing Dats "
+                          "out of long lazy traces")
+    parser.add_argument('-s', '--size', type=int, default=10,
+                        help='Size of the iteration set (default: 10)')
+    parser.add_argument('-d', '--dats', type=int, default=1000,
+                        help='Number of Dats written by the loops (default: 1000)')
+    parser.add_argument('-l', '--loops', type=int, nargs='+', default=[1000, 10000],
+                        help='Lengths of the traces to time (default: 1000 10000)')
+    opt = vars(parser.parse_args())
+    op2.init(**opt)
+
+    main(opt)
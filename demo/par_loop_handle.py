@@ -0,0 +1,90 @@
+# This file is part of PyOP2
+#
+# PyOP2 is Copyright (c) 2012, Imperial College London and
+# others. Please see the AUTHORS file in the main source directory for
+# a full list of copyright holders.  All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * The name of Imperial College London or that of other
+#       contributors may not be used to endorse or promote products
+#       derived from this software without specific prior written
+#       permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTERS
+# ''AS IS'' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDERS OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED
+# OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""Measure how many small indirect par_loops per second can be issued
+through op2.par_loop and through a reusable op2.ParLoopHandle."""
+
+from __future__ import absolute_import, print_function, division
+import numpy as np
+from time import time
+
+from pyop2 import op2, utils
+
+
+def main(opt):
+    n = opt['size']
+    nodes = op2.Set(n, "nodes")
+    edges = op2.Set(n, "edges")
+    edge2node = op2.Map(edges, nodes, 2,
+                        np.stack([np.arange(n), (np.arange(n) + 1) % n], axis=1),
+                        "edge2node")
+    x = op2.Dat(nodes, np.arange(n, dtype=np.float64), np.float64, "x")
+    y = op2.Dat(edges, dtype=np.float64, name="y")
+    k = op2.Kernel("""
+void diff(double *x[1], double *y) {
+  *y = x[1][0] - x[0][0];
+}""", "diff")
+
+    def args():
+        return (x(op2.READ, edge2node), y(op2.WRITE))
+
+    handle = op2.ParLoopHandle(k, edges, *args())
+    # Warm up: code generation and compilation
+    op2.par_loop(k, edges, *args())
+    handle()
+    y.data_ro
+
+    results = []
+    for name, call in [("par_loop", lambda: op2.par_loop(k, edges, *args())),
+                       ("ParLoopHandle", handle)]:
+        start = time()
+        for i in range(opt['iterations']):
+            call()
+            y.data_ro
+        results.append((name, opt['iterations'] / (time() - start)))
+    for name, rate in results:
+        print("%s: %.0f calls/s" % (name, rate))
+
+
+if __name__ == '__main__':
+    parser = utils.parser(group=True, description="Benchmark issuing par_loops "
+                          "through op2.par_loop and op2.ParLoopHandle")
+    parser.add_argument('-s', '--size', type=int, default=100,
+                        help='Size of the iteration set (default: 100)')
+    parser.add_argument('-n', '--iterations', type=int, default=10000,
+                        help='Number of par_loop calls to time (default: 10000)')
+    opt = vars(parser.parse_args())
+    op2.init(**opt)
+
+    main(opt)
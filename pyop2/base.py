@@ -39,13 +39,16 @@ from __future__ import absolute_import, print_function, division
 import six
 from six.moves import map, zip
 
+from collections import OrderedDict
 from contextlib import contextmanager
+from copy import copy
 import itertools
 import numpy as np
 import ctypes
 import numbers
 import operator
 import types
+import weakref
 from hashlib import md5
 
 from pyop2.datatypes import IntType, as_cstr
@@ -55,6 +58,7 @@ from pyop2.exceptions import *
 from pyop2.utils import *
 from pyop2.mpi import MPI, collective, dup_comm
 from pyop2.profiling import timed_region, timed_function
+from pyop2.logger import debug
 from pyop2.sparsity import build_sparsity
 from pyop2.version import __version__ as version
 
@@ -65,8 +69,11 @@ from functools import reduce
 
 
 def _make_object(name, *args, **kwargs):
-    from pyop2 import sequential
-    return getattr(sequential, name)(*args, **kwargs)
+    if configuration['openmp']:
+        from pyop2 import openmp as backend
+    else:
+        from pyop2 import sequential as backend
+    return getattr(backend, name)(*args, **kwargs)
 
 
 @contextmanager
@@ -86,6 +93,14 @@ class LazyComputation(object):
     """Helper class holding computation to be carried later on.
     """
 
+    _concurrent = False
+    """Can this computation be executed concurrently with independent
+    computations on a thread of the :class:`ExecutionTrace`?"""
+
+    _overwrites = frozenset()
+    """The :class:`DataCarrier`\s all values of which this computation
+    overwrites without reading them."""
+
     def __init__(self, reads, writes, incs):
         self.reads = set((x._parent if isinstance(x, DatView) else x)
                          for x in flatten(reads))
@@ -96,9 +111,16 @@ class LazyComputation(object):
         self._scheduled = False
 
     def enqueue(self):
+        """Queue this computation for lazy evaluation.
+
+        :returns: the queued computation: a copy of this one if it was
+            still pending."""
         if not LazyComputation.collecting_loops:
             global _trace
-            _trace.append(self)
+            _evaluate_expressions(self.reads, self.writes)
+            for captured in _captures:
+                captured._comps.append(self)
+            return _trace.append(self)
         return self
 
     __call__ = enqueue
@@ -106,40 +128,222 @@ class LazyComputation(object):
     def _run(self):
         assert False, "Not implemented"
 
+    def _prefetch(self):
+        """Start compiling the code of this computation in the
+        background, while it waits in the trace."""
+        pass
+
 
 class ExecutionTrace(object):
 
-    """Container maintaining delayed computation until they are executed."""
+    """Container maintaining delayed computation until they are executed.
+
+    For each :class:`DataCarrier`, the trace indexes the last delayed
+    computation writing it and the delayed computations reading it
+    since.  Each computation records, when it is appended, the earlier
+    computations it directly depends on, so forcing the evaluation of
+    some data only visits the computations it transitively depends
+    on rather than the whole trace."""
 
     def __init__(self):
-        self._trace = list()
+        self._pending = OrderedDict()
+        self._writer = {}
+        self._readers = {}
+        self._count = 0
+        self._pool = None
+        # Bytes of the data written by pending computations
+        self._nbytes = 0
+        # Computations dropped because everything they wrote was
+        # overwritten before being read
+        self.dead_stores = 0
+        # Number of times the trace was flushed, by reason
+        self.flushes = {"length": 0, "bytes": 0, "rss": 0}
+
+    @property
+    def _trace(self):
+        """The delayed computations, in order."""
+        return list(self._pending)
+
+    @_trace.setter
+    def _trace(self, trace):
+        self.clear()
+        for comp in trace:
+            self._push(comp)
 
     def append(self, computation):
+        """Queue a delayed computation, or execute it if lazy evaluation
+        is disabled.
+
+        :returns: the computation queued, see :meth:`_push`."""
         if not configuration['lazy_evaluation']:
-            assert not self._trace
+            assert not self._pending
             computation._run()
-        elif configuration['lazy_max_trace_length'] > 0 and \
-                configuration['lazy_max_trace_length'] == len(self._trace):
-            # Garbage collect trace (stop the world)
-            self.evaluate_all()
-            self._trace.append(computation)
         else:
-            self._trace.append(computation)
+            reason = self._flush_reason()
+            if reason is not None:
+                # Garbage collect trace (stop the world)
+                debug("Flushing lazy trace of %d computations (%s)" % (len(self._pending), reason))
+                self.flushes[reason] += 1
+                self.evaluate_all()
+            computation = self._push(computation)
+            if configuration['compile_threads'] > 0:
+                computation._prefetch()
+        return computation
+
+    def _flush_reason(self):
+        """Why the trace should be evaluated before queueing more
+        computations, or ``None``.
+
+        Besides the number of pending computations, the trace is
+        flushed when the data they write, which they keep alive,
+        exceeds ``configuration['lazy_max_trace_bytes']``, or when
+        the resident memory of the process exceeds
+        ``configuration['lazy_max_rss']``."""
+        if not self._pending:
+            return None
+        max_length = configuration['lazy_max_trace_length']
+        if max_length > 0 and len(self._pending) >= max_length:
+            return "length"
+        max_bytes = configuration['lazy_max_trace_bytes']
+        if max_bytes > 0 and self._nbytes >= max_bytes:
+            return "bytes"
+        max_rss = configuration['lazy_max_rss']
+        if max_rss > 0 and resident_memory() >= max_rss:
+            return "rss"
+        return None
+
+    def _push(self, comp):
+        """Add a delayed computation to the trace, and return it.  A
+        computation which is still pending is copied, see
+        :meth:`ParLoopHandle.__call__`."""
+        if comp in self._pending:
+            # Queued again before being executed (e.g. the cached loop
+            # of Dat.zero): queue a copy sharing the compiled code.
+            comp = copy(comp)
+        inherited = []
+        if configuration['dead_store_elimination']:
+            for d in comp._overwrites:
+                inherited.extend(self._eliminate(d))
+        comp._deps = self._depends(comp.reads, comp.writes) + inherited
+        comp._seq = self._count
+        self._count += 1
+        for d in comp.writes:
+            if d not in self._writer:
+                self._nbytes += d.nbytes
+            self._writer[d] = comp
+            self._readers.pop(d, None)
+        for d in comp.reads - comp.writes:
+            self._readers.setdefault(d, set()).add(comp)
+        self._pending[comp] = None
+        return comp
+
+    def _eliminate(self, d):
+        """Drop the pending last writer of ``d`` if it writes nothing
+        else and ``d`` has not been read since.
+
+        :returns: the dependencies of the dropped writer, which must
+            still be executed before the computation overwriting ``d``:
+            earlier writers of ``d`` are no longer indexed by the trace,
+            but would otherwise be executed after it."""
+        writer = self._writer.get(d)
+        if writer is None or self._readers.get(d) or writer.writes != set([d]):
+            return []
+        deps = list(writer._deps)
+        self._pop(writer)
+        self.dead_stores += 1
+        return deps
+
+    def _depends(self, reads, writes):
+        """The delayed computations which must be executed before
+        reading ``reads`` and writing ``writes``.  Earlier writers and
+        readers are reached through the dependencies of these."""
+        deps = []
+        for d in reads | writes:
+            if d in self._writer:
+                deps.append(self._writer[d])
+        for d in writes:
+            deps.extend(self._readers.get(d, ()))
+        return deps
+
+    def _pop(self, comp):
+        """Remove an executed computation from the trace."""
+        del self._pending[comp]
+        comp._deps = ()
+        for d in comp.writes:
+            if self._writer.get(d) is comp:
+                del self._writer[d]
+                self._nbytes -= d.nbytes
+        for d in comp.reads - comp.writes:
+            readers = self._readers.get(d)
+            if readers is not None:
+                readers.discard(comp)
+                if not readers:
+                    del self._readers[d]
 
     def in_queue(self, computation):
-        return computation in self._trace
+        return computation in self._pending
 
     def clear(self):
         """Forcefully drops delayed computation. Only use this if you know what you
         are doing.
         """
-        self._trace = list()
+        for comp in self._pending:
+            comp._deps = ()
+        self._pending = OrderedDict()
+        self._writer = {}
+        self._readers = {}
+        self._nbytes = 0
 
     def evaluate_all(self):
         """Forces the evaluation of all delayed computations."""
-        for comp in self._trace:
-            comp._run()
-        self._trace = list()
+        to_run = self._trace
+        self.clear()
+        self._run(to_run)
+
+    def _run(self, to_run):
+        """Execute a list of delayed computations.
+
+        If ``configuration['loop_threads'] > 1``, computations which
+        are independent of each other are executed concurrently on a
+        pool of threads.  The compiled code releases the GIL, so this
+        keeps several cores busy with small loops.  Otherwise, if
+        ``configuration['compile_trace']`` is set, sequences of loops
+        are executed through a single compiled entry point, see
+        :mod:`pyop2.trace`.
+
+        If ``configuration['batch_compilation']`` is set, the code of
+        the loops which is not compiled yet is first built into one
+        shared library."""
+        if configuration['batch_compilation'] and len(to_run) > 1:
+            from pyop2.sequential import compile_batch
+            compile_batch(to_run)
+        nthreads = configuration['loop_threads']
+        if nthreads < 2 or len(to_run) < 2:
+            if configuration['compile_trace']:
+                from pyop2.trace import run
+                run(to_run)
+                return
+            for comp in to_run:
+                comp._run()
+            return
+        if self._pool is None or self._pool._processes != nthreads:
+            from multiprocessing.pool import ThreadPool
+            if self._pool is not None:
+                self._pool.terminate()
+            self._pool = ThreadPool(nthreads)
+        for level in _concurrent_levels(to_run):
+            if len(level) == 1:
+                level[0]._run()
+                continue
+            # Code generation, compilation, timing and updates of the
+            # state of the data happen on this thread, the workers only
+            # execute compiled code.
+            for comp in level:
+                comp._start_concurrent()
+            with timed_region("ParLoopExecute"):
+                self._pool.map(lambda comp: comp._compute_concurrent(), level)
+            for comp in level:
+                comp._finish_concurrent()
 
     def evaluate(self, reads=None, writes=None):
         """Force the evaluation of delayed computation on which reads and writes
@@ -167,31 +371,55 @@ class ExecutionTrace(object):
                 writes = set([writes])
         else:
             writes = set()
+        _evaluate_expressions(reads, writes)
 
-        def _depends_on(reads, writes, cont):
-            return reads & cont.writes or writes & cont.reads or writes & cont.writes
-
-        for comp in reversed(self._trace):
-            if _depends_on(reads, writes, comp):
-                comp._scheduled = True
-                reads = reads | comp.reads - comp.writes
-                writes = writes | comp.writes
-            else:
-                comp._scheduled = False
+        scheduled = set()
+        stack = self._depends(reads, writes)
+        while stack:
+            comp = stack.pop()
+            if comp in scheduled or comp not in self._pending:
+                continue
+            comp._scheduled = True
+            scheduled.add(comp)
+            stack.extend(comp._deps)
 
-        to_run, new_trace = list(), list()
-        for comp in self._trace:
-            if comp._scheduled:
-                to_run.append(comp)
-            else:
-                new_trace.append(comp)
-        self._trace = new_trace
+        to_run = sorted(scheduled, key=operator.attrgetter('_seq'))
+        for comp in to_run:
+            self._pop(comp)
 
         if configuration['loop_fusion']:
             from pyop2.fusion.interface import fuse, lazy_trace_name
             to_run = fuse(lazy_trace_name, to_run)
-        for comp in to_run:
-            comp._run()
+        self._run(to_run)
+
+
+def _concurrent_levels(comps):
+    """Split a list of delayed computations into levels of
+    computations which can be executed concurrently.
+
+    Executing the levels in order, one after another, is equivalent to
+    executing ``comps`` in order.  A computation which cannot be
+    executed concurrently always forms a level of its own."""
+    def _conflict(a, b):
+        return a.writes & (b.reads | b.writes) or a.reads & b.writes
+
+    levels = []
+    first = 0
+    for comp in comps:
+        if not comp._concurrent:
+            levels.append([comp])
+            first = len(levels)
+            continue
+        level = first
+        for i in range(len(levels) - 1, first - 1, -1):
+            if any(_conflict(comp, other) for other in levels[i]):
+                level = i + 1
+                break
+        if level == len(levels):
+            levels.append([comp])
+        else:
+            levels[level].append(comp)
+    return levels
 
 
 _trace = ExecutionTrace()
@@ -974,6 +1202,27 @@ class Subset(ExtrudedSet):
         """Returns the indices pointing in the superset."""
         return self._indices
 
+    @cached_property
+    def _ranges(self):
+        """The indices as runs of contiguous elements, or ``None`` if
+        the runs are too short for iterating over them to pay off.
+
+        Row ``r`` holds the position in the subset and the index in
+        the superset of the first element of run ``r``.  A final row
+        holds the number of elements, so that run ``r`` ends where
+        run ``r + 1`` starts."""
+        indices = self._indices
+        starts = np.flatnonzero(np.diff(indices) != 1) + 1
+        starts = np.concatenate(([0], starts)) if len(indices) else starts
+        # Each run costs about as much as a few indirections
+        if len(starts) == 0 or 4 * len(starts) > len(indices):
+            return None
+        ranges = np.empty((len(starts) + 1, 2), dtype=IntType)
+        ranges[:-1, 0] = starts
+        ranges[:-1, 1] = indices[starts]
+        ranges[-1] = len(indices), indices[-1] + 1
+        return ranges
+
     @cached_property
     def _argtype(self):
         """Ctypes argtype for this :class:`Subset`"""
@@ -1755,6 +2004,12 @@ class Dat(DataCarrier, _EmptyDataMixin):
     _globalcount = 0
     _modes = [READ, WRITE, RW, INC]
 
+    _expr = None
+    """Pending pointwise expression computing this :class:`Dat`."""
+
+    _expr_dependents = None
+    """The :class:`Dat`\s whose pending expressions read this one."""
+
     @validate_type(('dataset', (DataCarrier, DataSet, Set), DataSetTypeError),
                    ('name', str, NameTypeError))
     @validate_dtype(('dtype', None, DataTypeError))
@@ -2036,89 +2291,61 @@ class Dat(DataCarrier, _EmptyDataMixin):
             raise ValueError('Mismatched shapes in operands %s and %s',
                              self.dataset.dim, other.dataset.dim)
 
-    def _op(self, other, op):
-        ops = {operator.add: ast.Sum,
-               operator.sub: ast.Sub,
-               operator.mul: ast.Prod,
-               operator.truediv: ast.Div}
-        ret = _make_object('Dat', self.dataset, None, self.dtype)
-        name = "binop_%s" % op.__name__
+    @property
+    def _expression(self):
+        """The pending expression computing this :class:`Dat`, or the
+        :class:`Dat` itself."""
+        return self if self._expr is None else self._expr
+
+    def _set_expression(self, expr):
+        """Make this :class:`Dat` the lazily evaluated result of
+        ``expr``, see :func:`_evaluate_expressions`."""
+        self._expr = expr
+        for leaf in _expression_leaves(expr):
+            leaf = leaf._parent if isinstance(leaf, DatView) else leaf
+            if leaf._expr_dependents is None:
+                leaf._expr_dependents = weakref.WeakSet()
+            leaf._expr_dependents.add(self)
+
+    def _evaluate_expression(self):
+        """Compute the pending expression of this :class:`Dat`."""
+        expr, self._expr = self._expr, None
+        if expr is None:
+            return
+        for leaf in _expression_leaves(expr):
+            leaf = leaf._parent if isinstance(leaf, DatView) else leaf
+            leaf._expr_dependents.discard(self)
+        _assign_expression(self, expr, WRITE)
+
+    def _op(self, other, op, reverse=False):
         if np.isscalar(other):
-            other = _make_object('Global', 1, data=other)
-            k = ast.FunDecl("void", name,
-                            [ast.Decl(self.ctype, ast.Symbol("self"),
-                                      qualifiers=["const"], pointers=[""]),
-                             ast.Decl(other.ctype, ast.Symbol("other"),
-                                      qualifiers=["const"], pointers=[""]),
-                             ast.Decl(self.ctype, ast.Symbol("ret"), pointers=[""])],
-                            ast.c_for("n", self.cdim,
-                                      ast.Assign(ast.Symbol("ret", ("n", )),
-                                                 ops[op](ast.Symbol("self", ("n", )),
-                                                         ast.Symbol("other", ("0", )))),
-                                      pragma=None))
-
-            k = _make_object('Kernel', k, name)
+            other_expr = other
         else:
             self._check_shape(other)
-            k = ast.FunDecl("void", name,
-                            [ast.Decl(self.ctype, ast.Symbol("self"),
-                                      qualifiers=["const"], pointers=[""]),
-                             ast.Decl(other.ctype, ast.Symbol("other"),
-                                      qualifiers=["const"], pointers=[""]),
-                             ast.Decl(self.ctype, ast.Symbol("ret"), pointers=[""])],
-                            ast.c_for("n", self.cdim,
-                                      ast.Assign(ast.Symbol("ret", ("n", )),
-                                                 ops[op](ast.Symbol("self", ("n", )),
-                                                         ast.Symbol("other", ("n", )))),
-                                      pragma=None))
-
-            k = _make_object('Kernel', k, name)
-        par_loop(k, self.dataset.set, self(READ), other(READ), ret(WRITE))
+            other_expr = other._expression
+        ret = _make_object('Dat', self.dataset, None, self.dtype)
+        if reverse:
+            ret._set_expression((op, other_expr, self._expression))
+        else:
+            ret._set_expression((op, self._expression, other_expr))
         return ret
 
     def _iop(self, other, op):
-        ops = {operator.iadd: ast.Incr,
-               operator.isub: ast.Decr,
-               operator.imul: ast.IMul,
-               operator.itruediv: ast.IDiv}
-        name = "iop_%s" % op.__name__
+        ops = {operator.iadd: operator.add,
+               operator.isub: operator.sub,
+               operator.imul: operator.mul,
+               operator.itruediv: operator.truediv}
         if np.isscalar(other):
-            other = _make_object('Global', 1, data=other)
-            k = ast.FunDecl("void", name,
-                            [ast.Decl(self.ctype, ast.Symbol("self"), pointers=[""]),
-                             ast.Decl(other.ctype, ast.Symbol("other"),
-                                      qualifiers=["const"], pointers=[""])],
-                            ast.c_for("n", self.cdim,
-                                      ops[op](ast.Symbol("self", ("n", )),
-                                              ast.Symbol("other", ("0", ))),
-                                      pragma=None))
-            k = _make_object('Kernel', k, name)
+            other_expr = other
         else:
             self._check_shape(other)
-            quals = ["const"] if self is not other else []
-            k = ast.FunDecl("void", name,
-                            [ast.Decl(self.ctype, ast.Symbol("self"), pointers=[""]),
-                             ast.Decl(other.ctype, ast.Symbol("other"),
-                                      qualifiers=quals, pointers=[""])],
-                            ast.c_for("n", self.cdim,
-                                      ops[op](ast.Symbol("self", ("n", )),
-                                              ast.Symbol("other", ("n", ))),
-                                      pragma=None))
-            k = _make_object('Kernel', k, name)
-        par_loop(k, self.dataset.set, self(INC), other(READ))
-        return self
-
-    def _uop(self, op):
-        ops = {operator.sub: ast.Neg}
-        name = "uop_%s" % op.__name__
-        k = ast.FunDecl("void", name,
-                        [ast.Decl(self.ctype, ast.Symbol("self"), pointers=[""])],
-                        ast.c_for("n", self.cdim,
-                                  ast.Assign(ast.Symbol("self", ("n", )),
-                                             ops[op](ast.Symbol("self", ("n", )))),
-                                  pragma=None))
-        k = _make_object('Kernel', k, name)
-        par_loop(k, self.dataset.set, self(RW))
+            other_expr = other._expression
+        expr = (ops[op], self._expression, other_expr)
+        if self._expr is not None:
+            # Still pending: fold the update into the expression
+            self._set_expression(expr)
+        else:
+            _assign_expression(self, expr, RW)
         return self
 
     def inner(self, other):
@@ -2171,8 +2398,9 @@ class Dat(DataCarrier, _EmptyDataMixin):
         return self + other
 
     def __neg__(self):
-        neg = _make_object('Dat', self)
-        return neg._uop(operator.sub)
+        neg = _make_object('Dat', self.dataset, None, self.dtype)
+        neg._set_expression((operator.neg, self._expression))
+        return neg
 
     def __sub__(self, other):
         """Pointwise subtraction of fields."""
@@ -2182,9 +2410,7 @@ class Dat(DataCarrier, _EmptyDataMixin):
         """Pointwise subtraction of fields.
 
         self.__rsub__(other) <==> other - self."""
-        ret = -self
-        ret += other
-        return ret
+        return self._op(other, operator.sub, reverse=True)
 
     def __mul__(self, other):
         """Pointwise multiplication or scaling of fields."""
@@ -2256,6 +2482,103 @@ class Dat(DataCarrier, _EmptyDataMixin):
         return ret
 
 
+def _expression_leaves(expr):
+    """The :class:`Dat`\s read by a pointwise expression."""
+    if isinstance(expr, Dat):
+        yield expr
+    elif isinstance(expr, tuple):
+        for operand in expr[1:]:
+            for leaf in _expression_leaves(operand):
+                yield leaf
+
+
+def _evaluate_expressions(reads, writes):
+    """Compute the pending :class:`Dat` expressions which must be up
+    to date before the data carriers ``reads`` are read and ``writes``
+    are modified.
+
+    The arithmetic operators of :class:`Dat` do not execute a
+    :func:`par_loop` each: they return a :class:`Dat` holding the
+    pending expression, with operands which are pending themselves
+    folded in, so that ``a + b * c - d`` is computed by one generated
+    kernel without temporaries.  The expression is computed when its
+    result is accessed, or before one of its operands is modified."""
+    def dats(carriers):
+        for c in carriers:
+            for d in (c if isinstance(c, MixedDat) else [c]):
+                if isinstance(d, DatView):
+                    yield d._parent
+                elif isinstance(d, Dat):
+                    yield d
+
+    for d in dats(writes):
+        if d._expr_dependents:
+            for dependent in list(d._expr_dependents):
+                dependent._evaluate_expression()
+    for d in dats(itertools.chain(reads, writes)):
+        if d._expr is not None:
+            d._evaluate_expression()
+
+
+_expression_kernels = {}
+
+
+def _assign_expression(target, expr, access):
+    """Execute a :func:`par_loop` assigning ``expr`` to ``target``.
+
+    The generated :class:`Kernel` only depends on the shape of the
+    expression and the types of its operands, not on their values."""
+    ops = {operator.add: ast.Sum,
+           operator.sub: ast.Sub,
+           operator.mul: ast.Prod,
+           operator.truediv: ast.Div,
+           operator.neg: ast.Neg}
+    dats = []
+    scalars = []
+
+    def shape(e):
+        if e is target:
+            return "ret"
+        if isinstance(e, Dat):
+            for i, d in enumerate(dats):
+                if d is e:
+                    return ("d", i)
+            dats.append(e)
+            return ("d", len(dats) - 1)
+        if isinstance(e, tuple):
+            return (e[0], ) + tuple(shape(o) for o in e[1:])
+        scalars.append(_make_object('Global', 1, data=e))
+        return ("s", len(scalars) - 1)
+
+    expr_shape = shape(expr)
+    key = (expr_shape, target.cdim, target.ctype, access,
+           tuple(d.ctype for d in dats), tuple(g.ctype for g in scalars))
+    k = _expression_kernels.get(key)
+    if k is None:
+        def build(e):
+            if e == "ret":
+                return ast.Symbol("ret", ("n", ))
+            if e[0] == "d":
+                return ast.Symbol("d%d" % e[1], ("n", ))
+            if e[0] == "s":
+                return ast.Symbol("s%d" % e[1], ("0", ))
+            return ops[e[0]](*[build(o) for o in e[1:]])
+
+        decls = [ast.Decl(d.ctype, ast.Symbol("d%d" % i), qualifiers=["const"], pointers=[""])
+                 for i, d in enumerate(dats)]
+        decls += [ast.Decl(g.ctype, ast.Symbol("s%d" % i), qualifiers=["const"], pointers=[""])
+                  for i, g in enumerate(scalars)]
+        decls.append(ast.Decl(target.ctype, ast.Symbol("ret"), pointers=[""]))
+        k = ast.FunDecl("void", "expression", decls,
+                        ast.c_for("n", target.cdim,
+                                  ast.Assign(ast.Symbol("ret", ("n", )), build(expr_shape)),
+                                  pragma=None))
+        k = _make_object('Kernel', k, "expression")
+        _expression_kernels[key] = k
+    args = [d(READ) for d in dats] + [g(READ) for g in scalars] + [target(access)]
+    par_loop(k, target.dataset.set, *args)
+
+
 class DatView(Dat):
     """An indexed view into a :class:`Dat`.
 
@@ -2713,6 +3036,7 @@ class Global(DataCarrier, _EmptyDataMixin):
         def __init__(self, g):
             super(Global.Zero, self).__init__(reads=[], writes=[g], incs=[])
             self.g = g
+            self._overwrites = frozenset([g])
 
         def _run(self):
             self.g._data[...] = 0
@@ -4147,6 +4471,44 @@ class ParLoop(LazyComputation):
             self.reduction_end()
             self.update_arg_data_state()
 
+    @cached_property
+    def _parts(self):
+        """The parts of the iteration set, in the order in which
+        :meth:`compute` executes them."""
+        iterset = self.iterset
+        parts = [iterset.core_part, iterset.owned_part]
+        if self.needs_exec_halo:
+            parts.append(iterset.exec_part)
+        return parts
+
+    def _start_concurrent(self):
+        """Prepare to execute this loop with :meth:`_compute_concurrent`.
+
+        Called on the main thread.  Only loops which neither
+        communicate nor reduce are executed concurrently, so the halo
+        exchanges do nothing but update the state of the data."""
+        self.halo_exchange_begin()
+        self.halo_exchange_end()
+
+    def _compute_concurrent(self):
+        """Execute the compiled code over the iteration set.
+
+        Called on a worker thread, concurrently with other loops: only
+        the compiled code runs, with the GIL released.  Timing, flop
+        logging and updates of the state of the data are left to
+        :meth:`_finish_concurrent`."""
+        raise RuntimeError("Must select a backend")
+
+    def _finish_concurrent(self):
+        """Complete the execution of this loop by
+        :meth:`_compute_concurrent`.  Called on the main thread."""
+        if self._only_local:
+            self.reverse_halo_exchange_begin()
+            self.reverse_halo_exchange_end()
+        for part in self._parts:
+            self.log_flops()
+        self.update_arg_data_state()
+
     @collective
     def _compute(self, part, fun, *arglist):
         """Executes the kernel over all members of a MPI-part of the iteration space.
@@ -4244,6 +4606,23 @@ class ParLoop(LazyComputation):
     def global_reduction_args(self):
         return [arg for arg in self.args if arg._is_global_reduction]
 
+    @cached_property
+    def _concurrent(self):
+        # Neither MPI communication nor PETSc matrix insertion may
+        # happen concurrently.
+        return self.comm.size == 1 and \
+            not any(arg._is_mat or arg._is_global_reduction for arg in self.args)
+
+    @cached_property
+    def _overwrites(self):
+        # Direct WRITE arguments over a whole (non-extruded) Set
+        if type(self.iterset) is not Set:
+            return frozenset()
+        return frozenset(arg.data for arg in self.args
+                         if arg._is_direct and not arg._is_dat_view and
+                         arg.access is WRITE and arg.data not in self.reads and
+                         arg.data.dataset.set is self.iterset)
+
     @cached_property
     def layer_arg(self):
         """The layer arg that needs to be added to the argument list."""
@@ -4397,6 +4776,10 @@ def par_loop(kernel, it_space, *args, **kwargs):
     :kwarg pass_layer_arg: Should the wrapper pass the current layer
         into the kernel (as an ``int``). Only makes sense for
         indirect extruded iteration.
+    :kwarg atomic_inc: Should indirect increments into :class:`Dat`\s
+        be applied with atomic operations instead of colouring the
+        iteration set?  Only used by the OpenMP backend, defaults to
+        the ``openmp_atomics`` configuration option.
 
     .. warning ::
         It is the caller's responsibility that the number and type of all
@@ -4435,7 +4818,113 @@ def par_loop(kernel, it_space, *args, **kwargs):
     ``elem_node`` for the relevant member of ``elements`` will be
     passed to the kernel as a vector.
     """
+    return _build_par_loop(kernel, it_space, *args, **kwargs).enqueue()
+
+
+def _build_par_loop(kernel, it_space, *args, **kwargs):
+    """Build, but do not enqueue, the :class:`ParLoop` for
+    :func:`par_loop`."""
     if isinstance(kernel, types.FunctionType):
         from pyop2 import pyparloop
-        return pyparloop.ParLoop(pyparloop.Kernel(kernel), it_space, *args, **kwargs).enqueue()
-    return _make_object('ParLoop', kernel, it_space, *args, **kwargs).enqueue()
+        return pyparloop.ParLoop(pyparloop.Kernel(kernel), it_space, *args, **kwargs)
+    return _make_object('ParLoop', kernel, it_space, *args, **kwargs)
+
+
+class ParLoopHandle(object):
+
+    """A :func:`par_loop` which is built once and can be executed
+    repeatedly.
+
+    Takes the same arguments as :func:`par_loop`.  Type checking of the
+    arguments, building of the iteration space and of the argument list
+    for the generated code and lookup of the compiled code happen only
+    once, rather than on every :func:`par_loop` call, which matters for
+    loops over small sets inside a time loop::
+
+        loop = op2.ParLoopHandle(kernel, cells, q(op2.RW), res(op2.READ))
+        for step in range(nsteps):
+            loop()
+
+    Calling the handle is equivalent to calling :func:`par_loop` with
+    the same arguments: the loop is enqueued for lazy evaluation and
+    its dependencies on other delayed computations are tracked as
+    usual.  The data carriers are bound when the handle is built, so
+    they must not be reallocated afterwards."""
+
+    def __init__(self, kernel, it_space, *args, **kwargs):
+        self._loop = _build_par_loop(kernel, it_space, *args, **kwargs)
+
+    def __call__(self):
+        """Enqueue the loop for execution.
+
+        :returns: the enqueued :class:`ParLoop`: a copy sharing the
+            compiled code and arguments if the loop is still waiting
+            to be executed."""
+        return self._loop.enqueue()
+
+    @property
+    def loop(self):
+        """The :class:`ParLoop` executed by this handle."""
+        return self._loop
+
+
+class CapturedLoops(object):
+
+    """The delayed computations queued within a :func:`capture`
+    context, which can be executed again with :meth:`replay`."""
+
+    def __init__(self):
+        self._comps = []
+        self._schedule = None
+
+    def __len__(self):
+        return len(self._comps)
+
+    @collective
+    def replay(self):
+        """Execute the recorded computations again, in order.
+
+        Computations still pending in the lazy evaluation trace are
+        executed first.  The recorded computations then run
+        immediately, without building :class:`ParLoop`\s or analysing
+        the trace; consecutive loops run through one native call (see
+        :mod:`pyop2.trace`).  Loops which communicate perform their
+        halo exchanges and reductions as usual, so all processes must
+        replay together."""
+        # The recorded computations are not enqueued: compute first the
+        # pending expressions which they would invalidate
+        _evaluate_expressions(set().union(*(c.reads for c in self._comps)),
+                              set().union(*(c.writes for c in self._comps)))
+        _trace.evaluate_all()
+        if self._schedule is None:
+            from pyop2.trace import schedule
+            self._schedule = schedule(self._comps)
+        for call in self._schedule:
+            call()
+
+
+_captures = []
+
+
+@contextmanager
+def capture():
+    """Record the delayed computations queued within the context::
+
+        with op2.capture() as step:
+            timestep()
+        for i in range(nsteps):
+            step.replay()
+
+    The computations queued within the context are executed as usual,
+    and :meth:`CapturedLoops.replay` executes them again.  As for a
+    :class:`ParLoopHandle`, data carriers are bound when the loops are
+    built and must not be reallocated afterwards.  Setting the values
+    of a :class:`Global` (``g.data = value``) between replays is
+    picked up by the next replay.  Anything else happening within the
+    context, such as reading the values of data, is not recorded."""
+    captured = CapturedLoops()
+    _captures.append(captured)
+    try:
+        yield captured
+    finally:
+        _captures.remove(captured)
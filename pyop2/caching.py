@@ -35,16 +35,21 @@
 
 from __future__ import absolute_import, print_function, division
 
+from collections import defaultdict
 from pyop2.utils import cached_property
 
 
+cache_stats = defaultdict(lambda: {"hits": 0, "misses": 0})
+"""Hits and misses of the caches of :class:`Cached` objects, by class
+name, see :func:`~.compilation.compilation_stats`."""
+
+
 def report_cache(typ):
     """Report the size of caches of type ``typ``
 
     :arg typ: A class of cached object.  For example
         :class:`ObjectCached` or :class:`Cached`.
     """
-    from collections import defaultdict
     from inspect import getmodule
     from gc import get_objects
     typs = defaultdict(lambda: 0)
@@ -195,11 +200,14 @@ class Cached(object):
         if key is None:
             return make_obj()
         try:
-            return cls._cache_lookup(key)
+            obj = cls._cache_lookup(key)
         except (KeyError, IOError):
+            cache_stats[cls.__name__]["misses"] += 1
             obj = make_obj()
             cls._cache_store(key, obj)
             return obj
+        cache_stats[cls.__name__]["hits"] += 1
+        return obj
 
     @classmethod
     def _cache_lookup(cls, key):
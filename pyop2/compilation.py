@@ -36,17 +36,23 @@ import six
 from six.moves import input
 
 import os
+import shutil
 import subprocess
 import sys
 import ctypes
 import collections
+import json
+import sqlite3
+import tempfile
+import time
+from contextlib import closing
 from hashlib import md5
 from distutils import version
 
 
-from pyop2.mpi import MPI, collective, COMM_WORLD
+from pyop2.mpi import MPI, collective, COMM_WORLD, node_comms
 from pyop2.configuration import configuration
-from pyop2.logger import debug, progress, INFO
+from pyop2.logger import debug, warning, progress, INFO
 from pyop2.exceptions import CompilationError
 
 
@@ -60,10 +66,42 @@ def _check_hashes(x, y, datatype):
 _check_op = MPI.Op.Create(_check_hashes, commute=True)
 
 
+_compile_pool = None
+"""Threads driving the compilers for :meth:`Compiler.prefetch`."""
+
+_prefetched = {}
+"""Background builds by :meth:`Compiler.prefetch` not yet waited
+for, by name of the shared library."""
+
+_recorded = set()
+"""Names of the shared libraries recorded in the compilation
+manifest by this process."""
+
+_stats = {"disk_hits": 0, "disk_misses": 0, "libraries": collections.OrderedDict()}
+"""Loads of shared libraries by this process, see
+:func:`compilation_stats`."""
+
+_compile_times = {}
+"""Build times of the shared libraries built by this process and not
+yet loaded, by name of the shared library."""
+
+
 CompilerInfo = collections.namedtuple("CompilerInfo", ["compiler",
                                                        "version"])
 
 
+def _omp_flags(flag):
+    """Return the flags enabling OpenMP (or only its SIMD directives)
+    as required by the configuration.
+
+    :arg flag: the compiler's flag to enable OpenMP."""
+    if configuration['openmp']:
+        return [flag]
+    if configuration['simd_batch'] > 1 or configuration['layer_batch'] > 1:
+        return [flag + '-simd']
+    return []
+
+
 def sniff_compiler_version(cc):
     try:
         ver = subprocess.check_output([cc, "--version"]).decode("utf-8")
@@ -142,26 +180,23 @@ class Compiler(object):
                 return ["-fno-tree-loop-vectorize"]
         return []
 
-    @collective
-    def get_so(self, src, extension):
-        """Build a shared library and load it
-
-        :arg src: The source string to compile.
-        :arg extension: extension of the source file (c, cpp).
-
-        Returns a :class:`ctypes.CDLL` object of the resulting shared
-        library."""
-
-        # Determine cache key
+    def _basename(self, src):
+        """The name of the shared library built from ``src`` in the
+        cache, without extension."""
         hsh = md5(six.b(src))
         hsh.update(six.b(self._cc))
         if self._ld:
             hsh.update(six.b(self._ld))
         hsh.update(six.b("".join(self._cppargs)))
         hsh.update(six.b("".join(self._ldargs)))
+        return hsh.hexdigest()
 
-        basename = hsh.hexdigest()
+    def _build(self, src, extension, basename, evict=True):
+        """Build the shared library ``basename`` from ``src`` into the
+        cache directory (on this process only).
 
+        :kwarg evict: enforce ``configuration['cache_max_size']``
+            afterwards, which must only be done on the main thread."""
         cachedir = configuration['cache_dir']
         pid = os.getpid()
         cname = os.path.join(cachedir, "%s_p%d.%s" % (basename, pid, extension))
@@ -171,6 +206,145 @@ class Compiler(object):
         # atomically (avoiding races).
         tmpname = os.path.join(cachedir, "%s_p%d.so.tmp" % (basename, pid))
 
+        if not os.path.exists(cachedir):
+            try:
+                os.makedirs(cachedir)
+            except OSError:
+                # Created concurrently
+                if not os.path.isdir(cachedir):
+                    raise
+        start = time.time()
+        logfile = os.path.join(cachedir, "%s_p%d.log" % (basename, pid))
+        errfile = os.path.join(cachedir, "%s_p%d.err" % (basename, pid))
+        with progress(INFO, 'Compiling wrapper'):
+            with open(cname, "w") as f:
+                f.write(src)
+            # Compiler also links
+            if self._ld is None:
+                cc = [self._cc] + self._cppargs + \
+                     ['-o', tmpname, cname] + self._ldargs
+                debug('Compilation command: %s', ' '.join(cc))
+                with open(logfile, "w") as log:
+                    with open(errfile, "w") as err:
+                        log.write("Compilation command:\n")
+                        log.write(" ".join(cc))
+                        log.write("\n\n")
+                        try:
+                            if configuration['no_fork_available']:
+                                cc += ["2>", errfile, ">", logfile]
+                                cmd = " ".join(cc)
+                                status = os.system(cmd)
+                                if status != 0:
+                                    raise subprocess.CalledProcessError(status, cmd)
+                            else:
+                                subprocess.check_call(cc, stderr=err,
+                                                      stdout=log)
+                        except subprocess.CalledProcessError as e:
+                            raise CompilationError(
+                                """Command "%s" return error status %d.
+Unable to compile code
+Compile log in %s
+Compile errors in %s""" % (e.cmd, e.returncode, logfile, errfile))
+            else:
+                cc = [self._cc] + self._cppargs + \
+                     ['-c', '-o', oname, cname]
+                ld = self._ld.split() + ['-o', tmpname, oname] + self._ldargs
+                debug('Compilation command: %s', ' '.join(cc))
+                debug('Link command: %s', ' '.join(ld))
+                with open(logfile, "w") as log:
+                    with open(errfile, "w") as err:
+                        log.write("Compilation command:\n")
+                        log.write(" ".join(cc))
+                        log.write("\n\n")
+                        log.write("Link command:\n")
+                        log.write(" ".join(ld))
+                        log.write("\n\n")
+                        try:
+                            if configuration['no_fork_available']:
+                                cc += ["2>", errfile, ">", logfile]
+                                ld += ["2>", errfile, ">", logfile]
+                                cccmd = " ".join(cc)
+                                ldcmd = " ".join(ld)
+                                status = os.system(cccmd)
+                                if status != 0:
+                                    raise subprocess.CalledProcessError(status, cccmd)
+                                status = os.system(ldcmd)
+                                if status != 0:
+                                    raise subprocess.CalledProcessError(status, ldcmd)
+                            else:
+                                subprocess.check_call(cc, stderr=err,
+                                                      stdout=log)
+                                subprocess.check_call(ld, stderr=err,
+                                                      stdout=log)
+                        except subprocess.CalledProcessError as e:
+                            raise CompilationError(
+                                """Command "%s" return error status %d.
+Unable to compile code
+Compile log in %s
+Compile errors in %s""" % (e.cmd, e.returncode, logfile, errfile))
+            # Atomically ensure soname exists
+            os.rename(tmpname, soname)
+        _record_build(basename, time.time() - start, evict=evict)
+
+    def prefetch(self, src, extension, force=False):
+        """Start building a shared library in the background, so that a
+        later :meth:`get_so` for the same source only waits for the
+        build to complete.
+
+        This is not collective: only rank 0 builds, or with
+        ``configuration['node_local_compilation']`` the first rank on
+        the node to which :meth:`_get_node_local_so` assigns the
+        library, so that the builds of different libraries overlap
+        across nodes.  In the latter case, the first call on a
+        communicator must be made on all its ranks, to split it by
+        node.  Nothing is done unless
+        ``configuration['compile_threads']`` is positive.
+
+        :arg src: The source string to compile.
+        :arg extension: extension of the source file (c, cpp).
+        :kwarg force: build even if ``configuration['compile_threads']``
+            is not positive, on one thread."""
+        nthreads = configuration['compile_threads']
+        if force:
+            nthreads = max(nthreads, 1)
+        if nthreads <= 0:
+            return
+        node_local = configuration['node_local_compilation']
+        if not node_local and self.comm.rank != 0:
+            return
+        basename = self._basename(src)
+        if node_local and not self._node_local_owner(basename):
+            return
+        soname = os.path.join(configuration['cache_dir'], "%s.so" % basename)
+        if basename in _prefetched or os.path.exists(soname):
+            return
+        global _compile_pool
+        if _compile_pool is None or _compile_pool._processes != nthreads:
+            from multiprocessing.pool import ThreadPool
+            if _compile_pool is not None:
+                _compile_pool.close()
+            _compile_pool = ThreadPool(nthreads)
+        _prefetched[basename] = _compile_pool.apply_async(self._build, (src, extension, basename, False))
+
+    @collective
+    def get_so(self, src, extension, fn_name=None):
+        """Build a shared library and load it
+
+        :arg src: The source string to compile.
+        :arg extension: extension of the source file (c, cpp).
+        :kwarg fn_name: The name of the function to be used from the
+            library, recorded in the :func:`compilation_stats`.
+
+        Returns a :class:`ctypes.CDLL` object of the resulting shared
+        library."""
+
+        start = time.time()
+        # Determine cache key
+        basename = self._basename(src)
+
+        cachedir = configuration['cache_dir']
+        soname = os.path.join(cachedir, "%s.so" % basename)
+
         if configuration['check_src_hashes'] or configuration['debug']:
             matching = self.comm.allreduce(basename, op=_check_op)
             if matching != basename:
@@ -185,89 +359,153 @@ class Compiler(object):
                     f.write(src)
                 self.comm.barrier()
                 raise CompilationError("Generated code differs across ranks (see output in %s)" % output)
-        try:
-            # Are we in the cache?
-            return ctypes.CDLL(soname)
-        except OSError:
-            # No, let's go ahead and build
+        if configuration['compilation_manifest'] and self.comm.rank == 0:
+            self._record(src, extension, basename)
+        # Wait for a build started by prefetch.  If it failed, the
+        # library is built again below, which reports the error.
+        pending = _prefetched.pop(basename, None)
+        if pending is not None:
+            try:
+                pending.get()
+                _evict_cache(keep=(basename, ))
+            except CompilationError:
+                pass
+        if configuration['node_local_compilation']:
+            dll, hit = self._get_node_local_so(src, extension, basename)
+            soname = os.path.join(configuration['node_cache_dir'], "%s.so" % basename)
+        else:
+            # Rank 0 decides whether to build, so that all ranks agree
+            # even if a background build completed in the meantime.
+            dll = None
             if self.comm.rank == 0:
-                # No need to do this on all ranks
-                if not os.path.exists(cachedir):
-                    os.makedirs(cachedir)
-                logfile = os.path.join(cachedir, "%s_p%d.log" % (basename, pid))
-                errfile = os.path.join(cachedir, "%s_p%d.err" % (basename, pid))
-                with progress(INFO, 'Compiling wrapper'):
-                    with open(cname, "w") as f:
-                        f.write(src)
-                    # Compiler also links
-                    if self._ld is None:
-                        cc = [self._cc] + self._cppargs + \
-                             ['-o', tmpname, cname] + self._ldargs
-                        debug('Compilation command: %s', ' '.join(cc))
-                        with open(logfile, "w") as log:
-                            with open(errfile, "w") as err:
-                                log.write("Compilation command:\n")
-                                log.write(" ".join(cc))
-                                log.write("\n\n")
-                                try:
-                                    if configuration['no_fork_available']:
-                                        cc += ["2>", errfile, ">", logfile]
-                                        cmd = " ".join(cc)
-                                        status = os.system(cmd)
-                                        if status != 0:
-                                            raise subprocess.CalledProcessError(status, cmd)
-                                    else:
-                                        subprocess.check_call(cc, stderr=err,
-                                                              stdout=log)
-                                except subprocess.CalledProcessError as e:
-                                    raise CompilationError(
-                                        """Command "%s" return error status %d.
-Unable to compile code
-Compile log in %s
-Compile errors in %s""" % (e.cmd, e.returncode, logfile, errfile))
-                    else:
-                        cc = [self._cc] + self._cppargs + \
-                             ['-c', '-o', oname, cname]
-                        ld = self._ld.split() + ['-o', tmpname, oname] + self._ldargs
-                        debug('Compilation command: %s', ' '.join(cc))
-                        debug('Link command: %s', ' '.join(ld))
-                        with open(logfile, "w") as log:
-                            with open(errfile, "w") as err:
-                                log.write("Compilation command:\n")
-                                log.write(" ".join(cc))
-                                log.write("\n\n")
-                                log.write("Link command:\n")
-                                log.write(" ".join(ld))
-                                log.write("\n\n")
-                                try:
-                                    if configuration['no_fork_available']:
-                                        cc += ["2>", errfile, ">", logfile]
-                                        ld += ["2>", errfile, ">", logfile]
-                                        cccmd = " ".join(cc)
-                                        ldcmd = " ".join(ld)
-                                        status = os.system(cccmd)
-                                        if status != 0:
-                                            raise subprocess.CalledProcessError(status, cccmd)
-                                        status = os.system(ldcmd)
-                                        if status != 0:
-                                            raise subprocess.CalledProcessError(status, ldcmd)
-                                    else:
-                                        subprocess.check_call(cc, stderr=err,
-                                                              stdout=log)
-                                        subprocess.check_call(ld, stderr=err,
-                                                              stdout=log)
-                                except subprocess.CalledProcessError as e:
-                                    raise CompilationError(
-                                        """Command "%s" return error status %d.
-Unable to compile code
-Compile log in %s
-Compile errors in %s""" % (e.cmd, e.returncode, logfile, errfile))
-                    # Atomically ensure soname exists
+                try:
+                    # Are we in the cache?
+                    dll = ctypes.CDLL(soname)
+                    _record_access(basename)
+                except OSError:
+                    pass
+            hit = self.comm.bcast(dll is not None, root=0)
+            if not hit:
+                # No, let's go ahead and build
+                if self.comm.rank == 0:
+                    # No need to do this on all ranks
+                    self._build(src, extension, basename)
+                # Wait for compilation to complete
+                self.comm.barrier()
+            if dll is None:
+                # Load resulting library
+                dll = ctypes.CDLL(soname)
+        _record_load(basename, soname, [fn_name], len(src), hit, time.time() - start)
+        return dll
+
+    def _record(self, src, extension, basename):
+        """Append the build of a shared library to the compilation
+        manifest, unless already recorded by this process.
+
+        Each line of the manifest is a JSON object holding the source
+        and the exact compiler, linker and flags, so that
+        :func:`precompile` builds a library of the same name."""
+        if basename in _recorded:
+            return
+        _recorded.add(basename)
+        _write_manifest_entry(self._entry(src, extension, basename))
+
+    def _entry(self, src, extension, basename):
+        """The compilation manifest entry of a shared library."""
+        return {"name": basename,
+                "src": src,
+                "extension": extension,
+                "cc": self._cc,
+                "ld": self._ld,
+                "cppargs": self._cppargs,
+                "ldargs": self._ldargs}
+
+    @classmethod
+    def _from_entry(cls, entry):
+        """The compiler of a compilation manifest entry, with the exact
+        flags the library was built with, not those of this
+        environment."""
+        compiler = cls(entry["cc"], ld=entry["ld"], comm=MPI.COMM_SELF)
+        compiler._cc = entry["cc"]
+        compiler._ld = entry["ld"]
+        compiler._cppargs = entry["cppargs"]
+        compiler._ldargs = entry["ldargs"]
+        assert compiler._basename(entry["src"]) == entry["name"]
+        return compiler
+
+    def _read_so(self, src, extension, basename):
+        """Return the contents of a shared library in the cache
+        directory, building it first if needed."""
+        soname = os.path.join(configuration['cache_dir'], "%s.so" % basename)
+        if os.path.exists(soname):
+            _record_access(basename)
+        else:
+            self._build(src, extension, basename)
+        with open(soname, "rb") as f:
+            return f.read()
+
+    def _node_local_owner(self, basename):
+        """Whether this rank reads or builds the library ``basename``
+        for all nodes, see :meth:`_get_node_local_so`."""
+        node, leaders = node_comms(self.comm)
+        return node.rank == 0 and leaders.rank == int(basename, 16) % leaders.size
+
+    @collective
+    def _get_node_local_so(self, src, extension, basename):
+        """Load a shared library from ``configuration['node_cache_dir']``.
+
+        The first rank on each node checks whether the library is
+        already there.  The libraries missing on some node are spread
+        over these ranks: one of them reads or builds the library in the
+        cache directory and sends it to the others, which write it to
+        their node.  So each library is read or built by one rank of
+        the job, and the other ranks only load it from their node.
+        Libraries are only built concurrently on several nodes if
+        started beforehand with :meth:`prefetch`.
+
+        When every node has the library, the first of these ranks
+        records its use in the manifest of the cache directory, so that
+        ``configuration['cache_max_size']`` does not evict libraries
+        the job is using.  ``node_cache_dir`` itself is not bounded.
+
+        Returns the :class:`ctypes.CDLL` object of the library and
+        whether the library was already on the node."""
+        node, leaders = node_comms(self.comm)
+        nodedir = configuration['node_cache_dir']
+        soname = os.path.join(nodedir, "%s.so" % basename)
+        error = None
+        missing = None
+        if node.rank == 0:
+            missing = not os.path.exists(soname)
+            if leaders.allreduce(missing, op=MPI.LOR):
+                owner = int(basename, 16) % leaders.size
+                data = None
+                if leaders.rank == owner:
+                    try:
+                        data = self._read_so(src, extension, basename)
+                    except CompilationError as e:
+                        data = e
+                data = leaders.bcast(data, root=owner)
+                if isinstance(data, CompilationError):
+                    error = data
+                elif missing:
+                    if not os.path.exists(nodedir):
+                        try:
+                            os.makedirs(nodedir)
+                        except OSError:
+                            # Created concurrently
+                            if not os.path.isdir(nodedir):
+                                raise
+                    tmpname = os.path.join(nodedir, "%s_p%d.so.tmp" % (basename, os.getpid()))
+                    with open(tmpname, "wb") as f:
+                        f.write(data)
                     os.rename(tmpname, soname)
-            # Wait for compilation to complete
-            self.comm.barrier()
-            # Load resulting library
-            return ctypes.CDLL(soname)
+            elif leaders.rank == 0:
+                _record_access(basename)
+        error, missing = node.bcast((error, missing), root=0)
+        if error is not None:
+            raise error
+        return ctypes.CDLL(soname), not missing
 
 
 class MacCompiler(Compiler):
@@ -281,20 +519,24 @@ class MacCompiler(Compiler):
 
     :kwarg comm: Optional communicator to compile the code on (only
         rank 0 compiles code) (defaults to COMM_WORLD).
+    :kwarg optimise: Optimise the code?  If not, build it quickly.
     """
 
-    def __init__(self, cppargs=[], ldargs=[], cpp=False, comm=None):
+    def __init__(self, cppargs=[], ldargs=[], cpp=False, comm=None, optimise=True):
         opt_flags = ['-march=native', '-O3']
         if configuration['debug']:
             opt_flags = ['-O0', '-g']
+        elif not optimise:
+            opt_flags = ['-O1']
         cc = "mpicc"
         stdargs = ["-std=c99"]
         if cpp:
             cc = "mpicxx"
             stdargs = []
+        omp_flags = _omp_flags('-fopenmp')
         cppargs = stdargs + ['-fPIC', '-Wall', '-framework', 'Accelerate'] + \
-            opt_flags + cppargs
-        ldargs = ['-dynamiclib'] + ldargs
+            opt_flags + omp_flags + cppargs
+        ldargs = ['-dynamiclib'] + omp_flags + ldargs
         super(MacCompiler, self).__init__(cc,
                                           cppargs=cppargs,
                                           ldargs=ldargs,
@@ -310,18 +552,22 @@ class LinuxCompiler(Compiler):
     :arg ldargs: A list of arguments to pass to the linker (optional).
     :arg cpp: Are we actually using the C++ compiler?
     :kwarg comm: Optional communicator to compile the code on (only
-    rank 0 compiles code) (defaults to COMM_WORLD)."""
-    def __init__(self, cppargs=[], ldargs=[], cpp=False, comm=None):
+    rank 0 compiles code) (defaults to COMM_WORLD).
+    :kwarg optimise: Optimise the code?  If not, build it quickly."""
+    def __init__(self, cppargs=[], ldargs=[], cpp=False, comm=None, optimise=True):
         opt_flags = ['-march=native', '-O3']
         if configuration['debug']:
             opt_flags = ['-O0', '-g']
+        elif not optimise:
+            opt_flags = ['-O1']
         cc = "mpicc"
         stdargs = ["-std=c99"]
         if cpp:
             cc = "mpicxx"
             stdargs = []
-        cppargs = stdargs + ['-fPIC', '-Wall'] + opt_flags + cppargs
-        ldargs = ['-shared'] + ldargs
+        omp_flags = _omp_flags('-fopenmp')
+        cppargs = stdargs + ['-fPIC', '-Wall'] + opt_flags + omp_flags + cppargs
+        ldargs = ['-shared'] + omp_flags + ldargs
         super(LinuxCompiler, self).__init__(cc, cppargs=cppargs, ldargs=ldargs,
                                             cpp=cpp, comm=comm)
 
@@ -335,25 +581,53 @@ class LinuxIntelCompiler(Compiler):
     :arg cpp: Are we actually using the C++ compiler?
     :kwarg comm: Optional communicator to compile the code on (only
         rank 0 compiles code) (defaults to COMM_WORLD).
+    :kwarg optimise: Optimise the code?  If not, build it quickly.
     """
-    def __init__(self, cppargs=[], ldargs=[], cpp=False, comm=None):
+    def __init__(self, cppargs=[], ldargs=[], cpp=False, comm=None, optimise=True):
         opt_flags = ['-O3', '-xHost']
         if configuration['debug']:
             opt_flags = ['-O0', '-g']
+        elif not optimise:
+            opt_flags = ['-O1']
         cc = "mpicc"
         stdargs = ["-std=c99"]
         if cpp:
             cc = "mpicxx"
             stdargs = []
-        cppargs = stdargs + ['-fPIC', '-no-multibyte-chars'] + opt_flags + cppargs
-        ldargs = ['-shared'] + ldargs
+        omp_flags = _omp_flags('-qopenmp')
+        cppargs = stdargs + ['-fPIC', '-no-multibyte-chars'] + opt_flags + omp_flags + cppargs
+        ldargs = ['-shared'] + omp_flags + ldargs
         super(LinuxIntelCompiler, self).__init__(cc, cppargs=cppargs, ldargs=ldargs,
                                                  cpp=cpp, comm=comm)
 
 
+def _compiler(extension, cppargs, ldargs, compiler, comm, optimise=True):
+    """Return the :class:`Compiler` for this platform, see :func:`load`."""
+    platform = sys.platform
+    cpp = extension == "cpp"
+    if platform.find('linux') == 0:
+        if compiler == 'intel':
+            return LinuxIntelCompiler(cppargs, ldargs, cpp=cpp, comm=comm, optimise=optimise)
+        else:
+            return LinuxCompiler(cppargs, ldargs, cpp=cpp, comm=comm, optimise=optimise)
+    elif platform.find('darwin') == 0:
+        return MacCompiler(cppargs, ldargs, cpp=cpp, comm=comm, optimise=optimise)
+    else:
+        raise CompilationError("Don't know what compiler to use for platform '%s'" %
+                               platform)
+
+
+def prefetch(src, extension, cppargs=[], ldargs=[], compiler=None, comm=None):
+    """Start building a shared library in the background, so that a
+    later :func:`load` of the same source does not compile it again.
+
+    See :func:`load` for the arguments and :meth:`Compiler.prefetch`."""
+    _compiler(extension, cppargs, ldargs, compiler, comm).prefetch(src, extension)
+
+
 @collective
 def load(src, extension, fn_name, cppargs=[], ldargs=[],
-         argtypes=None, restype=None, compiler=None, comm=None):
+         argtypes=None, restype=None, compiler=None, comm=None, optimise=True):
     """Build a shared library and return a function pointer from it.
 
     :arg src: A string containing the source to build
@@ -369,20 +643,10 @@ def load(src, extension, fn_name, cppargs=[], ldargs=[],
     :arg compiler: The name of the C compiler (intel, ``None`` for default).
     :kwarg comm: Optional communicator to compile the code on (only
         rank 0 compiles code) (defaults to COMM_WORLD).
+    :kwarg optimise: Optimise the code?  If not, build it quickly.
     """
-    platform = sys.platform
-    cpp = extension == "cpp"
-    if platform.find('linux') == 0:
-        if compiler == 'intel':
-            compiler = LinuxIntelCompiler(cppargs, ldargs, cpp=cpp, comm=comm)
-        else:
-            compiler = LinuxCompiler(cppargs, ldargs, cpp=cpp, comm=comm)
-    elif platform.find('darwin') == 0:
-        compiler = MacCompiler(cppargs, ldargs, cpp=cpp, comm=comm)
-    else:
-        raise CompilationError("Don't know what compiler to use for platform '%s'" %
-                               platform)
-    dll = compiler.get_so(src, extension)
+    compiler = _compiler(extension, cppargs, ldargs, compiler, comm, optimise=optimise)
+    dll = compiler.get_so(src, extension, fn_name=fn_name)
 
     fn = getattr(dll, fn_name)
     fn.argtypes = argtypes
@@ -390,6 +654,519 @@ def load(src, extension, fn_name, cppargs=[], ldargs=[],
     return fn
 
 
+def _check_call(cmd, log, err):
+    """Run a build command, logging it, and raise a
+    :class:`~.CompilationError` if it fails."""
+    debug('Build command: %s', ' '.join(cmd))
+    log.write(" ".join(cmd))
+    log.write("\n\n")
+    log.flush()
+    try:
+        subprocess.check_call(cmd, stderr=err, stdout=log)
+    except subprocess.CalledProcessError as e:
+        raise CompilationError(
+            """Command "%s" return error status %d.
+Unable to compile code
+Compile log in %s
+Compile errors in %s""" % (e.cmd, e.returncode, log.name, err.name))
+
+
+def _write_manifest_entry(entry):
+    """Append an entry to the compilation manifest."""
+    with open(configuration['compilation_manifest'], "a") as f:
+        f.write(json.dumps(entry) + "\n")
+
+
+def _build_batch(compilers, requests, names, batch, evict=True):
+    """Build the shared library ``batch`` from several sources.
+
+    Each source is compiled to an object file, in which the only
+    global symbol left is its function, renamed after the source.  So
+    the objects may define the same symbols, and the library exports
+    one function per source.
+
+    :kwarg evict: enforce ``configuration['cache_max_size']``
+        afterwards, which must only be done on the main thread."""
+    cachedir = configuration['cache_dir']
+    if not os.path.exists(cachedir):
+        try:
+            os.makedirs(cachedir)
+        except OSError:
+            # Created concurrently
+            if not os.path.isdir(cachedir):
+                raise
+    start = time.time()
+    pid = os.getpid()
+    logfile = os.path.join(cachedir, "%s_p%d.log" % (batch, pid))
+    errfile = os.path.join(cachedir, "%s_p%d.err" % (batch, pid))
+    soname = os.path.join(cachedir, "%s.so" % batch)
+    tmpname = os.path.join(cachedir, "%s_p%d.so.tmp" % (batch, pid))
+    # The sources and objects are only needed until the library is
+    # linked, so keep them out of the cache directory
+    builddir = tempfile.mkdtemp(prefix="%s_" % batch)
+    objects = []
+    ldargs = []
+    try:
+        with progress(INFO, 'Compiling %d wrappers' % len(requests)):
+            with open(logfile, "w") as log, open(errfile, "w") as err:
+                for compiler, request, name in zip(compilers, requests, names):
+                    src, extension, fn_name = request[:3]
+                    cname = os.path.join(builddir, "%s.%s" % (name, extension))
+                    oname = os.path.join(builddir, "%s.o" % name)
+                    with open(cname, "w") as f:
+                        f.write(src)
+                    _check_call([compiler._cc] + compiler._cppargs + ['-c', '-o', oname, cname],
+                                log, err)
+                    exported = "%s_%s" % (fn_name, name)
+                    _check_call(['objcopy', '--redefine-sym', '%s=%s' % (fn_name, exported),
+                                 '--keep-global-symbol=%s' % exported, oname], log, err)
+                    objects.append(oname)
+                    ldargs.extend(a for a in compiler._ldargs if a not in ldargs)
+                # Link with the C++ compiler if any source is C++
+                linker = next((c for c, r in zip(compilers, requests) if r[1] == "cpp"), compilers[0])
+                ld = linker._ld.split() if linker._ld else [linker._cc]
+                _check_call(ld + ['-o', tmpname] + objects + ldargs, log, err)
+            # Atomically ensure soname exists
+            os.rename(tmpname, soname)
+    finally:
+        shutil.rmtree(builddir, ignore_errors=True)
+    _record_build(batch, time.time() - start, evict=evict)
+
+
+@collective
+def load_batch(requests, compiler=None, comm=None):
+    """Build the code of several functions into one shared library
+    and return function pointers from it.
+
+    :arg requests: a list of tuples ``(src, extension, fn_name,
+        cppargs, ldargs, argtypes, restype)``, see :func:`load`.
+    :arg compiler: The name of the C compiler (intel, ``None`` for default).
+    :kwarg comm: Optional communicator to compile the code on (only
+        rank 0 compiles code) (defaults to COMM_WORLD).
+
+    The library is named after the sources it contains, so it is
+    cached like the library of a single source.  On platforms without
+    GNU ``objcopy``, each source is built into its own library.
+
+    Returns the list of functions."""
+    if sys.platform.find('linux') != 0 or configuration['no_fork_available'] or \
+       not any(os.access(os.path.join(d, 'objcopy'), os.X_OK)
+               for d in os.environ.get('PATH', '').split(os.pathsep)):
+        return [load(src, extension, fn_name, cppargs=cppargs, ldargs=ldargs,
+                     argtypes=argtypes, restype=restype, compiler=compiler, comm=comm)
+                for src, extension, fn_name, cppargs, ldargs, argtypes, restype in requests]
+
+    start = time.time()
+    compilers = [_compiler(r[1], r[3], r[4], compiler, comm) for r in requests]
+    names = [c._basename(r[0]) for c, r in zip(compilers, requests)]
+    comm = compilers[0].comm
+    # Build each source once
+    unique = collections.OrderedDict()
+    for c, r, name in zip(compilers, requests, names):
+        unique.setdefault(name, (c, r))
+    batch = "batch_%s" % md5(six.b("".join(sorted(unique)))).hexdigest()
+    soname = os.path.join(configuration['cache_dir'], "%s.so" % batch)
+    # Rank 0 decides whether to build, so that all ranks agree
+    dll = None
+    if comm.rank == 0:
+        if configuration['compilation_manifest'] and batch not in _recorded:
+            _recorded.add(batch)
+            entries = []
+            for name, (c, r) in unique.items():
+                entry = c._entry(r[0], r[1], name)
+                entry["fn_name"] = r[2]
+                entries.append(entry)
+            _write_manifest_entry({"name": batch, "batch": entries})
+        try:
+            # Are we in the cache?
+            dll = ctypes.CDLL(soname)
+            _record_access(batch)
+        except OSError:
+            pass
+    hit = comm.bcast(dll is not None, root=0)
+    if not hit:
+        error = None
+        if comm.rank == 0:
+            try:
+                _build_batch([c for c, _ in unique.values()],
+                             [r for _, r in unique.values()],
+                             list(unique), batch)
+            except CompilationError as e:
+                error = e
+        # Wait for compilation to complete
+        error = comm.bcast(error, root=0)
+        if error is not None:
+            raise error
+    if dll is None:
+        dll = ctypes.CDLL(soname)
+    _record_load(batch, soname, [r[2] for r in requests],
+                 sum(len(r[0]) for _, r in unique.values()), hit, time.time() - start)
+    fns = []
+    for request, name in zip(requests, names):
+        fn = getattr(dll, "%s_%s" % (request[2], name))
+        fn.argtypes = request[5]
+        fn.restype = request[6]
+        fns.append(fn)
+    return fns
+
+
+class OptimisedFunction(object):
+
+    """A function from a shared library built in the background, see
+    :func:`load_tiered`.
+
+    :arg compiler: The :class:`Compiler` building the library.
+    :arg src: The source of the library.
+    :arg extension: extension of the source file (c, cpp).
+    :arg fn_name: The name of the function.
+    :arg argtypes: The ctypes argument types of the function.
+    :arg restype: The return type of the function.
+    :arg fallback: The function to keep using if the build fails."""
+
+    interval = 10
+    """Number of calls to :meth:`poll` between checks of the build."""
+
+    def __init__(self, compiler, src, extension, fn_name, argtypes, restype, fallback):
+        self._compiler = compiler
+        self._src = src
+        self._extension = extension
+        self._fn_name = fn_name
+        self._argtypes = argtypes
+        self._restype = restype
+        self._fallback = fallback
+        self._calls = 0
+
+    @collective
+    def poll(self):
+        """Return the function once its library is built, or ``None``.
+
+        Every :attr:`interval` calls, rank 0 checks whether the build
+        is complete and tells the other ranks, so that all ranks swap
+        to the optimised function on the same call.  The library is
+        then loaded like any other, see :meth:`Compiler.get_so`.  If
+        the build failed, a warning is issued and the fallback
+        function is returned."""
+        self._calls += 1
+        if self._calls % self.interval:
+            return None
+        comm = self._compiler.comm
+        basename = self._compiler._basename(self._src)
+        state = None
+        if comm.rank == 0:
+            pending = _prefetched.get(basename)
+            if pending is None:
+                state = "built"
+            elif pending.ready():
+                state = "built"
+                try:
+                    pending.get()
+                except CompilationError as e:
+                    del _prefetched[basename]
+                    state = str(e)
+        state = comm.bcast(state, root=0)
+        if state is None:
+            return None
+        if state != "built":
+            warning("Unable to build optimised %s, keeping the unoptimised code: %s",
+                    self._fn_name, state)
+            return self._fallback
+        dll = self._compiler.get_so(self._src, self._extension, fn_name=self._fn_name)
+        fn = getattr(dll, self._fn_name)
+        fn.argtypes = self._argtypes
+        fn.restype = self._restype
+        return fn
+
+
+@collective
+def load_tiered(src, extension, fn_name, cppargs=[], ldargs=[],
+                argtypes=None, restype=None, compiler=None, comm=None):
+    """Build a shared library quickly and return a function pointer
+    from it, while the optimised library is built in the background.
+
+    See :func:`load` for the arguments.  Both libraries are cached.
+
+    Returns the function and an :class:`OptimisedFunction` to replace
+    it with once built, or ``None`` if the optimised library was
+    already built and the function comes from it."""
+    optimised = _compiler(extension, cppargs, ldargs, compiler, comm)
+    soname = os.path.join(configuration['cache_dir'], "%s.so" % optimised._basename(src))
+    comm = optimised.comm
+    if comm.bcast(os.path.exists(soname) if comm.rank == 0 else None, root=0):
+        return load(src, extension, fn_name, cppargs=cppargs, ldargs=ldargs,
+                    argtypes=argtypes, restype=restype, compiler=compiler, comm=comm), None
+    fn = load(src, extension, fn_name, cppargs=cppargs, ldargs=ldargs,
+              argtypes=argtypes, restype=restype, compiler=compiler, comm=comm,
+              optimise=False)
+    optimised.prefetch(src, extension, force=True)
+    return fn, OptimisedFunction(optimised, src, extension, fn_name, argtypes, restype, fn)
+
+
+def _manifest():
+    """Connect to the manifest of the compiled libraries in the cache
+    directory, creating it if needed.
+
+    For each library, the manifest records its size, when it was
+    built, when it was last loaded and how long it took to build.  A
+    new manifest records the libraries already in the cache
+    directory, see :func:`_import_libraries`, so that
+    ``configuration['cache_max_size']`` applies to them too."""
+    cachedir = configuration['cache_dir']
+    path = os.path.join(cachedir, "manifest.sqlite")
+    new = not os.path.exists(path)
+    conn = sqlite3.connect(path, timeout=60)
+    conn.execute("""CREATE TABLE IF NOT EXISTS libraries (
+                    name TEXT PRIMARY KEY,
+                    size INTEGER,
+                    created REAL,
+                    accessed REAL,
+                    compile_time REAL)""")
+    if new:
+        with conn:
+            _import_libraries(conn, cachedir)
+    return conn
+
+
+def _import_libraries(conn, cachedir):
+    """Record the libraries of the cache directory missing from the
+    manifest, as last used when they were last modified."""
+    known = set(name for name, in conn.execute("SELECT name FROM libraries"))
+    for f in os.listdir(cachedir):
+        name, ext = os.path.splitext(f)
+        if ext == ".so" and name not in known:
+            path = os.path.join(cachedir, f)
+            try:
+                mtime = os.path.getmtime(path)
+                size = os.path.getsize(path)
+            except OSError:
+                # Removed concurrently
+                continue
+            conn.execute("INSERT OR IGNORE INTO libraries VALUES (?, ?, ?, ?, NULL)",
+                         (name, size, mtime, mtime))
+
+
+def _remove_library(cachedir, name):
+    """Remove a compiled library and the files it was built from."""
+    for f in os.listdir(cachedir):
+        if f == name + ".so" or f.startswith(name + "_p"):
+            try:
+                os.remove(os.path.join(cachedir, f))
+            except OSError:
+                pass
+
+
+def _evict(conn, max_size=0, max_age=0, keep=()):
+    """Remove libraries from the cache directory, and their entries
+    from the manifest.
+
+    :arg conn: a connection to the manifest.
+    :arg max_size: remove the least recently used libraries until
+        the remaining ones take at most this many bytes (``0`` for no
+        limit).
+    :arg max_age: remove the libraries not loaded for this many
+        seconds (``0`` for no limit).
+    :arg keep: names of libraries not to remove.
+
+    Returns the number of libraries removed."""
+    cachedir = configuration['cache_dir']
+    evicted = []
+    if max_age > 0:
+        cutoff = time.time() - max_age
+        evicted.extend(name for name, in conn.execute(
+            "SELECT name FROM libraries WHERE accessed < ?", (cutoff, )).fetchall()
+            if name not in keep)
+    if max_size > 0:
+        total, = conn.execute("SELECT COALESCE(SUM(size), 0) FROM libraries").fetchone()
+        for name, size in conn.execute("SELECT name, size FROM libraries "
+                                       "ORDER BY accessed").fetchall():
+            if total <= max_size:
+                break
+            if name in keep:
+                continue
+            total -= size
+            if name not in evicted:
+                evicted.append(name)
+    for name in evicted:
+        _remove_library(cachedir, name)
+        conn.execute("DELETE FROM libraries WHERE name = ?", (name, ))
+    return len(evicted)
+
+
+def _manifest_enabled():
+    """Whether builds and loads of libraries are recorded in the
+    manifest of the cache directory: only when the cache is bounded
+    or statistics are collected, as the manifest is locked and
+    written to on every build and load."""
+    return configuration['cache_max_size'] > 0 or bool(configuration['compilation_stats_file'])
+
+
+def _record_build(name, compile_time, evict=True):
+    """Record a newly built library in the manifest and, if ``evict``,
+    enforce ``configuration['cache_max_size']``, see
+    :func:`_evict_cache`."""
+    _compile_times[name] = compile_time
+    if not _manifest_enabled():
+        return
+    soname = os.path.join(configuration['cache_dir'], "%s.so" % name)
+    now = time.time()
+    try:
+        with closing(_manifest()) as conn, conn:
+            conn.execute("INSERT OR REPLACE INTO libraries VALUES (?, ?, ?, ?, ?)",
+                         (name, os.path.getsize(soname), now, now, compile_time))
+    except (sqlite3.Error, OSError) as e:
+        # The manifest only tracks the cache, never fail because of it
+        debug('Unable to update the cache manifest: %s', e)
+    if evict:
+        _evict_cache(keep=(name, ))
+
+
+def _evict_cache(keep=()):
+    """Enforce ``configuration['cache_max_size']``, removing neither
+    the libraries ``keep``, nor those being built in the background,
+    nor those loaded by this process.
+
+    Only called on the main thread, as background builds complete
+    while others are still pending."""
+    if configuration['cache_max_size'] <= 0:
+        return
+    keep = set(keep) | set(_prefetched) | set(_stats["libraries"])
+    try:
+        with closing(_manifest()) as conn, conn:
+            _evict(conn, max_size=configuration['cache_max_size'], keep=keep)
+    except (sqlite3.Error, OSError) as e:
+        debug('Unable to update the cache manifest: %s', e)
+
+
+def _record_load(name, soname, fn_names, src_size, hit, load_time):
+    """Record the load of a library in the :func:`compilation_stats`."""
+    _stats["disk_hits" if hit else "disk_misses"] += 1
+    lib = _stats["libraries"].get(name)
+    if lib is None:
+        try:
+            size = os.path.getsize(soname)
+        except OSError:
+            size = None
+        lib = {"hash": name,
+               "functions": [],
+               "source_size": src_size,
+               "size": size,
+               "compile_time": _compile_times.pop(name, None),
+               "load_time": 0.0,
+               "loads": 0}
+        _stats["libraries"][name] = lib
+    lib["functions"].extend(f for f in fn_names
+                            if f is not None and f not in lib["functions"])
+    lib["loads"] += 1
+    lib["load_time"] += load_time
+
+
+def compilation_stats():
+    """Return statistics of the compilation and caching of generated
+    code by this process, as a JSON serialisable dict with keys:
+
+    * ``"disk"``: the hits and misses of the compiler cache on disk,
+      each load of a library that was not built is a hit.
+    * ``"memory"``: the hits and misses of the in-memory caches, by
+      class of cached object (for example ``"Kernel"`` and
+      ``"JITModule"``), see :class:`~.caching.Cached`.
+    * ``"loaded_libraries"``: the number of shared libraries loaded.
+    * ``"code_size"``: the size in bytes of these libraries.
+    * ``"compile_time"``: the time spent building them.
+    * ``"load_time"``: the time spent waiting for libraries to be
+      built and loaded, on this process.
+    * ``"libraries"``: for each library, its hash, the names of the
+      functions used from it, the size of its source and of the
+      library, the time to build it (``None`` if not built by this
+      process), the time spent loading it and the number of loads.
+
+    Only rank 0 builds, so other ranks report no compile time."""
+    from pyop2.caching import cache_stats
+    libraries = [dict(lib, functions=list(lib["functions"]))
+                 for lib in _stats["libraries"].values()]
+    return {"disk": {"hits": _stats["disk_hits"],
+                     "misses": _stats["disk_misses"]},
+            "memory": dict((k, dict(v)) for k, v in cache_stats.items()),
+            "loaded_libraries": len(libraries),
+            "code_size": sum(lib["size"] or 0 for lib in libraries),
+            "compile_time": sum(lib["compile_time"] or 0 for lib in libraries),
+            "load_time": sum(lib["load_time"] for lib in libraries),
+            "libraries": libraries}
+
+
+def _record_access(name):
+    """Record that a library was loaded from the cache."""
+    if not _manifest_enabled():
+        return
+    try:
+        with closing(_manifest()) as conn, conn:
+            conn.execute("UPDATE libraries SET accessed = ? WHERE name = ?",
+                         (time.time(), name))
+    except sqlite3.Error as e:
+        debug('Unable to update the cache manifest: %s', e)
+
+
+def prune_cache(max_size=0, max_age=0):
+    """Remove the least recently used libraries from the PyOP2
+    compiler cache.
+
+    :arg max_size: remove libraries until the remaining ones take at
+        most this many bytes (``0`` for no limit).
+    :arg max_age: remove the libraries not loaded for this many
+        seconds (``0`` for no limit).
+
+    Libraries built before the cache had a manifest count as last
+    used when they were last modified."""
+    cachedir = configuration['cache_dir']
+    if not os.path.exists(cachedir):
+        return
+    with closing(_manifest()) as conn, conn:
+        _import_libraries(conn, cachedir)
+        nlibs = _evict(conn, max_size=max_size, max_age=max_age)
+    print("Removed %d cached libraries from %s" % (nlibs, cachedir))
+
+
+def precompile(manifest, nthreads=1):
+    """Build the shared libraries recorded in a compilation manifest
+    into the cache directory, see
+    ``configuration['compilation_manifest']``.
+
+    :arg manifest: the manifest file.
+    :arg nthreads: how many libraries to build concurrently.
+
+    Returns the number of libraries built and the number of libraries
+    already in the cache."""
+    entries = collections.OrderedDict()
+    with open(manifest) as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                entries[entry["name"]] = entry
+
+    cachedir = configuration['cache_dir']
+    missing = [e for name, e in entries.items()
+               if not os.path.exists(os.path.join(cachedir, "%s.so" % name))]
+
+    def build(entry):
+        if "batch" in entry:
+            # A library built by load_batch
+            _build_batch([Compiler._from_entry(e) for e in entry["batch"]],
+                         [(e["src"], e["extension"], e["fn_name"]) for e in entry["batch"]],
+                         [e["name"] for e in entry["batch"]],
+                         entry["name"], evict=False)
+        else:
+            compiler = Compiler._from_entry(entry)
+            compiler._build(entry["src"], entry["extension"], entry["name"], evict=False)
+
+    if missing:
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(max(1, nthreads))
+        try:
+            pool.map(build, missing)
+        finally:
+            pool.close()
+        _evict_cache(keep=[e["name"] for e in missing])
+    return len(missing), len(entries) - len(missing)
+
+
 def clear_cache(prompt=False):
     """Clear the PyOP2 compiler cache.
 
@@ -61,13 +61,74 @@ class Configuration(dict):
     :param lazy_max_trace_length: How many :func:`par_loop`\s
         should be queued lazily before forcing evaluation?  Pass
         `0` for an unbounded length.
+    :param lazy_max_trace_bytes: How many bytes of data written by
+        queued :func:`par_loop`\s, which the trace keeps alive, should
+        be allowed before forcing evaluation?  Pass `0` for no limit.
+    :param lazy_max_rss: Above which resident memory of the process,
+        in bytes, should queueing a :func:`par_loop` force evaluation
+        of the trace?  Pass `0` for no limit.
     :param loop_fusion: Should loop fusion be on or off?
+    :param loop_threads: How many threads should be used to execute
+        independent :func:`par_loop`\s of the lazy evaluation trace
+        concurrently?  Only loops in serial without :class:`Mat`
+        arguments or global reductions are eligible.  Pass `0` to
+        execute all loops one after another.  (Default 0)
+    :param compile_trace: Should sequences of :func:`par_loop`\s of
+        the lazy evaluation trace be executed through a single
+        compiled function calling their wrappers one after another?
+        Only loops over sets which are not extruded and without
+        :class:`Mat` arguments are eligible.  Halo exchanges and global
+        reductions are called back between the loops.
+        Ignored if ``loop_threads`` is greater than one.  (Default no)
+    :param compile_threads: With how many threads should the code of
+        :func:`par_loop`\s be compiled in the background while they
+        are queued in the lazy evaluation trace?  Pass `0` to compile
+        each loop when it is first executed.
+    :param dead_store_elimination: Should :func:`par_loop`\s of the
+        lazy evaluation trace be dropped when everything they write is
+        entirely overwritten, by a direct ``WRITE`` over the whole
+        :class:`Set` or a zeroing, before being read?  (Default no)
     :param dump_gencode: Should PyOP2 write the generated code
         somewhere for inspection?
     :param dump_gencode_path: Where should the generated code be
         written to?
+    :param tiered_compilation: Should the code of :func:`par_loop`\s
+        be built quickly, with few optimisations, to run straight
+        away, and replaced by the optimised build once it is completed
+        in the background?  All ranks switch to the optimised code
+        together, on the same call.  (Default no)
+    :param batch_compilation: Should the code of the :func:`par_loop`\s
+        of the lazy evaluation trace which is not compiled yet be built
+        into one shared library when the trace is executed, rather than
+        into one library each?  Requires GNU ``objcopy``, and is
+        ignored with ``tiered_compilation``.  (Default no)
+    :param compilation_manifest: File to which every library loaded or
+        built should be recorded, so that ``pyop2-precompile`` can
+        build them ahead of time.  Pass an empty string not to record
+        them.  (Default "")
+    :param node_local_compilation: Should compiled libraries be loaded
+        from a directory local to each node rather than from
+        ``cache_dir``?  Only one rank of the job reads or builds each
+        library in ``cache_dir``, and sends it to the first rank on
+        each node, which writes it to ``node_cache_dir``.  The
+        libraries are spread over the first ranks of the nodes, which
+        build them concurrently in the background if
+        ``compile_threads`` is positive.  (Default no)
+    :param node_cache_dir: Where should libraries be written to on
+        each node with ``node_local_compilation``?  This directory is
+        not bounded by ``cache_max_size``, clean it with ``pyop2-clean
+        --node``.  (Default in ``/dev/shm`` where it exists)
+    :param cache_max_size: How many bytes of compiled libraries should
+        the cache directory hold at most?  When a new library takes it
+        over the limit, the least recently used ones are removed.
+        Pass `0` for no limit.  Builds and loads are only recorded in
+        the manifest of the cache directory if there is a limit, or if
+        `compilation_stats_file` is set.  (Default 0)
     :param print_cache_size: Should PyOP2 print the size of caches at
         program exit?
+    :param compilation_stats_file: File to which rank 0 writes the
+        statistics of compilation and caching at program exit, as JSON,
+        see :func:`~.compilation.compilation_stats`.  (Default none)
     :param print_summary: Should PyOP2 print a summary of timings at
         program exit?
     :param matnest: Should matrices on mixed maps be built as nests? (Default yes)
@@ -75,6 +136,41 @@ class Configuration(dict):
         cdim > 1 be built as block sparsities, or dof sparsities.  The
         former saves memory but changes which preconditioners are
         available for the resulting matrices.  (Default yes)
+    :param simd_batch: How many elements should generated wrappers
+        gather into a batch, calling the kernel for the batch in a
+        loop under ``omp simd``?  The data of each element is gathered
+        into its own buffer and the kernel is unchanged, so the calls
+        are only vectorised across elements if the compiler inlines
+        the kernel, which is defined along with the wrapper.  No
+        interleaved buffers or kernel vectorised over the batch are
+        generated.  Only loops which are not extruded, do not
+        assemble :class:`Mat`\s or reduce into :class:`Global`\s and
+        only read indirectly accessed data are batched.  Pass `0` to
+        disable batching.  (Default 0)
+    :param layer_batch: How many layers of a column should generated
+        wrappers for extruded loops gather into a batch, so that the
+        compiler can vectorise kernel invocations along the column?
+        Only loops over all layers which read or increment data
+        through vector maps, and never read what they increment, are
+        batched.  Pass `0` to disable batching.  (Default 0)
+    :param openmp: Should :func:`par_loop`\s be executed with OpenMP
+        threads?  The number of threads is set with the environment
+        variable ``OMP_NUM_THREADS``.  Read when PyOP2 objects are
+        created, so each :func:`par_loop` runs with the setting in
+        force when it is called.  (Default no)
+    :param openmp_atomics: Should indirect increments into
+        :class:`Dat`\s in threaded :func:`par_loop`\s be applied with
+        atomic operations rather than protected by colouring?  Can be
+        overridden per loop by passing ``atomic_inc`` to
+        :func:`par_loop`.  (Default no)
+    :param packed_args: Should the generated code of sequential
+        :func:`par_loop`\s be called with all arguments packed into
+        one array, rather than converting each argument with ctypes
+        on every call?  Lowers the call overhead of loops with many
+        arguments.  (Default no)
+    :param numba: Should :func:`par_loop`\s over Python function
+        kernels be compiled with Numba, if it is installed, rather
+        than interpreted?  (Default no)
     """
     # name, env variable, type, default, write once
     DEFAULTS = {
@@ -89,18 +185,39 @@ class Configuration(dict):
         "log_level": ("PYOP2_LOG_LEVEL", (str, int), "WARNING"),
         "lazy_evaluation": ("PYOP2_LAZY", bool, True),
         "lazy_max_trace_length": ("PYOP2_MAX_TRACE_LENGTH", int, 100),
+        "lazy_max_trace_bytes": ("PYOP2_MAX_TRACE_BYTES", int, 0),
+        "lazy_max_rss": ("PYOP2_MAX_RSS", int, 0),
         "loop_fusion": ("PYOP2_LOOP_FUSION", bool, False),
+        "loop_threads": ("PYOP2_LOOP_THREADS", int, 0),
+        "compile_trace": ("PYOP2_COMPILE_TRACE", bool, False),
+        "compile_threads": ("PYOP2_COMPILE_THREADS", int, 0),
+        "dead_store_elimination": ("PYOP2_DEAD_STORE_ELIMINATION", bool, False),
         "dump_gencode": ("PYOP2_DUMP_GENCODE", bool, False),
         "cache_dir": ("PYOP2_CACHE_DIR", str,
                       os.path.join(gettempdir(),
                                    "pyop2-cache-uid%s" % os.getuid())),
+        "cache_max_size": ("PYOP2_CACHE_MAX_SIZE", int, 0),
+        "tiered_compilation": ("PYOP2_TIERED_COMPILATION", bool, False),
+        "batch_compilation": ("PYOP2_BATCH_COMPILATION", bool, False),
+        "compilation_manifest": ("PYOP2_COMPILATION_MANIFEST", str, ""),
+        "node_local_compilation": ("PYOP2_NODE_LOCAL_COMPILATION", bool, False),
+        "node_cache_dir": ("PYOP2_NODE_CACHE_DIR", str,
+                           os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else gettempdir(),
+                                        "pyop2-cache-uid%s" % os.getuid())),
         "no_fork_available": ("PYOP2_NO_FORK_AVAILABLE", bool, False),
         "print_cache_size": ("PYOP2_PRINT_CACHE_SIZE", bool, False),
+        "compilation_stats_file": ("PYOP2_COMPILATION_STATS_FILE", str, ""),
         "print_summary": ("PYOP2_PRINT_SUMMARY", bool, False),
         "dump_gencode_path": ("PYOP2_DUMP_GENCODE_PATH", str,
                               os.path.join(gettempdir(), "pyop2-gencode")),
         "matnest": ("PYOP2_MATNEST", bool, True),
         "block_sparsity": ("PYOP2_BLOCK_SPARSITY", bool, True),
+        "simd_batch": ("PYOP2_SIMD_BATCH", int, 0),
+        "layer_batch": ("PYOP2_LAYER_BATCH", int, 0),
+        "openmp": ("PYOP2_OPENMP", bool, False),
+        "openmp_atomics": ("PYOP2_OPENMP_ATOMICS", bool, False),
+        "numba": ("PYOP2_NUMBA", bool, False),
+        "packed_args": ("PYOP2_PACKED_ARGS", bool, False),
     }
     """Default values for PyOP2 configuration parameters"""
 
@@ -595,6 +595,8 @@ class TilingParLoop(ParLoop):
 
     """A special :class:`ParLoop` for a sequence of tiled kernels."""
 
+    _concurrent = False
+
     def __init__(self, kernel, it_space, *args, **kwargs):
         base.LazyComputation.__init__(self,
                                       kwargs['read_args'],
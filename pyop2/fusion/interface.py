@@ -253,7 +253,7 @@ def loop_chain(name, **kwargs):
                        'tile_size': block_size}
             new_trace = [Inspector(name, [loop], **options).inspect()([loop])
                          for loop in extracted_trace]
-            trace[bottom:] = list(flatten(new_trace))
+            _trace._trace = trace[:bottom] + list(flatten(new_trace))
             _trace.evaluate_all()
     elif explicit:
         # 2) Tile over subsets of loops in the loop chain, as specified
@@ -267,7 +267,7 @@ def loop_chain(name, **kwargs):
             transformed.extend(fuse(sub_name, extracted_trace[first:last+1], **kwargs))
             prev_last = last + 1
         transformed.extend(extracted_trace[prev_last:])
-        trace[bottom:] = transformed
+        _trace._trace = trace[:bottom] + transformed
         _trace.evaluate_all()
     else:
         # 3) Tile over the entire loop chain, possibly unrolled as by user
@@ -275,7 +275,7 @@ def loop_chain(name, **kwargs):
         total_loop_chain = loop_chain.unrolled_loop_chain + extracted_trace
         if len(total_loop_chain) / len(extracted_trace) == num_unroll:
             bottom = trace.index(total_loop_chain[0])
-            trace[bottom:] = fuse(name, total_loop_chain, **kwargs)
+            _trace._trace = trace[:bottom] + fuse(name, total_loop_chain, **kwargs)
             loop_chain.unrolled_loop_chain = []
             _trace.evaluate_all()
         else:
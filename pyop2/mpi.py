@@ -123,6 +123,13 @@ outercomm_keyval = MPI.Comm.Create_keyval()
 # List of internal communicators, must be freed at exit.
 dupped_comms = []
 
+# Node communicators attribute (attaches the communicators splitting a
+# communicator by node to it)
+nodecomm_keyval = MPI.Comm.Create_keyval()
+
+# List of communicators splitting others by node, must be freed at exit.
+node_split_comms = []
+
 
 def dup_comm(comm_in=None):
     """Given a communicator return a communicator for internal use.
@@ -164,6 +171,25 @@ def dup_comm(comm_in=None):
     return comm_out
 
 
+def node_comms(comm):
+    """Split a communicator by shared memory node.
+
+    :arg comm: The communicator to split.
+
+    :returns: A tuple of the communicator of the ranks of ``comm`` on
+        this node and the communicator of the first rank of ``comm`` on
+        each node (``MPI.COMM_NULL`` on the other ranks).  Both are
+        attached to ``comm``, so it is only split once."""
+    comms = comm.Get_attr(nodecomm_keyval)
+    if comms is None:
+        node = comm.Split_type(MPI.COMM_TYPE_SHARED, key=comm.rank)
+        leaders = comm.Split(0 if node.rank == 0 else MPI.UNDEFINED, key=comm.rank)
+        comms = (node, leaders)
+        comm.Set_attr(nodecomm_keyval, comms)
+        node_split_comms.extend(comms)
+    return comms
+
+
 def free_comm(comm, remove=True):
     """Free an internal communicator.
 
@@ -205,6 +231,10 @@ def free_comm(comm, remove=True):
 @atexit.register
 def free_comms():
     """Free all outstanding communicators."""
+    while node_split_comms:
+        c = node_split_comms.pop()
+        if c != MPI.COMM_NULL:
+            c.Free()
     while dupped_comms:
         c = dupped_comms.pop()
         refcount = c.Get_attr(refcount_keyval)
@@ -212,7 +242,8 @@ def free_comms():
             free_comm(c, remove=False)
     map(MPI.Comm.Free_keyval, [refcount_keyval,
                                innercomm_keyval,
-                               outercomm_keyval])
+                               outercomm_keyval,
+                               nodecomm_keyval])
 
 
 def collective(fn):
@@ -40,7 +40,8 @@ from pyop2.configuration import configuration
 from pyop2.logger import debug, info, warning, error, critical, set_log_level
 from pyop2.mpi import MPI, COMM_WORLD, collective
 
-from pyop2.base import i                      # noqa: F401
+from pyop2.base import i, ParLoopHandle, capture  # noqa: F401
+from pyop2.compilation import compilation_stats
 from pyop2.sequential import par_loop, Kernel  # noqa: F401
 from pyop2.sequential import READ, WRITE, RW, INC, MIN, MAX  # noqa: F401
 from pyop2.sequential import ON_BOTTOM, ON_TOP, ON_INTERIOR_FACETS, ALL  # noqa: F401
@@ -57,8 +58,8 @@ __all__ = ['configuration', 'READ', 'WRITE', 'RW', 'INC', 'MIN', 'MAX',
            'set_log_level', 'MPI', 'init', 'exit', 'Kernel', 'Set', 'ExtrudedSet',
            'LocalSet', 'MixedSet', 'Subset', 'DataSet', 'GlobalDataSet', 'MixedDataSet',
            'Halo', 'Dat', 'MixedDat', 'Mat', 'Global', 'Map', 'MixedMap',
-           'Sparsity', 'par_loop',
-           'DatView', 'DecoratedMap']
+           'Sparsity', 'par_loop', 'ParLoopHandle', 'capture',
+           'DatView', 'DecoratedMap', 'compilation_stats']
 
 
 _initialised = False
@@ -112,6 +113,10 @@ def exit():
         print('**** PyOP2 cache sizes at exit ****')
         report_cache(typ=ObjectCached)
         report_cache(typ=Cached)
+    if configuration['compilation_stats_file'] and COMM_WORLD.rank == 0:
+        import json
+        with open(configuration['compilation_stats_file'], "w") as f:
+            json.dump(compilation_stats(), f, indent=2)
     configuration.reset()
     global _initialised
     _initialised = False
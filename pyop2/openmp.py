@@ -0,0 +1,278 @@
+# This file is part of PyOP2
+#
+# PyOP2 is Copyright (c) 2012, Imperial College London and
+# others. Please see the AUTHORS file in the main source directory for
+# a full list of copyright holders.  All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * The name of Imperial College London or that of other
+#       contributors may not be used to endorse or promote products
+#       derived from this software without specific prior written
+#       permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTERS
+# ''AS IS'' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDERS OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED
+# OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""OP2 OpenMP backend.
+
+Generated wrappers run the iteration over a :class:`~pyop2.Set` on
+multiple threads.  The iteration set is split into blocks by a
+:class:`~pyop2.plan.Plan`, each thread executes whole blocks.  Blocks
+of the same colour do not indirectly write to the same data and are
+executed concurrently, colours are executed one after another.
+"""
+from __future__ import absolute_import, print_function, division
+from six.moves import range
+
+import ctypes
+from copy import copy
+
+from pyop2 import sequential
+from pyop2.plan import Plan
+from pyop2.sequential import par_loop, Kernel                       # noqa: F401
+from pyop2.sequential import READ, WRITE, RW, INC, MIN, MAX         # noqa: F401
+from pyop2.sequential import ON_BOTTOM, ON_TOP, ON_INTERIOR_FACETS, ALL  # noqa: F401
+from pyop2.sequential import Map, MixedMap, DecoratedMap, Sparsity, Halo  # noqa: F401
+from pyop2.sequential import Set, ExtrudedSet, MixedSet, Subset, LocalSet  # noqa: F401
+from pyop2.sequential import DataSet, MixedDataSet, DatView         # noqa: F401
+from pyop2.sequential import Global, GlobalDataSet                  # noqa: F401
+from pyop2.sequential import Dat, MixedDat, Mat                     # noqa: F401
+from pyop2.configuration import configuration
+from pyop2.mpi import collective
+from pyop2.profiling import timed_region
+from pyop2.utils import cached_property
+
+
+class Arg(sequential.Arg):
+
+    _atomic_inc = False
+    """Are indirect increments through this argument applied with
+    atomic operations (instead of being protected by colouring)?"""
+
+    @property
+    def _is_staged(self):
+        """Is the kernel handed a zeroed staging buffer, which is then
+        atomically added to the data?"""
+        return self._atomic_inc and not self._uses_itspace
+
+    def c_global_reduction_name(self, count=None):
+        return "%(name)s_l%(count)d[0]" % {'name': self.c_arg_name(),
+                                           'count': count}
+
+    def c_stage_name(self):
+        return self.c_arg_name() + "_stage"
+
+    def c_stage_size(self):
+        arity = self.map.arity if self._is_vec_map else 1
+        return arity * self.data.cdim
+
+    def c_stage_dec(self):
+        return "%(type)s %(name)s[%(size)d]" % \
+            {'type': self.ctype,
+             'name': self.c_stage_name(),
+             'size': self.c_stage_size()}
+
+    def c_stage_init(self):
+        return "for ( int k_0 = 0; k_0 < %(size)d; k_0++ ) %(name)s[k_0] = (%(type)s)0" % \
+            {'type': self.ctype,
+             'name': self.c_stage_name(),
+             'size': self.c_stage_size()}
+
+    def c_stage_scatter(self):
+        idxs = range(self.map.arity) if self._is_vec_map else [self.idx]
+        return "\n".join(["for ( int k_0 = 0; k_0 < %(dim)d; k_0++ ) {\n"
+                          "#pragma omp atomic\n"
+                          "*(%(data)s + k_0) += %(name)s[%(ofs)d + k_0];\n"
+                          "}" % {'dim': self.data.cdim,
+                                 'data': self.c_ind_data(idx, 0),
+                                 'name': self.c_stage_name(),
+                                 'ofs': n * self.data.cdim}
+                          for n, idx in enumerate(idxs)])
+
+    def c_vec_init(self, is_top, is_facet=False):
+        if not self._is_staged:
+            return super(Arg, self).c_vec_init(is_top, is_facet=is_facet)
+        return ";\n".join(["%(vec_name)s[%(idx)d] = %(name)s + %(ofs)d" %
+                           {'vec_name': self.c_vec_name(),
+                            'idx': idx,
+                            'name': self.c_stage_name(),
+                            'ofs': idx * self.data.cdim}
+                           for idx in range(self.map.arity)])
+
+    def c_kernel_arg(self, count, i=0, j=0, shape=(0,), layers=1):
+        if self._is_staged and not self._is_vec_map:
+            return self.c_stage_name()
+        return super(Arg, self).c_kernel_arg(count, i, j, shape, layers)
+
+    def c_buffer_scatter_vec(self, count, i, j, mxofs, buf_name):
+        val = super(Arg, self).c_buffer_scatter_vec(count, i, j, mxofs, buf_name)
+        if not self._atomic_inc:
+            return val
+        return ";\n".join("#pragma omp atomic\n" + stmt for stmt in val.split(";\n"))
+
+
+class JITModule(sequential.JITModule):
+
+    _cache = {}
+
+    _wrapper = """
+void %(wrapper_name)s(int start,
+                      int end,
+                      %(IntType)s *blkmap,
+                      %(IntType)s *offset,
+                      %(IntType)s *nelems,
+                      %(ssinds_arg)s
+                      %(wrapper_args)s
+                      %(layer_arg)s) {
+  %(user_code)s
+  %(wrapper_decs)s;
+  #pragma omp parallel if(%(threaded)d)
+  {
+    %(interm_globals_decl)s;
+    %(interm_globals_init)s;
+    %(map_decl)s
+    %(vec_decs)s;
+    %(stage_decs)s;
+    #pragma omp for schedule(static)
+    for ( int b = start; b < end; b++ ) {
+      %(IntType)s bid = blkmap[b];
+      for ( int n = offset[bid]; n < offset[bid] + nelems[bid]; n++ ) {
+        %(IntType)s i = %(index_expr)s;
+        %(vec_inits)s;
+        %(stage_init)s;
+        %(map_init)s;
+        %(extr_loop)s
+        %(map_bcs_m)s;
+        %(buffer_decl)s;
+        %(buffer_gather)s
+        %(kernel_name)s(%(kernel_args)s);
+        %(itset_loop_body)s
+        %(stage_scatter)s;
+        %(map_bcs_p)s;
+        %(apply_offset)s;
+        %(extr_loop_close)s
+      }
+    }
+    %(interm_globals_writeback)s;
+  }
+}
+"""
+
+    @classmethod
+    def _cache_key(cls, kernel, itspace, *args, **kwargs):
+        key = super(JITModule, cls)._cache_key(kernel, itspace, *args, **kwargs)
+        return key + (kwargs.get('atomic_inc', False), )
+
+    def __init__(self, kernel, itspace, *args, **kwargs):
+        if self._initialized:
+            return
+        # PETSc matrix insertion is not thread safe, so loops
+        # assembling a Mat run on a single thread.
+        self._threaded = not any(arg._is_mat for arg in args)
+        if kwargs.get('atomic_inc', False):
+            args = tuple(_atomic(arg) if _is_indirect_inc(arg) else arg for arg in args)
+        super(JITModule, self).__init__(kernel, itspace, *args, **kwargs)
+
+    def _batch_size(self, itspace, *args):
+        # Threaded wrappers execute whole blocks, they do not batch
+        # elements.
+        return 0
+
+    def generate_code(self):
+        if not self._code_dict:
+            snippets = super(JITModule, self).generate_code()
+            snippets['threaded'] = int(self._threaded)
+            staged = [arg for arg in self._args if arg._is_staged]
+            snippets['stage_decs'] = ';\n'.join(arg.c_stage_dec() for arg in staged)
+            snippets['stage_init'] = ';\n'.join(arg.c_stage_init() for arg in staged)
+            snippets['stage_scatter'] = '\n'.join(arg.c_stage_scatter() for arg in staged)
+        return self._code_dict
+
+    def set_argtypes(self, iterset, *args):
+        super(JITModule, self).set_argtypes(iterset, *args)
+        self._argtypes[2:2] = [ctypes.c_voidp] * 3
+
+
+class ParLoop(sequential.ParLoop):
+
+    # Blocks of the plan index the elements of a Subset individually
+    _iterates_ranges = False
+
+    # The loop already runs on all threads
+    _concurrent = False
+
+    def __init__(self, kernel, iterset, *args, **kwargs):
+        atomic_inc = kwargs.pop('atomic_inc', None)
+        super(ParLoop, self).__init__(kernel, iterset, *args, **kwargs)
+        if atomic_inc is None:
+            atomic_inc = configuration['openmp_atomics']
+        self._atomic_inc = atomic_inc and self._supports_atomic_inc
+
+    @cached_property
+    def _supports_atomic_inc(self):
+        """Can the indirect increments of this loop be applied
+        atomically?  Extruded loops, increments into mixed
+        :class:`Dat`\s and :class:`Dat`\s which are also indirectly
+        modified otherwise are always coloured."""
+        if self._is_layered:
+            return False
+        incs = [arg for arg in self.args if _is_indirect_inc(arg)]
+        if not incs or any(len(arg.data) > 1 or arg._is_dat_view for arg in incs):
+            return False
+        return not any(arg._is_dat and arg._is_indirect and arg.access is RW and
+                       any(arg.data is inc.data for inc in incs)
+                       for arg in self.args)
+
+    def _make_jitmodule(self, **kwargs):
+        return JITModule(self.kernel, self.it_space, *self.args,
+                         direct=self.is_direct, iterate=self.iteration_region,
+                         pass_layer_arg=self._pass_layer_arg,
+                         atomic_inc=self._atomic_inc, **kwargs)
+
+    @cached_property
+    def _plan(self):
+        if self._atomic_inc:
+            # Atomic increments need not be coloured
+            return Plan(self.iterset, *[arg for arg in self.args if not _is_indirect_inc(arg)])
+        return Plan(self.iterset, *self.args)
+
+    @collective
+    def _compute(self, part, fun, *arglist):
+        with timed_region("ParLoop%s" % self.iterset.name):
+            plan = self._plan
+            blkmap, offsets = plan.blocks(part)
+            for c in range(len(offsets) - 1):
+                if offsets[c] < offsets[c + 1]:
+                    fun(offsets[c], offsets[c + 1], blkmap.ctypes.data,
+                        plan.offset.ctypes.data, plan.nelems.ctypes.data, *arglist)
+            self.log_flops()
+
+
+def _is_indirect_inc(arg):
+    return arg._is_dat and arg._is_indirect and arg.access is INC
+
+
+def _atomic(arg):
+    """Return a copy of ``arg`` whose increments are applied
+    atomically."""
+    arg = copy(arg)
+    arg._atomic_inc = True
+    return arg
@@ -618,6 +618,24 @@ class MatBlock(base.Mat):
         return base._LazyMatOp(self, closure, new_state=Mat.INSERT_VALUES,
                                write=True).enqueue()
 
+    def addto_values_batched(self, rows, cols, values):
+        """Add a block of values per row of ``rows`` and ``cols`` to
+        the :class:`Mat`."""
+        closure = partial(self.handle.setValuesBlockedLocalRCV,
+                          rows, cols, values,
+                          addv=PETSc.InsertMode.ADD_VALUES)
+        return base._LazyMatOp(self, closure, new_state=Mat.ADD_VALUES,
+                               read=True, write=True).enqueue()
+
+    def set_values_batched(self, rows, cols, values):
+        """Set a block of values per row of ``rows`` and ``cols`` in
+        the :class:`Mat`."""
+        closure = partial(self.handle.setValuesBlockedLocalRCV,
+                          rows, cols, values,
+                          addv=PETSc.InsertMode.INSERT_VALUES)
+        return base._LazyMatOp(self, closure, new_state=Mat.INSERT_VALUES,
+                               write=True).enqueue()
+
     def assemble(self):
         raise RuntimeError("Should never call assemble on MatBlock")
 
@@ -923,6 +941,24 @@ class Mat(base.Mat):
         return base._LazyMatOp(self, closure, new_state=Mat.INSERT_VALUES,
                                write=True).enqueue()
 
+    def addto_values_batched(self, rows, cols, values):
+        """Add a block of values per row of ``rows`` and ``cols`` to
+        the :class:`Mat`."""
+        closure = partial(self.handle.setValuesBlockedLocalRCV,
+                          rows, cols, values,
+                          addv=PETSc.InsertMode.ADD_VALUES)
+        return base._LazyMatOp(self, closure, new_state=Mat.ADD_VALUES,
+                               read=True, write=True).enqueue()
+
+    def set_values_batched(self, rows, cols, values):
+        """Set a block of values per row of ``rows`` and ``cols`` in
+        the :class:`Mat`."""
+        closure = partial(self.handle.setValuesBlockedLocalRCV,
+                          rows, cols, values,
+                          addv=PETSc.InsertMode.INSERT_VALUES)
+        return base._LazyMatOp(self, closure, new_state=Mat.INSERT_VALUES,
+                               write=True).enqueue()
+
     @utils.cached_property
     def blocks(self):
         """2-dimensional array of matrix blocks."""
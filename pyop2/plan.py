@@ -0,0 +1,293 @@
+# This file is part of PyOP2
+#
+# PyOP2 is Copyright (c) 2012, Imperial College London and
+# others. Please see the AUTHORS file in the main source directory for
+# a full list of copyright holders.  All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * The name of Imperial College London or that of other
+#       contributors may not be used to endorse or promote products
+#       derived from this software without specific prior written
+#       permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTERS
+# ''AS IS'' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDERS OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED
+# OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Parallel execution plans for threaded backends.
+
+A :class:`Plan` partitions an iteration set into contiguous blocks and
+computes a two-level colouring: blocks of the same colour do not
+indirectly write to the same data and may be executed concurrently,
+elements of the same colour within a block may be executed
+concurrently (e.g. by vector lanes) as well.
+"""
+from __future__ import absolute_import, print_function, division
+from six.moves import zip
+
+import numpy as np
+
+from pyop2.base import INC, RW, Subset
+from pyop2.caching import ObjectCached
+from pyop2.datatypes import IntType
+from pyop2.utils import cached_property
+
+
+class Plan(ObjectCached):
+
+    """A partitioning and colouring of an iteration set for a
+    :func:`~pyop2.par_loop`.
+
+    :arg iterset: the :class:`~pyop2.Set` iterated over.
+    :arg args: the :class:`~pyop2.base.Arg`\s of the
+        :func:`~pyop2.par_loop`.
+    :kwarg partition_size: the number of elements per block (defaults
+        to the ``partition_size`` of ``iterset``).
+
+    Plans are cached on the iteration set and shared by every
+    :func:`~pyop2.par_loop` which indirectly writes through the same
+    :class:`~pyop2.Map`\s.
+
+    Blocks never straddle the core, owned and exec halo partitions of
+    the iteration set, use :meth:`blocks` to retrieve the blocks of one
+    of them ordered by colour.
+    """
+
+    def __init__(self, iterset, *args, **kwargs):
+        if self._initialized:
+            return
+        partition_size = kwargs.get('partition_size') or iterset.partition_size
+        self._partition_size = partition_size
+        parts = [iterset.core_part, iterset.owned_part, iterset.exec_part]
+
+        # Contiguous blocks of at most partition_size elements
+        starts = [np.arange(p.offset, p.offset + p.size, partition_size, dtype=IntType)
+                  for p in parts]
+        ends = [np.minimum(s + partition_size, p.offset + p.size).astype(IntType)
+                for s, p in zip(starts, parts)]
+        self.offset = np.concatenate(starts)
+        self.nelems = np.concatenate(ends) - self.offset
+        self.nblocks = len(self.offset)
+        block = np.repeat(np.arange(self.nblocks, dtype=IntType), self.nelems)
+
+        targets, ntargets = _targets(iterset, _conflict_groups(args))
+
+        # Block colouring: blocks conflict if any of their elements
+        # touch the same target.
+        pairs = np.unique(block[:, None].astype(np.int64) * ntargets + targets)
+        blk, tgt = pairs // max(ntargets, 1), pairs % max(ntargets, 1)
+        ptr = np.concatenate(([0], np.cumsum(np.bincount(blk, minlength=self.nblocks))))
+        self.blkcol = colour(ptr, tgt, ntargets)
+        self.ncolours = int(self.blkcol.max()) + 1 if self.nblocks else 0
+        self.nconflicts = int(np.count_nonzero(np.bincount(tgt, minlength=ntargets) > 1))
+
+        # Kept for the element colouring, see _thread_colouring
+        self._block = block
+        self._targets = targets, ntargets
+
+        # Blocks of each partition sorted by colour
+        self.blkmap = np.empty(self.nblocks, dtype=IntType)
+        self._colour_offsets = {}
+        b0 = 0
+        for p, s in zip(parts, starts):
+            b1 = b0 + len(s)
+            colours = self.blkcol[b0:b1]
+            self.blkmap[b0:b1] = b0 + np.argsort(colours, kind='mergesort')
+            counts = np.bincount(colours, minlength=self.ncolours)
+            self._colour_offsets[p.offset, p.size] = b0 + np.concatenate(([0], np.cumsum(counts)))
+            b0 = b1
+        self._initialized = True
+
+    @cached_property
+    def _thread_colouring(self):
+        """Colour the elements within blocks: elements conflict if they
+        touch the same target from within the same block.
+
+        The OpenMP backend executes the elements of a block in order on
+        one thread, so this is only computed when asked for."""
+        block = self._block
+        targets, ntargets = self._targets
+        nelem, arity = targets.shape
+        local_targets, ids = np.unique(block[:, None].astype(np.int64) * ntargets + targets,
+                                       return_inverse=True)
+        ids = ids.reshape(nelem, arity)
+        thrcol = colour(np.arange(nelem + 1) * arity, ids.ravel(), len(local_targets))
+        nthrcol = np.zeros(self.nblocks, dtype=IntType)
+        if nelem:
+            np.maximum.at(nthrcol, block, thrcol + 1)
+        touched = np.unique(np.arange(nelem, dtype=np.int64)[:, None] * len(local_targets) + ids)
+        nthrconflicts = int(np.count_nonzero(
+            np.bincount(touched % max(len(local_targets), 1), minlength=len(local_targets)) > 1))
+        return thrcol, nthrcol, nthrconflicts
+
+    @property
+    def thrcol(self):
+        """The colour of each element within its block."""
+        return self._thread_colouring[0]
+
+    @property
+    def nthrcol(self):
+        """The number of element colours of each block."""
+        return self._thread_colouring[1]
+
+    @property
+    def nthrconflicts(self):
+        """The number of targets touched by several elements of a
+        block."""
+        return self._thread_colouring[2]
+
+    @classmethod
+    def _process_args(cls, iterset, *args, **kwargs):
+        return (iterset, iterset) + args, kwargs
+
+    @classmethod
+    def _cache_key(cls, iterset, *args, **kwargs):
+        return (iterset, kwargs.get('partition_size') or iterset.partition_size) + \
+            tuple(tuple(g) for _, g in _conflict_groups(args))
+
+    def blocks(self, part):
+        """Return the blocks of a :class:`~pyop2.base.SetPartition`.
+
+        :returns: the block map and the offsets into it at which the
+            blocks of each colour start.  Blocks ``blkmap[offsets[c]:
+            offsets[c+1]]`` have colour ``c``."""
+        return self.blkmap, self._colour_offsets[part.offset, part.size]
+
+    @property
+    def stats(self):
+        """A dict of statistics about this :class:`Plan`."""
+        return {'nblocks': self.nblocks,
+                'partition_size': self._partition_size,
+                'ncolours': self.ncolours,
+                'nthrcolours': int(self.nthrcol.max()) if self.nblocks else 0,
+                'min_block_size': int(self.nelems.min()) if self.nblocks else 0,
+                'max_block_size': int(self.nelems.max()) if self.nblocks else 0,
+                'nconflicts': self.nconflicts,
+                'nthrconflicts': self.nthrconflicts}
+
+    def __repr__(self):
+        return "Plan(%s)" % ", ".join("%s=%s" % kv for kv in sorted(self.stats.items()))
+
+
+def _conflict_groups(args):
+    """Group the accesses of a :func:`~pyop2.par_loop` to every
+    :class:`~pyop2.Dat` which is indirectly written by it.
+
+    :returns: a list with one entry per written :class:`~pyop2.Dat`,
+        holding its :class:`~pyop2.DataSet` and the ``(map, idx)``
+        pairs through which it is accessed (``map`` is ``None`` for
+        direct access)."""
+    split = [a for arg in args if arg._is_dat for a in arg]
+    written = []
+    for a in split:
+        if a._is_indirect and a.access in [INC, RW] and \
+           not any(a.data is d for d in written):
+            written.append(a.data)
+    groups = []
+    for d in written:
+        group = []
+        for a in split:
+            if a.data is not d:
+                continue
+            idx = a.idx if isinstance(a.idx, int) else None
+            if (a.map, idx) not in group:
+                group.append((a.map, idx))
+        groups.append((d.dataset, group))
+    return groups
+
+
+def _targets(iterset, groups):
+    """Return the targets touched by each element of ``iterset`` and the
+    total number of targets.
+
+    Targets in different conflict ``groups`` are numbered
+    independently."""
+    if isinstance(iterset, Subset):
+        rows = iterset.indices[:iterset.exec_size]
+    else:
+        rows = np.arange(iterset.exec_size, dtype=IntType)
+    targets = [np.empty((len(rows), 0), dtype=IntType)]
+    ntargets = 0
+    for dataset, group in groups:
+        for map, idx in group:
+            if map is None:
+                t = rows.reshape(-1, 1)
+            else:
+                t = map.values_with_halo[rows]
+                if idx is not None:
+                    t = t[:, idx:idx+1]
+            targets.append(t + ntargets)
+        ntargets += dataset.set.total_size
+    return np.hstack(targets).astype(np.int64), ntargets
+
+
+def colour(ptr, targets, ntargets):
+    """Colour items such that no two items sharing a target have the
+    same colour.
+
+    :arg ptr: offsets into ``targets``, item ``i`` touches
+        ``targets[ptr[i]:ptr[i+1]]``.
+    :arg targets: the targets touched by the items.
+    :arg ntargets: the number of distinct targets.
+    :returns: an array of colours, one per item.
+
+    This is a vectorised Jones-Plassmann colouring: in each round an
+    independent set of items is selected by random priorities and every
+    selected item picks the smallest colour not yet used by any of its
+    targets.  Used colours are recorded in a 64 bit mask per target,
+    should an item run out of colours, it is deferred to another pass
+    with colours offset by 64."""
+    n = len(ptr) - 1
+    colours = np.zeros(n, dtype=IntType)
+    if n == 0 or len(targets) == 0:
+        return colours
+    # Fixed seed to obtain reproducible colourings
+    priority = np.random.RandomState(0).permutation(n)
+    one = np.uint64(1)
+    full = np.uint64(~np.uint64(0))
+    best = np.empty(ntargets, dtype=priority.dtype)
+    offset = 0
+    remaining = np.arange(n)
+    while len(remaining):
+        mask = np.zeros(ntargets, dtype=np.uint64)
+        deferred = []
+        active = remaining
+        while len(active):
+            counts = ptr[active + 1] - ptr[active]
+            owner = np.repeat(np.arange(len(active)), counts)
+            entries = np.arange(len(owner)) + np.repeat(ptr[active] - np.cumsum(counts) + counts, counts)
+            t = targets[entries]
+            p = priority[active][owner]
+            best[t] = -1
+            np.maximum.at(best, t, p)
+            lost = np.bincount(owner[best[t] != p], minlength=len(active)) > 0
+            forbidden = np.zeros(len(active), dtype=np.uint64)
+            np.bitwise_or.at(forbidden, owner, mask[t])
+            exhausted = ~lost & (forbidden == full)
+            deferred.append(active[exhausted])
+            won = ~lost & ~exhausted
+            free = ~forbidden
+            bit = np.where(won, free & (~free + one), np.uint64(0))
+            colours[active[won]] = offset + np.log2(bit[won].astype(np.float64)).astype(IntType)
+            np.bitwise_or.at(mask, t, bit[owner])
+            active = active[lost]
+        remaining = np.concatenate(deferred)
+        offset += 64
+    return colours
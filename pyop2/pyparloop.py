@@ -72,11 +72,55 @@ Example usage::
   #  [ 3.  4.]
   #  [ 5.  6.]
   #  [ 3.  0.]]
+
+Functions decorated with :func:`vectorised` are called once for all
+entities of the iteration set instead, with arrays gathering the data of
+every entity along the first axis::
+
+.. code-block:: python
+
+  @vectorised
+  def fn3(x, y):
+      x[:, 0] = y[:, 0, 0]
+      x[:, 1] = y[:, 1, 0]
+
+  op2.par_loop(fn3, s, d2(op2.WRITE), d(op2.READ, m))
+
+If the ``numba`` configuration option is set and Numba is installed,
+the kernel function and a generated loop over the iteration set are
+compiled with Numba rather than interpreted.  The kernel must then be
+written in the subset of Python supported by Numba's ``nopython``
+mode.
 """
 
 from __future__ import absolute_import, print_function, division
 import numpy as np
 from pyop2 import base
+from pyop2.configuration import configuration
+from pyop2.utils import cached_property
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+def vectorised(fn):
+    """Declare a Python kernel function as vectorised.
+
+    A vectorised kernel is called once per part of the iteration set.
+    Each argument gains a leading axis over the entities of the part:
+    direct :class:`~pyop2.Dat` arguments are passed with shape ``(n,
+    cdim)``, arguments accessed through a :class:`~pyop2.Map` with
+    shape ``(n, arity, cdim)`` (``arity`` is one for an indexed
+    :class:`~pyop2.Map`) and :class:`~pyop2.Mat` arguments with shape
+    ``(n, rows, cols)``.  :class:`~pyop2.Global`\s are passed as is.
+
+    ``INC`` arguments accessed through a :class:`~pyop2.Map` are
+    passed zeroed and summed into the data afterwards, so the kernel
+    must only increment them."""
+    fn._pyop2_vectorised = True
+    return fn
 
 
 # Fake kernel for type checking
@@ -88,6 +132,7 @@ class Kernel(base.Kernel):
     def __init__(self, code, name=None, **kwargs):
         self._func = code
         self._name = name
+        self._vectorised = getattr(code, '_pyop2_vectorised', False)
         self._attached_info = {'fundecl': None, 'attached': False}
 
     def __getattr__(self, attr):
@@ -100,19 +145,177 @@ class Kernel(base.Kernel):
     def __repr__(self):
         return 'Kernel("""%s""", %r)' % (self._func, self._name)
 
+    @property
+    def _numba_cache(self):
+        """Numba-compiled loops calling this kernel.  Stored on the
+        function, since a new :class:`Kernel` is built for every
+        :func:`par_loop`."""
+        try:
+            return self._func._pyop2_numba_cache
+        except AttributeError:
+            self._func._pyop2_numba_cache = {}
+            return self._func._pyop2_numba_cache
+
+
+def _numba_loop(fn, args, subset):
+    """Generate a loop over the iteration set calling ``fn`` for each
+    entity and compile it with Numba.
+
+    :arg fn: the kernel function.
+    :arg args: the :class:`~pyop2.base.Arg`\s of the :class:`ParLoop`.
+    :arg subset: is the iteration set a :class:`~pyop2.Subset`?  The
+        loop then takes the indices of the subset as third argument."""
+    params = ["start", "end", "idx"] if subset else ["start", "end"]
+    setup = []
+    gather = []
+    kernel_args = []
+    scatter = []
+    for i, arg in enumerate(args):
+        a = "a%d" % i
+        params.append(a)
+        if arg._is_global:
+            kernel_args.append(a)
+        elif arg._is_direct:
+            # Dats with cdim 1 are stored as vectors, but the kernel
+            # expects an array just like for any other Dat
+            kernel_args.append("%s[i:i + 1]" % a if arg.data.cdim == 1 else "%s[i]" % a)
+        elif arg._is_indirect:
+            m, b = "m%d" % i, "b%d" % i
+            params.append(m)
+            if arg._is_vec_map:
+                offset, n = 0, arg.map.arity
+            else:
+                offset, n = arg.idx, 1
+            setup.append("%s = np.empty(%r, dtype=np.%s)" %
+                         (b, (n, ) + arg.data.shape[1:], arg.data.dtype.name))
+            if arg.access is base.INC:
+                gather.append("%s[:] = 0" % b)
+                scatter.extend(["for j in range(%d):" % n,
+                                "    %s[%s[i, %d + j]] += %s[j]" % (a, m, offset, b)])
+            else:
+                gather.extend(["for j in range(%d):" % n,
+                               "    %s[j] = %s[%s[i, %d + j]]" % (b, a, m, offset)])
+                if arg.access is not base.READ:
+                    scatter.extend(["for j in range(%d):" % n,
+                                    "    %s[%s[i, %d + j]] = %s[j]" % (a, m, offset, b)])
+            kernel_args.append(b)
+        elif arg._is_mat:
+            # The element matrices are inserted after the loop
+            kernel_args.append("%s[e - start]" % a)
+    body = ["i = idx[e]" if subset else "i = e"] + gather + \
+        ["kernel(%s)" % ", ".join(kernel_args)] + scatter
+    lines = ["def loop(%s):" % ", ".join(params)]
+    lines.extend("    " + line for line in setup)
+    lines.append("    for e in range(start, end):")
+    lines.extend("        " + line for line in body)
+    src = "\n".join(lines)
+    namespace = {"np": np, "kernel": numba.njit(fn)}
+    exec(src, namespace)
+    return numba.njit(namespace["loop"])
+
 
 # Inherit from parloop for type checking and init
 class ParLoop(base.ParLoop):
 
+    # Python kernels hold the GIL
+    _concurrent = False
+
     def _compute(self, part, *arglist):
         if part.set._extruded:
             raise NotImplementedError
-        subset = isinstance(self._it_space._iterset, base.Subset)
 
         for arg in self.args:
             if arg._is_dat and arg.data._is_allocated:
                 for d in arg.data:
                     d._data.setflags(write=True)
+        if self._kernel._vectorised:
+            self._compute_vectorised(part)
+        elif self._numba_loop is not None:
+            self._compute_numba(part)
+        else:
+            self._compute_elements(part)
+
+        for arg in self.args:
+            if arg._is_dat and arg.data._is_allocated:
+                for d in arg.data:
+                    d._data.setflags(write=False)
+            if arg._is_mat and arg.access is not base.READ:
+                # Queue up assembly of matrix
+                arg.data.assemble()
+                # Now force the evaluation of everything.  Python
+                # parloops are not performance critical, so this is
+                # fine.
+                # We need to do this because the
+                # set_values/addto_values calls are lazily evaluated,
+                # and the parloop is already lazily evaluated so this
+                # lazily spawns lazy computation and getting
+                # everything to execute in the right order is
+                # otherwise madness.
+                arg.data._force_evaluation(read=True, write=False)
+
+    @cached_property
+    def _numba_loop(self):
+        """The Numba-compiled loop over the iteration set, or ``None``
+        if the kernel is to be interpreted."""
+        if numba is None or not configuration["numba"]:
+            return None
+        for arg in self.args:
+            if arg._is_mixed or arg._is_dat_view:
+                return None
+            if arg._is_indirect and isinstance(arg.idx, base.IterationIndex):
+                return None
+            if arg._is_mat and arg.access not in [base.INC, base.WRITE]:
+                return None
+        cache = self._kernel._numba_cache
+        key = base.JITModule._cache_key(self._kernel, self._it_space, *self.args)
+        try:
+            return cache[key]
+        except KeyError:
+            subset = isinstance(self._it_space._iterset, base.Subset)
+            return cache.setdefault(key, _numba_loop(self._kernel._func,
+                                                     self.args, subset))
+
+    def _indices(self, part):
+        """The indices of the entities of ``part`` in the data."""
+        iterset = self._it_space._iterset
+        if isinstance(iterset, base.Subset):
+            return iterset._indices[part.offset:part.offset + part.size]
+        return slice(part.offset, part.offset + part.size)
+
+    def _compute_numba(self, part):
+        """Run the Numba-compiled loop over the iteration set."""
+        if part.size == 0:
+            return
+        arglist = [part.offset, part.offset + part.size]
+        if isinstance(self._it_space._iterset, base.Subset):
+            arglist.append(self._it_space._iterset._indices)
+        values = []
+        for arg in self.args:
+            if arg._is_mat:
+                values.append(np.zeros((part.size, ) + arg._block_shape[0][0],
+                                       dtype=arg.data.dtype))
+                arglist.append(values[-1])
+                continue
+            data = arg.data._data
+            if arg.access is base.READ:
+                data = data.view()
+                data.setflags(write=False)
+            arglist.append(data)
+            if arg._is_indirect:
+                arglist.append(arg.map.values_with_halo)
+        self._numba_loop(*arglist)
+        idx = self._indices(part)
+        for arg, tmp in zip([a for a in self.args if a._is_mat], values):
+            rows = arg.map[0].values_with_halo[idx]
+            cols = arg.map[1].values_with_halo[idx]
+            if arg.access is base.INC:
+                arg.data.addto_values_batched(rows, cols, tmp)
+            else:
+                arg.data.set_values_batched(rows, cols, tmp)
+
+    def _compute_elements(self, part):
+        """Call the kernel for each entity of the iteration set."""
+        subset = isinstance(self._it_space._iterset, base.Subset)
         # Just walk over the iteration set
         for e in range(part.offset, part.offset + part.size):
             args = []
@@ -140,6 +343,7 @@ class ParLoop(base.ParLoop):
                         raise ValueError("Mixed Mats must be split before assembly")
                     args.append(np.zeros(arg._block_shape[0][0], dtype=arg.data.dtype))
                 if arg.access is base.READ:
+                    args[-1] = args[-1].view()
                     args[-1].setflags(write=False)
                 if args[-1].shape == ():
                     args[-1] = args[-1].reshape(1)
@@ -166,20 +370,63 @@ class ParLoop(base.ParLoop):
                                             arg.map[1].values_with_halo[idx],
                                             tmp)
 
+    def _compute_vectorised(self, part):
+        """Call the kernel once for all entities of the iteration set."""
+        if part.size == 0:
+            return
+        idx = self._indices(part)
+        args = []
+        rows = []
         for arg in self.args:
-            if arg._is_dat and arg.data._is_allocated:
-                for d in arg.data:
-                    d._data.setflags(write=False)
-            if arg._is_mat and arg.access is not base.READ:
-                # Queue up assembly of matrix
-                arg.data.assemble()
-                # Now force the evaluation of everything.  Python
-                # parloops are not performance critical, so this is
-                # fine.
-                # We need to do this because the
-                # set_values/addto_values calls are lazily evaluated,
-                # and the parloop is already lazily evaluated so this
-                # lazily spawns lazy computation and getting
-                # everything to execute in the right order is
-                # otherwise madness.
-                arg.data._force_evaluation(read=True, write=False)
+            if arg._is_global:
+                rows.append(None)
+                args.append(arg.data._data)
+            elif arg._is_direct:
+                # Dats with cdim 1 store their data without the trailing
+                # axis, so reshape to always pass the documented shape
+                rows.append(idx)
+                args.append(arg.data._data[idx, ...].reshape((part.size, ) + arg.data.dim))
+            elif arg._is_indirect:
+                if isinstance(arg.idx, base.IterationIndex):
+                    raise NotImplementedError
+                if arg._is_vec_map:
+                    rows.append(arg.map.values_with_halo[idx])
+                else:
+                    rows.append(arg.map.values_with_halo[idx, arg.idx:arg.idx+1])
+                shape = rows[-1].shape + arg.data.dim
+                if arg.access is base.INC:
+                    args.append(np.zeros(shape, dtype=arg.data.dtype))
+                else:
+                    args.append(arg.data._data[rows[-1], ...].reshape(shape))
+            elif arg._is_mat:
+                if arg.access not in [base.INC, base.WRITE]:
+                    raise NotImplementedError
+                if arg._is_mixed_mat:
+                    raise ValueError("Mixed Mats must be split before assembly")
+                rows.append((arg.map[0].values_with_halo[idx],
+                             arg.map[1].values_with_halo[idx]))
+                args.append(np.zeros((len(rows[-1][0]), ) + arg._block_shape[0][0],
+                                     dtype=arg.data.dtype))
+            if arg.access is base.READ:
+                # A view, so as not to make a Global read-only
+                args[-1] = args[-1].view()
+                args[-1].setflags(write=False)
+        self._kernel(*args)
+        for arg, tmp, r in zip(self.args, args, rows):
+            if arg.access is base.READ:
+                continue
+            if arg._is_global:
+                arg.data._data[:] = tmp[:]
+            elif arg._is_direct:
+                arg.data._data[r, ...] = tmp.reshape((part.size, ) + arg.data._data.shape[1:])
+            elif arg._is_indirect:
+                tmp = tmp.reshape(r.shape + arg.data._data.shape[1:])
+                if arg.access is base.INC:
+                    np.add.at(arg.data._data, r, tmp)
+                else:
+                    arg.data._data[r, ...] = tmp
+            elif arg._is_mat:
+                if arg.access is base.INC:
+                    arg.data.addto_values_batched(r[0], r[1], tmp)
+                elif arg.access is base.WRITE:
+                    arg.data.set_values_batched(r[0], r[1], tmp)
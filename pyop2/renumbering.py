@@ -0,0 +1,296 @@
+# This file is part of PyOP2
+#
+# PyOP2 is Copyright (c) 2012, Imperial College London and
+# others. Please see the AUTHORS file in the main source directory for
+# a full list of copyright holders.  All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * The name of Imperial College London or that of other
+#       contributors may not be used to endorse or promote products
+#       derived from this software without specific prior written
+#       permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTERS
+# ''AS IS'' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDERS OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED
+# OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""Locality-improving renumberings of :class:`~pyop2.Set`\s.
+
+The performance of indirect :func:`~pyop2.par_loop`\s depends on how
+close together in memory the entities referenced by neighbouring map
+entries are.  A :class:`Renumbering` is a permutation of the entities
+of a :class:`~pyop2.Set`, computed with reverse Cuthill-McKee from the
+:class:`~pyop2.Map`\s touching the set (:func:`rcm`) or along a Morton
+curve through the coordinates of the entities (:func:`morton`), which
+:func:`renumber` applies in place to the set and the maps and
+:class:`~pyop2.Dat`\s defined on it.
+
+Entities are only ever permuted within the core, owned, execute halo
+and non-execute halo parts of the set, so that the sizes of the set
+and its :class:`~pyop2.base.Halo` remain valid.  Example usage::
+
+  r = renumbering.rcm(cells, [pcell])
+  renumbering.renumber(r, maps=[pcell, pecell], dats=[p_q, p_res])
+  ...
+  q = r.to_original(p_q.data_ro)
+"""
+from __future__ import absolute_import, print_function, division
+
+import numpy as np
+
+from pyop2.base import Dat, DatView, MixedDat, _trace, _evaluate_expressions
+from pyop2.datatypes import IntType
+from pyop2.exceptions import DataValueError, MapValueError, SetValueError
+from pyop2.utils import maybe_setflags
+
+
+class Renumbering(object):
+
+    """A permutation of the entities of a :class:`~pyop2.Set`.
+
+    :arg set: the :class:`~pyop2.Set` to renumber.
+    :arg perm: the original number of each entity in the new
+        numbering, i.e. entity ``perm[i]`` becomes entity ``i``.  Must
+        map each part of the set (core, owned, execute halo and
+        non-execute halo) onto itself."""
+
+    def __init__(self, set, perm):
+        perm = np.asarray(perm, dtype=IntType)
+        if perm.shape != (set.total_size, ) or \
+           not (np.sort(perm) == np.arange(set.total_size)).all():
+            raise SetValueError("Renumbering must be a permutation of all entities of %s" % set)
+        if not (_parts(set)[perm] == _parts(set)).all():
+            raise SetValueError("Renumbering must not move entities between parts of %s" % set)
+        self.set = set
+        self.perm = perm
+        self.inverse = np.empty_like(perm)
+        self.inverse[perm] = np.arange(len(perm), dtype=IntType)
+
+    def __repr__(self):
+        return "Renumbering(%r, %r)" % (self.set, self.perm)
+
+    def from_original(self, values):
+        """Return ``values``, given per entity in the original
+        numbering, in the new numbering."""
+        return np.asarray(values)[self.perm]
+
+    def to_original(self, values):
+        """Return ``values``, given per entity in the new numbering, in
+        the original numbering.  ``values`` may exclude the halo."""
+        values = np.asarray(values)
+        n = len(values)
+        original = np.empty_like(values)
+        original[self.perm[:n]] = values
+        return original
+
+
+def _parts(set):
+    """The part (core, owned, execute halo or non-execute halo) of
+    each entity of ``set``."""
+    return np.searchsorted(np.asarray(set.sizes), np.arange(set.total_size),
+                           side='right')
+
+
+def _partitioned(set, order):
+    """Stably sort the entities in ``order`` by the part of ``set``
+    they belong to."""
+    return order[np.argsort(_parts(set)[order], kind='mergesort')]
+
+
+def _adjacency(set, maps):
+    """The graph of entities of ``set`` which share an entity through
+    any of ``maps``, in CSR format.
+
+    Entities of the iteration set of a map are adjacent if they map to
+    the same entity, entities of the target set if they are mapped to
+    by the same entity."""
+    rows = []
+    cols = []
+    for m in maps:
+        values = m.values_with_halo
+        if m.toset is set:
+            # Targets of the same source are adjacent
+            for i in range(m.arity):
+                for j in range(m.arity):
+                    rows.append(values[:, i])
+                    cols.append(values[:, j])
+        if m.iterset is set:
+            # Sources of the same target are adjacent: sort by target
+            # and pair up entries with equal targets
+            targets = values.reshape(-1)
+            sources = np.repeat(np.arange(len(values), dtype=IntType), m.arity)
+            order = np.argsort(targets, kind='mergesort')
+            targets, sources = targets[order], sources[order]
+            d = 0
+            while True:
+                d += 1
+                same = targets[d:] == targets[:-d]
+                if not same.any():
+                    break
+                rows.extend([sources[d:][same], sources[:-d][same]])
+                cols.extend([sources[:-d][same], sources[d:][same]])
+        if m.toset is not set and m.iterset is not set:
+            raise MapValueError("%s does not touch %s" % (m, set))
+    n = set.total_size
+    if rows:
+        rows = np.concatenate(rows)
+        cols = np.concatenate(cols)
+        # Negative entries mark masked out map values
+        keep = (rows >= 0) & (cols >= 0) & (rows != cols)
+        edges = np.unique(rows[keep].astype(np.int64) * n + cols[keep])
+        rows, cols = edges // n, edges % n
+    else:
+        rows = cols = np.empty(0, dtype=np.int64)
+    ptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n), out=ptr[1:])
+    return ptr, cols
+
+
+def _bfs(ptr, adj, degree, visited, start):
+    """Breadth first search from ``start`` visiting the neighbours of
+    each entity in order of increasing degree (the Cuthill-McKee
+    ordering).  Returns the levels of the search."""
+    frontier = np.array([start])
+    visited[start] = True
+    levels = []
+    while len(frontier):
+        levels.append(frontier)
+        counts = degree[frontier]
+        total = counts.sum()
+        offsets = np.repeat(ptr[frontier] - (np.cumsum(counts) - counts), counts)
+        neighbours = adj[offsets + np.arange(total)]
+        parents = np.repeat(np.arange(len(frontier)), counts)
+        unvisited = ~visited[neighbours]
+        neighbours, parents = neighbours[unvisited], parents[unvisited]
+        # Order by parent, then by degree, then by number, and keep
+        # the first occurrence of each entity
+        order = np.lexsort((neighbours, degree[neighbours], parents))
+        neighbours = neighbours[order]
+        _, first = np.unique(neighbours, return_index=True)
+        frontier = neighbours[np.sort(first)]
+        visited[frontier] = True
+    return levels
+
+
+def rcm(set, maps):
+    """Compute a reverse Cuthill-McKee :class:`Renumbering` of ``set``.
+
+    :arg set: the :class:`~pyop2.Set` to renumber.
+    :arg maps: an iterable of :class:`~pyop2.Map`\s from or to
+        ``set`` defining which entities are neighbours."""
+    if set._extruded:
+        raise NotImplementedError("Renumbering extruded sets is not supported")
+    ptr, adj = _adjacency(set, maps)
+    degree = np.diff(ptr)
+    # Entities without neighbours go last
+    isolated = np.flatnonzero(degree == 0)
+    visited = degree == 0
+    order = [isolated]
+    for start in np.argsort(degree, kind='mergesort'):
+        if visited[start]:
+            continue
+        # Start from a pseudo-peripheral entity: the entity of
+        # smallest degree in the last level of a search from the
+        # entity of smallest degree of this component
+        levels = _bfs(ptr, adj, degree, visited, start)
+        visited[np.concatenate(levels)] = False
+        last = levels[-1]
+        start = last[np.argmin(degree[last])]
+        order.extend(_bfs(ptr, adj, degree, visited, start))
+    order = np.concatenate(order)[::-1]
+    return Renumbering(set, _partitioned(set, order))
+
+
+def morton(set, coords, bits=None):
+    """Compute a :class:`Renumbering` of ``set`` along a Morton
+    (Z-order) curve.
+
+    :arg set: the :class:`~pyop2.Set` to renumber.
+    :arg coords: the coordinates of each entity of ``set``, a
+        :class:`~pyop2.Dat` or an array of shape ``(total_size, dim)``
+        (for instance the mean of the coordinates of the vertices of
+        each cell).
+    :arg bits: the number of bits per coordinate direction (defaults
+        to as many as fit into 64 bits, at most 32)."""
+    if set._extruded:
+        raise NotImplementedError("Renumbering extruded sets is not supported")
+    if isinstance(coords, Dat):
+        coords = coords.data_ro_with_halos
+    coords = np.asarray(coords, dtype=np.float64).reshape(set.total_size, -1)
+    dim = coords.shape[1]
+    bits = bits or min(64 // dim, 32)
+    lo = coords.min(axis=0)
+    extent = coords.max(axis=0) - lo
+    extent[extent == 0] = 1
+    cells = ((coords - lo) / extent * ((1 << bits) - 1)).astype(np.uint64)
+    keys = np.zeros(set.total_size, dtype=np.uint64)
+    for b in range(bits):
+        for d in range(dim):
+            bit = (cells[:, d] >> np.uint64(b)) & np.uint64(1)
+            keys |= bit << np.uint64(b * dim + d)
+    order = np.argsort(keys, kind='mergesort')
+    return Renumbering(set, _partitioned(set, order))
+
+
+def renumber(renumbering, maps=(), dats=()):
+    """Apply a :class:`Renumbering` in place.
+
+    :arg renumbering: the :class:`Renumbering` to apply.
+    :arg maps: the :class:`~pyop2.Map`\s from or to the renumbered
+        set.  Rows of maps from the set are permuted, values of maps to
+        the set are renumbered.
+    :arg dats: the :class:`~pyop2.Dat`\s defined on the renumbered set.
+
+    The :class:`~pyop2.base.Halo` of the set is renumbered as well.
+    Every map and dat on the set must be passed, objects built from
+    them (such as :class:`~pyop2.Sparsity` patterns or
+    :class:`~pyop2.Subset`\s) must be built after renumbering."""
+    set = renumbering.set
+    perm, inverse = renumbering.perm, renumbering.inverse
+    for m in maps:
+        if m.iterset is not set and m.toset is not set:
+            raise MapValueError("%s does not touch %s" % (m, set))
+    for d in dats:
+        if not isinstance(d, Dat) or isinstance(d, (DatView, MixedDat)) or d.dataset.set is not set:
+            raise DataValueError("%s is not a Dat defined on %s" % (d, set))
+    # Pending computations use the original numbering
+    _evaluate_expressions((), dats)
+    _trace.evaluate_all()
+    for m in maps:
+        values = m._values
+        if m.iterset is set:
+            values[:] = values[perm]
+        if m.toset is set:
+            valid = values >= 0
+            values[valid] = inverse[values[valid]]
+        m._cache.clear()
+    for d in dats:
+        if d._is_allocated:
+            maybe_setflags(d._data, write=True)
+            d._data[:] = d._data[perm]
+            maybe_setflags(d._data, write=False)
+    halo = set.halo
+    if halo is not None:
+        for ele in list(halo.sends.values()) + list(halo.receives.values()):
+            ele[:] = inverse[ele]
+        if halo.global_to_petsc_numbering is not None:
+            halo.global_to_petsc_numbering[:] = halo.global_to_petsc_numbering[perm]
+    set._cache.clear()
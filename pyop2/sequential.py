@@ -36,6 +36,8 @@ from __future__ import absolute_import, print_function, division
 from six.moves import range, zip
 
 import os
+import ctypes
+import numpy as np
 from textwrap import dedent
 from copy import deepcopy as dcopy
 from collections import OrderedDict
@@ -124,6 +126,89 @@ class Arg(base.Arg):
                 {'type': self.ctype,
                  'vec_name': self.c_vec_name()}
 
+    def c_batch_vec_name(self):
+        return self.c_arg_name() + "_bvec"
+
+    def c_batch_vec_dec(self, batch):
+        """Declare the buffers into which the data of a batch of
+        elements is gathered: one contiguous buffer per element, and
+        the pointers into it passed to the kernel."""
+        arity = sum(m.arity for m in self.map)
+        size = sum(m.arity * d.cdim for m, d in zip(self.map, self.data))
+        return "%(type)s %(vec_name)s_buf[%(batch)d][%(size)d];\n" \
+            "%(type)s *%(vec_name)s[%(batch)d][%(arity)d]" % \
+            {'type': self.ctype,
+             'vec_name': self.c_batch_vec_name(),
+             'batch': batch,
+             'size': size,
+             'arity': arity}
+
+    def c_batch_gather(self, lane):
+        val = []
+        vec_idx = 0
+        offset = 0
+        for i, (m, d) in enumerate(zip(self.map, self.data)):
+            for idx in range(m.arity):
+                val.append("%(vec_name)s[%(lane)s][%(idx)d] = %(vec_name)s_buf[%(lane)s] + %(offset)d;\n"
+                           "for ( int k_0 = 0; k_0 < %(dim)d; k_0++ ) %(vec_name)s[%(lane)s][%(idx)d][k_0] = (%(data)s)[k_0]" %
+                           {'vec_name': self.c_batch_vec_name(),
+                            'lane': lane,
+                            'idx': vec_idx,
+                            'offset': offset,
+                            'dim': d.cdim,
+                            'data': self.c_ind_data(idx, i)})
+                vec_idx += 1
+                offset += d.cdim
+        return ";\n".join(val)
+
+    def c_layer_data(self, idx, i):
+        # Layer j_0 of a column is the bottom entity displaced by a
+        # constant stride, so no incremental offsets are needed
+        m = self.map.split[i]
+        return "%(name)s + (%(map_name)s[i * %(arity)s + %(idx)s] + (j_0 - start_layer) * %(off)d) * %(dim)s" % \
+            {'name': self.c_arg_name(i),
+             'map_name': self.c_map_name(i, 0),
+             'arity': m.arity,
+             'idx': idx,
+             'off': m.offset[idx],
+             'dim': self.data[i].cdim}
+
+    def c_layer_gather(self, lane):
+        val = []
+        vec_idx = 0
+        offset = 0
+        for i, (m, d) in enumerate(zip(self.map, self.data)):
+            for idx in range(m.arity):
+                if self.access is INC:
+                    init = "0"
+                else:
+                    init = "(%s)[k_0]" % self.c_layer_data(idx, i)
+                val.append("%(vec_name)s[%(lane)s][%(idx)d] = %(vec_name)s_buf[%(lane)s] + %(offset)d;\n"
+                           "for ( int k_0 = 0; k_0 < %(dim)d; k_0++ ) %(vec_name)s[%(lane)s][%(idx)d][k_0] = %(init)s" %
+                           {'vec_name': self.c_batch_vec_name(),
+                            'lane': lane,
+                            'idx': vec_idx,
+                            'offset': offset,
+                            'dim': d.cdim,
+                            'init': init})
+                vec_idx += 1
+                offset += d.cdim
+        return ";\n".join(val)
+
+    def c_layer_scatter(self, lane):
+        val = []
+        vec_idx = 0
+        for i, (m, d) in enumerate(zip(self.map, self.data)):
+            for idx in range(m.arity):
+                val.append("for ( int k_0 = 0; k_0 < %(dim)d; k_0++ ) (%(data)s)[k_0] += %(vec_name)s[%(lane)s][%(idx)d][k_0]" %
+                           {'vec_name': self.c_batch_vec_name(),
+                            'lane': lane,
+                            'idx': vec_idx,
+                            'dim': d.cdim,
+                            'data': self.c_layer_data(idx, i)})
+                vec_idx += 1
+        return ";\n".join(val)
+
     def c_wrapper_dec(self):
         val = ""
         if self._is_mixed_mat:
@@ -576,7 +661,7 @@ void %(wrapper_name)s(int start,
   %(wrapper_decs)s;
   %(map_decl)s
   %(vec_decs)s;
-  for ( int n = start; n < end; n++ ) {
+  %(elem_loop)s
     %(IntType)s i = %(index_expr)s;
     %(vec_inits)s;
     %(map_init)s;
@@ -591,6 +676,68 @@ void %(wrapper_name)s(int start,
     %(extr_loop_close)s
   }
 }
+"""
+
+    _batched_wrapper = """
+void %(wrapper_name)s(int start,
+                      int end,
+                      %(ssinds_arg)s
+                      %(wrapper_args)s
+                      %(layer_arg)s) {
+  %(user_code)s
+  %(wrapper_decs)s;
+  %(batch_decs)s;
+  %(vec_decs)s;
+  int batch_end = start + (end - start) / %(batch)d * %(batch)d;
+  for ( int b = start; b < batch_end; b += %(batch)d ) {
+    for ( int l = 0; l < %(batch)d; l++ ) {
+      int n = b + l;
+      %(IntType)s i = %(index_expr)s;
+      %(batch_gather)s;
+    }
+    #pragma omp simd
+    for ( int l = 0; l < %(batch)d; l++ ) {
+      int n = b + l;
+      %(IntType)s i = %(index_expr)s;
+      %(kernel_name)s(%(batch_kernel_args)s);
+    }
+  }
+  for ( int n = batch_end; n < end; n++ ) {
+    %(IntType)s i = %(index_expr)s;
+    %(vec_inits)s;
+    %(kernel_name)s(%(kernel_args)s);
+  }
+}
+"""
+
+    _layered_wrapper = """
+void %(wrapper_name)s(int start,
+                      int end,
+                      %(ssinds_arg)s
+                      %(wrapper_args)s
+                      %(layer_arg)s) {
+  %(user_code)s
+  %(wrapper_decs)s;
+  %(batch_decs)s;
+  %(elem_loop)s
+    %(IntType)s i = %(index_expr)s;
+    for ( int b = start_layer; b < end_layer; b += %(batch)d ) {
+      int nl = end_layer - b < %(batch)d ? end_layer - b : %(batch)d;
+      for ( int l = 0; l < nl; l++ ) {
+        int j_0 = b + l;
+        %(batch_gather)s;
+      }
+      #pragma omp simd
+      for ( int l = 0; l < nl; l++ ) {
+        %(kernel_name)s(%(batch_kernel_args)s);
+      }
+      for ( int l = 0; l < nl; l++ ) {
+        int j_0 = b + l;
+        %(batch_scatter)s;
+      }
+    }
+  }
+}
 """
 
     _cppargs = []
@@ -620,12 +767,16 @@ void %(wrapper_name)s(int start,
         self.comm = itspace.comm
         self._kernel = kernel
         self._fun = None
+        self._optimised = None
         self._code_dict = None
         self._itspace = itspace
         self._args = args
         self._direct = kwargs.get('direct', False)
         self._iteration_region = kwargs.get('iterate', ALL)
         self._pass_layer_arg = kwargs.get('pass_layer_arg', False)
+        self._packed = kwargs.get('packed', False)
+        self._ranges = kwargs.get('ranges', False)
+        self._batch = self._batch_size(itspace, *args)
         # Copy the class variables, so we don't overwrite them
         self._cppargs = dcopy(type(self)._cppargs)
         self._libraries = dcopy(type(self)._libraries)
@@ -635,10 +786,66 @@ void %(wrapper_name)s(int start,
             self.compile()
             self._initialized = True
 
+    @classmethod
+    def _cache_key(cls, kernel, itspace, *args, **kwargs):
+        key = super(JITModule, cls)._cache_key(kernel, itspace, *args, **kwargs)
+        return key + (configuration['simd_batch'], configuration['layer_batch'],
+                      kwargs.get('packed', False), kwargs.get('ranges', False))
+
+    def _batch_size(self, itspace, *args):
+        """The number of elements gathered into a batch by the wrapper,
+        or 0 if the wrapper does not batch elements."""
+        if itspace._extruded:
+            batch = configuration['layer_batch']
+            return batch if batch > 1 and self._layers_batchable(args) else 0
+        batch = configuration['simd_batch']
+        # Batches of elements do not respect the runs of a Subset
+        if batch < 2 or self._ranges:
+            return 0
+        for arg in args:
+            if arg._is_mat or arg._uses_itspace or arg._is_global_reduction:
+                return 0
+            if arg._is_indirect and arg.access is not READ:
+                return 0
+        return batch
+
+    def _layers_batchable(self, args):
+        """Whether the layers of each column may be executed in
+        batches: every layer of a batch is gathered before any of them
+        is executed, so nothing read may also be written, and written
+        data must be incremented so layers sharing entities combine."""
+        if self._iteration_region not in [ALL, None] or self._pass_layer_arg:
+            return False
+        if all(arg.map is None for arg in args):
+            return False
+        read, written = set(), set()
+        for arg in args:
+            if arg._is_mat or arg._uses_itspace or arg._is_global_reduction or arg._is_dat_view:
+                return False
+            if arg._is_indirect and not arg._is_vec_map:
+                return False
+            if arg.access is READ:
+                read.add(arg.data)
+            elif arg._is_indirect and arg.access is INC:
+                written.add(arg.data)
+            else:
+                return False
+        return not (read & written)
+
     @collective
     def __call__(self, *args):
+        if self._optimised is not None:
+            self._swap_optimised()
         return self._fun(*args)
 
+    def _swap_optimised(self):
+        """Replace the quickly built function by the optimised one once
+        it is built, see :func:`~.compilation.load_tiered`."""
+        fun = self._optimised.poll()
+        if fun is not None:
+            self._fun = fun
+            self._optimised = None
+
     @property
     def _wrapper_name(self):
         return 'wrap_%s' % self._kernel.name
@@ -649,6 +856,68 @@ void %(wrapper_name)s(int start,
         if not hasattr(self, '_args'):
             raise RuntimeError("JITModule has no args associated with it, should never happen")
 
+        code_to_compile, extension, fn_name, cppargs, ldargs = self._build_args()
+
+        self._dump_generated_code(code_to_compile)
+        if configuration["debug"]:
+            self._wrapper_code = code_to_compile
+
+        if configuration['tiered_compilation']:
+            self._fun, self._optimised = compilation.load_tiered(code_to_compile,
+                                                                 extension,
+                                                                 fn_name,
+                                                                 cppargs=cppargs,
+                                                                 ldargs=ldargs,
+                                                                 argtypes=self._argtypes,
+                                                                 restype=None,
+                                                                 compiler=coffee.system.compiler.get('name'),
+                                                                 comm=self.comm)
+        else:
+            self._fun = compilation.load(code_to_compile,
+                                         extension,
+                                         fn_name,
+                                         cppargs=cppargs,
+                                         ldargs=ldargs,
+                                         argtypes=self._argtypes,
+                                         restype=None,
+                                         compiler=coffee.system.compiler.get('name'),
+                                         comm=self.comm)
+        self._release()
+        return self._fun
+
+    def _release(self):
+        """Blow away everything we don't need any more once the code is
+        built."""
+        del self._args
+        del self._kernel
+        del self._itspace
+        del self._direct
+
+    def prefetch(self):
+        """Start building the code of this :class:`JITModule` in the
+        background, see :func:`~.compilation.prefetch`.
+
+        Only useful on a :class:`JITModule` constructed with
+        ``delay=True``, which is then compiled by constructing it again
+        without."""
+        if self._fun is not None or not hasattr(self, '_args'):
+            return
+        code_to_compile, extension, _, cppargs, ldargs = self._build_args()
+        compilation.prefetch(code_to_compile,
+                             extension,
+                             cppargs=cppargs,
+                             ldargs=ldargs,
+                             compiler=coffee.system.compiler.get('name'),
+                             comm=self.comm)
+        # Do not keep the arguments alive in the cache
+        self._release()
+
+    def _build_args(self):
+        """Generate the code of this :class:`JITModule`.
+
+        :returns: the code, its file extension, the name of the entry
+            point and the compiler and linker arguments to build it
+            with."""
         compiler = coffee.system.compiler
         externc_open = '' if not self._kernel._cpp else 'extern "C" {'
         externc_close = '' if not self._kernel._cpp else '}'
@@ -667,7 +936,13 @@ void %(wrapper_name)s(int start,
             %(code)s
             """ % {'code': self._kernel.code(),
                    'header': headers}
-        code_to_compile = strip(dedent(self._wrapper) % self.generate_code())
+        if self._batch and self._itspace._extruded:
+            wrapper = self._layered_wrapper
+        elif self._batch:
+            wrapper = self._batched_wrapper
+        else:
+            wrapper = self._wrapper
+        code_to_compile = strip(dedent(wrapper) % self.generate_code())
 
         code_to_compile = """
         #include <petsc.h>
@@ -687,12 +962,12 @@ void %(wrapper_name)s(int start,
                'externc_close': externc_close,
                'sys_headers': '\n'.join(self._kernel._headers + self._system_headers)}
 
-        self._dump_generated_code(code_to_compile)
-        if configuration["debug"]:
-            self._wrapper_code = code_to_compile
+        fn_name = self._wrapper_name
+        if self._packed:
+            fn_name, code_to_compile = self._packed_entry(code_to_compile)
 
         extension = self._extension
-        cppargs = self._cppargs
+        cppargs = list(self._cppargs)
         cppargs += ["-I%s/include" % d for d in get_petsc_dir()] + \
                    ["-I%s" % d for d in self._kernel._include_dirs] + \
                    ["-I%s" % os.path.abspath(os.path.dirname(__file__))]
@@ -705,21 +980,42 @@ void %(wrapper_name)s(int start,
 
         if self._kernel._cpp:
             extension = "cpp"
-        self._fun = compilation.load(code_to_compile,
-                                     extension,
-                                     self._wrapper_name,
-                                     cppargs=cppargs,
-                                     ldargs=ldargs,
-                                     argtypes=self._argtypes,
-                                     restype=None,
-                                     compiler=compiler.get('name'),
-                                     comm=self.comm)
-        # Blow away everything we don't need any more
-        del self._args
-        del self._kernel
-        del self._itspace
-        del self._direct
-        return self._fun
+        return code_to_compile, extension, fn_name, cppargs, ldargs
+
+    def _packed_entry(self, code):
+        """Add an entry point taking the wrapper arguments packed into
+        one array to the generated code.
+
+        Calling a ctypes function converts each argument separately,
+        which for loops over many :class:`Dat`\s and :class:`Map`\s
+        costs more than the loop itself on small sets.  The packed
+        entry point only has three arguments.
+
+        :returns: the name of the entry point and the new code."""
+        index_type = as_ctypes(IntType)
+        types = [as_cstr(IntType) if t is index_type else "void *"
+                 for t in self._argtypes[2:]]
+        name = self._wrapper_name + "_packed"
+        if self._kernel._cpp:
+            # C++ does not convert void * to other pointer types
+            fun = "((void (*)(int, int%s))%s)" % (
+                "".join(", " + t for t in types), self._wrapper_name)
+        else:
+            fun = self._wrapper_name
+        code += """
+        %(externc_open)s
+        void %(name)s(int start, int end, intptr_t *args)
+        {
+          %(fun)s(start, end%(args)s);
+        }
+        %(externc_close)s
+        """ % {'name': name,
+               'fun': fun,
+               'args': "".join(", (%s)args[%d]" % (t, i) for i, t in enumerate(types)),
+               'externc_open': '' if not self._kernel._cpp else 'extern "C" {',
+               'externc_close': '' if not self._kernel._cpp else '}'}
+        self._argtypes = [index_type, index_type, ctypes.c_voidp]
+        return name, code
 
     def generate_code(self):
         if not self._code_dict:
@@ -728,7 +1024,9 @@ void %(wrapper_name)s(int start,
                                                user_code=self._kernel._user_code,
                                                wrapper_name=self._wrapper_name,
                                                iteration_region=self._iteration_region,
-                                               pass_layer_arg=self._pass_layer_arg)
+                                               pass_layer_arg=self._pass_layer_arg,
+                                               batch=self._batch,
+                                               ranges=self._ranges)
         return self._code_dict
 
     def set_argtypes(self, iterset, *args):
@@ -752,6 +1050,7 @@ void %(wrapper_name)s(int start,
         if iterset._extruded:
             argtypes.append(index_type)
             argtypes.append(index_type)
+            argtypes.append(index_type)
 
         self._argtypes = argtypes
 
@@ -761,7 +1060,10 @@ class ParLoop(petsc_base.ParLoop):
     def prepare_arglist(self, iterset, *args):
         arglist = []
         if isinstance(iterset, Subset):
-            arglist.append(iterset._indices.ctypes.data)
+            if self._iterates_ranges:
+                arglist.append(iterset._ranges.ctypes.data)
+            else:
+                arglist.append(iterset._indices.ctypes.data)
 
         for arg in args:
             if arg._is_mat:
@@ -799,21 +1101,102 @@ class ParLoop(petsc_base.ParLoop):
         return arglist
 
     @cached_property
-    def _jitmodule(self):
+    def _iterates_ranges(self):
+        """Is the iteration :class:`Subset` passed to the wrapper as
+        runs of contiguous elements, rather than element by element?"""
+        iterset = self.iterset
+        return isinstance(iterset, Subset) and iterset._ranges is not None
+
+    @cached_property
+    def _packed_arglist(self):
+        """The argument list packed into one array, for calling a
+        :class:`JITModule` with a packed entry point."""
+        self._packed_args = np.array(self.arglist, dtype=np.intp)
+        return (self._packed_args.ctypes.data, )
+
+    def _make_jitmodule(self, **kwargs):
         return JITModule(self.kernel, self.it_space, *self.args,
                          direct=self.is_direct, iterate=self.iteration_region,
-                         pass_layer_arg=self._pass_layer_arg)
+                         pass_layer_arg=self._pass_layer_arg,
+                         packed=configuration['packed_args'],
+                         ranges=self._iterates_ranges, **kwargs)
+
+    @cached_property
+    def _jitmodule(self):
+        return self._make_jitmodule()
+
+    def _prefetch(self):
+        self._make_jitmodule(delay=True).prefetch()
 
     @collective
     def _compute(self, part, fun, *arglist):
+        if fun._packed:
+            arglist = self._packed_arglist
         with timed_region("ParLoop%s" % self.iterset.name):
             fun(part.offset, part.offset + part.size, *arglist)
             self.log_flops()
 
+    def _start_concurrent(self):
+        super(ParLoop, self)._start_concurrent()
+        fun = self._jitmodule
+        if fun._optimised is not None:
+            fun._swap_optimised()
+        # Build the arguments here, allocating data if needed, so that
+        # the workers only call the compiled code.
+        arglist = tuple(self._packed_arglist if fun._packed else self.arglist)
+        self._concurrent_calls = [(fun._fun, (part.offset, part.offset + part.size) + arglist)
+                                  for part in self._parts]
+
+    def _compute_concurrent(self):
+        for fn, args in self._concurrent_calls:
+            fn(*args)
+
+
+@collective
+def compile_batch(comps):
+    """Build the code of the :class:`ParLoop`\s among the delayed
+    computations ``comps`` which is not compiled yet into one shared
+    library, see :func:`~.compilation.load_batch`."""
+    if configuration['tiered_compilation']:
+        return
+    groups = []
+    for comp in comps:
+        if type(comp) is not ParLoop or '_jitmodule' in comp.__dict__:
+            continue
+        jitmodule = comp._make_jitmodule(delay=True)
+        if jitmodule._fun is not None or not hasattr(jitmodule, '_args'):
+            continue
+        for group in groups:
+            if group[0].comm == jitmodule.comm:
+                if not any(m is jitmodule for m in group):
+                    group.append(jitmodule)
+                break
+        else:
+            groups.append([jitmodule])
+    for group in groups:
+        if len(group) < 2:
+            continue
+        requests = []
+        for jitmodule in group:
+            code_to_compile, extension, fn_name, cppargs, ldargs = jitmodule._build_args()
+            jitmodule._dump_generated_code(code_to_compile)
+            if configuration["debug"]:
+                jitmodule._wrapper_code = code_to_compile
+            requests.append((code_to_compile, extension, fn_name, cppargs, ldargs,
+                             jitmodule._argtypes, None))
+        funs = compilation.load_batch(requests,
+                                      compiler=coffee.system.compiler.get('name'),
+                                      comm=group[0].comm)
+        for jitmodule, fun in zip(group, funs):
+            jitmodule._fun = fun
+            jitmodule._release()
+            jitmodule._initialized = True
+
 
 def wrapper_snippets(itspace, args,
                      kernel_name=None, wrapper_name=None, user_code=None,
-                     iteration_region=ALL, pass_layer_arg=False):
+                     iteration_region=ALL, pass_layer_arg=False, batch=0,
+                     ranges=False):
     """Generates code snippets for the wrapper,
     ready to be into a template.
 
@@ -825,6 +1208,10 @@ def wrapper_snippets(itspace, args,
     :param wrapper_name: Wrapper function name (forwarded)
     :param iteration_region: Iteration region, this is specified when
                              creating a :class:`ParLoop`.
+    :param batch: Number of elements gathered into a batch (0 if
+                  the wrapper does not batch elements).
+    :param ranges: Is the iteration :class:`Subset` passed as runs of
+                   contiguous elements rather than element by element?
 
     :return: dict containing the code snippets
     """
@@ -850,9 +1237,16 @@ def wrapper_snippets(itspace, args,
     is_top = (iteration_region == ON_TOP)
     is_facet = (iteration_region == ON_INTERIOR_FACETS)
 
+    _elem_loop = "for ( int n = start; n < end; n++ ) {"
     if isinstance(itspace._iterset, Subset):
         _ssinds_arg = "%s* ssinds," % as_cstr(IntType)
         _index_expr = "ssinds[n]"
+    if ranges:
+        # ssinds holds (position, index) pairs starting each run
+        _elem_loop = "for ( int r = 0; ssinds[2 * r] < end; r++ )\n" \
+            "  for ( int n = start > ssinds[2 * r] ? start : ssinds[2 * r]; " \
+            "n < end && n < ssinds[2 * r + 2]; n++ ) {"
+        _index_expr = "ssinds[2 * r + 1] + (n - ssinds[2 * r])"
 
     _wrapper_args = ', '.join([arg.c_wrapper_arg() for arg in args])
 
@@ -939,6 +1333,29 @@ def wrapper_snippets(itspace, args,
     if pass_layer_arg:
         _kernel_args += ", j_0"
 
+    # Batched wrappers stage the data of READ vector map arguments for
+    # a batch of elements in per-element buffers ([batch][arity*cdim]),
+    # then call the unchanged kernel once per element under
+    # "omp simd": the calls only vectorise if the compiler inlines the
+    # kernel.  On extruded sets the batch is a block of layers of one
+    # column, and INC arguments are accumulated in zeroed buffers that
+    # are scattered afterwards.
+    _batch_decs = ';\n'.join([arg.c_batch_vec_dec(batch) for arg in args
+                              if batch and arg._is_vec_map])
+    if itspace._extruded:
+        _batch_gather = ';\n'.join([arg.c_layer_gather('l') for arg in args
+                                    if batch and arg._is_vec_map])
+    else:
+        _batch_gather = ';\n'.join([arg.c_batch_gather('l') for arg in args
+                                    if batch and arg._is_vec_map])
+    _batch_scatter = ';\n'.join([arg.c_layer_scatter('l') for arg in args
+                                 if batch and arg._is_vec_map and arg.access is INC])
+    _batch_kernel_args = ""
+    if batch:
+        _batch_kernel_args = ', '.join(["%s[l]" % arg.c_batch_vec_name() if arg._is_vec_map
+                                        else arg.c_kernel_arg(count)
+                                        for count, arg in enumerate(args)])
+
     _buf_gather = ";\n".join(_buf_gather.values())
     _buf_decl = ";\n".join(_buf_decl.values())
 
@@ -1014,6 +1431,7 @@ def wrapper_snippets(itspace, args,
     return {'kernel_name': kernel_name,
             'wrapper_name': wrapper_name,
             'ssinds_arg': _ssinds_arg,
+            'elem_loop': indent(_elem_loop, 1),
             'index_expr': _index_expr,
             'wrapper_args': _wrapper_args,
             'user_code': user_code,
@@ -1034,6 +1452,11 @@ def wrapper_snippets(itspace, args,
             'buffer_decl': _buf_decl,
             'buffer_gather': _buf_gather,
             'kernel_args': _kernel_args,
+            'batch': batch,
+            'batch_decs': indent(_batch_decs, 1),
+            'batch_gather': indent(_batch_gather, 3),
+            'batch_scatter': indent(_batch_scatter, 4),
+            'batch_kernel_args': _batch_kernel_args,
             'IntType': as_cstr(IntType),
             'itset_loop_body': '\n'.join([itset_loop_body(i, j, shape, offsets, is_facet=(iteration_region == ON_INTERIOR_FACETS))
                                           for i, j, shape, offsets in itspace])}
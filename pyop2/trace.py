@@ -0,0 +1,373 @@
+# This file is part of PyOP2
+#
+# PyOP2 is Copyright (c) 2012, Imperial College London and
+# others. Please see the AUTHORS file in the main source directory for
+# a full list of copyright holders.  All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * The name of Imperial College London or that of other
+#       contributors may not be used to endorse or promote products
+#       derived from this software without specific prior written
+#       permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTERS
+# ''AS IS'' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDERS OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED
+# OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""Compilation of sequences of lazily evaluated :func:`~pyop2.par_loop`\s
+into a single native call.
+
+When the ``compile_trace`` configuration option is set, the
+:class:`~pyop2.base.ExecutionTrace` hands the computations it is about
+to execute to :func:`run`.  Consecutive sequential loops over sets
+which are not extruded and which do not assemble a
+:class:`~pyop2.Mat` are executed through a :class:`TraceModule`, a
+shared library whose entry point calls the compiled wrappers of all
+loops in order.  Halo exchanges and global reductions are performed by
+calling back into Python at the loop boundaries where
+:meth:`~pyop2.base.ParLoop.compute` performs them, so loops which
+communicate are fused as well.  Any other computation runs as usual
+between such sequences.
+
+The arguments of a sequence are resolved once, and reused whenever the
+same loops run on the same data again, as on each time step of a
+simulation.
+
+Computations recorded with :func:`~pyop2.op2.capture` are replayed
+through the same sequences, regardless of ``compile_trace``.
+"""
+from __future__ import absolute_import, print_function, division
+
+import collections
+import ctypes
+import sys
+from functools import partial
+import numpy as np
+import six
+from petsc4py import PETSc
+
+from pyop2 import compilation, sequential
+from pyop2.base import INC, WRITE, RW
+from pyop2.caching import Cached
+from pyop2.datatypes import IntType, as_cstr
+from pyop2.profiling import timed_region
+
+import coffee.system
+
+
+_HOOK = -1
+"""Step of a :class:`TraceModule` calling back into Python."""
+
+_hook_t = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_int)
+
+
+class TraceModule(Cached):
+
+    """Cached shared library calling a sequence of compiled
+    :class:`~pyop2.sequential.ParLoop` wrappers.
+
+    :arg signatures: the C types of the arguments of each wrapper.
+    :arg steps: the steps of the entry point: the index of the wrapper
+        to call over the next range of the iteration set, or
+        ``_HOOK`` to call the next hook.
+    :kwarg comm: the communicator to compile the library on.
+
+    The compiled wrappers are not part of the library: their addresses,
+    ranges and arguments are passed on each call, so a sequence of loops
+    with the same argument types (for instance the loops of each time
+    step of a simulation) always hits the cache.  The entry point
+    returns early if a hook returns non-zero."""
+
+    _cache = {}
+
+    @classmethod
+    def _cache_key(cls, signatures, steps, comm=None):
+        return signatures, steps
+
+    def __init__(self, signatures, steps, comm=None):
+        if self._initialized:
+            return
+        lines = ["#include <stdint.h>", ""]
+        for i, sig in enumerate(signatures):
+            lines.append("typedef void (*wrapper_%d_t)(%s);" % (i, ", ".join(sig)))
+        lines.extend(["typedef int (*hook_t)(int);",
+                      "",
+                      "void pyop2_trace(void **fns, intptr_t *args, intptr_t *ranges, hook_t hook)",
+                      "{"])
+        offsets = [0]
+        for sig in signatures:
+            offsets.append(offsets[-1] + len(sig) - 2)
+        nranges = 0
+        nhooks = 0
+        for step in steps:
+            if step == _HOOK:
+                lines.append("  if (hook(%d)) return;" % nhooks)
+                nhooks += 1
+                continue
+            sig = signatures[step]
+            call = ["(%s)ranges[%d]" % (sig[0], 2 * nranges),
+                    "(%s)ranges[%d]" % (sig[1], 2 * nranges + 1)]
+            call.extend("(%s)args[%d]" % (t, offsets[step] + j) for j, t in enumerate(sig[2:]))
+            lines.append("  ((wrapper_%d_t)fns[%d])(%s);" % (step, step, ", ".join(call)))
+            nranges += 1
+        lines.append("}")
+        self._code = "\n".join(lines) + "\n"
+        self._fun = compilation.load(self._code, "c", "pyop2_trace",
+                                     argtypes=[ctypes.c_voidp, ctypes.c_voidp,
+                                               ctypes.c_voidp, ctypes.c_voidp],
+                                     restype=None,
+                                     compiler=coffee.system.compiler.get('name'),
+                                     comm=comm)
+        self._initialized = True
+
+    def __call__(self, fns, args, ranges, hook=None):
+        """Call the wrappers.
+
+        :arg fns: the addresses of the wrappers.
+        :arg args: the arguments of all wrappers but the range of the
+            iteration set, concatenated.
+        :arg ranges: the bounds of the range of each call.
+        :arg hook: the address of the function called at each hook."""
+        fns = np.asarray(fns, dtype=np.uintp)
+        args = np.asarray(args, dtype=np.intp)
+        ranges = np.asarray(ranges, dtype=np.intp)
+        self._fun(fns.ctypes.data, args.ctypes.data, ranges.ctypes.data, hook)
+
+
+def _signature(argtypes):
+    """The C types of the arguments of a wrapper."""
+    return tuple("void *" if t is ctypes.c_voidp else as_cstr(IntType)
+                 for t in argtypes)
+
+
+def compilable(comp):
+    """Can the delayed computation ``comp`` be executed as part of a
+    :class:`TraceModule`?"""
+    return type(comp) is sequential.ParLoop and \
+        not comp.is_layered and \
+        not any(arg._is_mat for arg in comp.args)
+
+
+def _zero(globs):
+    for g in globs:
+        g._data[...] = 0
+
+
+class _Sequence(object):
+
+    """A sequence of :func:`compilable` loops executed with one native
+    call, whose arguments are resolved once.
+
+    Each loop runs over the parts of its iteration set as in
+    :meth:`~pyop2.base.ParLoop.compute`, with its halo exchanges and
+    reductions as hooks in between.  In serial, halo exchanges do
+    nothing and are left out, and the state of the data is updated
+    once for the whole sequence."""
+
+    def __init__(self, loops):
+        self.loops = loops
+        comm = loops[0].comm
+        parallel = comm.size > 1
+        fns = []
+        args = []
+        signatures = []
+        self._steps = []
+        self._ranges = []
+        self._hooks = []
+
+        for i, loop in enumerate(loops):
+            fun = loop._jitmodule
+            fns.append(ctypes.cast(fun._fun, ctypes.c_void_p).value)
+            args.extend(loop._packed_arglist if fun._packed else loop.arglist)
+            signatures.append(_signature(fun._argtypes))
+            iterset = loop.iterset
+            exchange = parallel and not loop.is_direct
+            reduce = bool(loop.global_reduction_args)
+            pre = []
+            if loop._reduced_globals:
+                # INC globals must be zero on entry
+                pre.append(partial(_zero, list(loop._reduced_globals)))
+            if exchange:
+                pre.append(loop.halo_exchange_begin)
+            self._add_hook(pre)
+            self._add_run(i, iterset.core_part)
+            if exchange:
+                self._add_hook([loop.halo_exchange_end])
+            self._add_run(i, iterset.owned_part)
+            mid = []
+            if reduce:
+                mid.append(loop.reduction_begin)
+            if parallel and loop._only_local:
+                mid.extend([loop.reverse_halo_exchange_begin, loop.reverse_halo_exchange_end])
+            self._add_hook(mid)
+            if loop.needs_exec_halo:
+                self._add_run(i, iterset.exec_part)
+            post = []
+            if reduce:
+                post.append(loop.reduction_end)
+            if parallel:
+                # Later loops exchange the halos of the data written
+                post.append(loop.update_arg_data_state)
+            self._add_hook(post)
+
+        self._module = TraceModule(tuple(signatures), tuple(self._steps), comm=comm)
+        self._fns = np.asarray(fns, dtype=np.uintp)
+        self._args = np.asarray(args, dtype=np.intp)
+        self._ranges = np.asarray(self._ranges, dtype=np.intp)
+        self._hook = _hook_t(self._call_hook) if self._hooks else None
+        self._error = None
+        # In serial, the state of the data is updated once, afterwards
+        self._written = []
+        self._dats = []
+        if not parallel:
+            for loop in loops:
+                for arg in loop.dat_args:
+                    if arg.access in [INC, WRITE, RW] and \
+                       not any(arg.data is d for d in self._written):
+                        self._written.append(arg.data)
+                    self._dats.extend(d for d in arg.data
+                                      if not any(d is e for e in self._dats))
+        self._flops = sum(loop.num_flops for loop in loops)
+        # Loops still running quickly built code, see
+        # configuration['tiered_compilation']
+        self._tiered = [i for i, loop in enumerate(loops)
+                        if loop._jitmodule._optimised is not None]
+
+    def _add_hook(self, actions):
+        """Call ``actions`` at this point of the sequence."""
+        if not actions:
+            return
+        if self._steps and self._steps[-1] == _HOOK:
+            self._hooks[-1].extend(actions)
+        else:
+            self._steps.append(_HOOK)
+            self._hooks.append(actions)
+
+    def _add_run(self, i, part):
+        """Call the wrapper of loop ``i`` over ``part``.  The parts of
+        an iteration set are contiguous, so consecutive parts with no
+        hook in between are run with one call.  Empty parts are not
+        skipped, so that all ranks build the same :class:`TraceModule`."""
+        if self._steps and self._steps[-1] == i:
+            self._ranges[-1][1] = part.offset + part.size
+        else:
+            self._steps.append(i)
+            self._ranges.append([part.offset, part.offset + part.size])
+
+    def _call_hook(self, k):
+        # Exceptions must not propagate through the native code
+        try:
+            for action in self._hooks[k]:
+                action()
+        except Exception:
+            self._error = sys.exc_info()
+            return 1
+        return 0
+
+    def _swap_optimised(self):
+        """Call the optimised wrappers of the loops once built."""
+        for i in list(self._tiered):
+            fun = self.loops[i]._jitmodule
+            fun._swap_optimised()
+            if fun._optimised is None:
+                self._fns[i] = ctypes.cast(fun._fun, ctypes.c_void_p).value
+                self._tiered.remove(i)
+
+    def __call__(self):
+        if self._tiered:
+            self._swap_optimised()
+        with timed_region("ParLoopTrace"):
+            self._module(self._fns, self._args, self._ranges, self._hook)
+            if self._error is not None:
+                error, self._error = self._error, None
+                six.reraise(*error)
+            for d in self._written:
+                d.needs_halo_update = True
+            for d in self._dats:
+                d._data.setflags(write=False)
+            PETSc.Log.logFlops(self._flops)
+
+
+_sequences = collections.OrderedDict()
+"""The most recently executed :class:`_Sequence`\s, by the loops they
+execute, see :func:`_key`."""
+
+_max_sequences = 64
+"""How many :class:`_Sequence`\s to keep in ``_sequences``."""
+
+
+def _key(loops):
+    """The key of a sequence of loops in ``_sequences``.
+
+    Loops with the same code over the same sets and with the same
+    argument pointers run the same sequence.  The temporaries into
+    which loops reduce :class:`~pyop2.Global`\s are specific to each
+    loop, so the pointer of the reduced :class:`~pyop2.Global` is used
+    instead.  The cached sequence references the data of its loops,
+    so none of these pointers may be reused while it is cached."""
+    key = []
+    for loop in loops:
+        arglist = loop.arglist
+        if loop._reduced_globals:
+            tmps = dict((tmp._data.ctypes.data, glob._data.ctypes.data)
+                        for tmp, glob in six.iteritems(loop._reduced_globals))
+            arglist = [tmps.get(a, a) for a in arglist]
+        key.append((loop._jitmodule, id(loop.iterset), tuple(arglist)))
+    return tuple(key)
+
+
+def schedule(comps):
+    """Return callables executing a list of delayed computations in
+    order, each sequence of at least two consecutive :func:`compilable`
+    loops on the same communicator through a :class:`TraceModule`."""
+    calls = []
+    loops = []
+    for comp in comps:
+        if compilable(comp):
+            if loops and comp.comm != loops[0].comm:
+                calls.extend(_sequence(loops))
+                loops = []
+            loops.append(comp)
+            continue
+        calls.extend(_sequence(loops))
+        loops = []
+        calls.append(comp._run)
+    calls.extend(_sequence(loops))
+    return calls
+
+
+def _sequence(loops):
+    if len(loops) < 2:
+        return [loop._run for loop in loops]
+    key = _key(loops)
+    sequence = _sequences.pop(key, None)
+    if sequence is None:
+        sequence = _Sequence(loops)
+        if len(_sequences) >= _max_sequences:
+            _sequences.popitem(last=False)
+    _sequences[key] = sequence
+    return [sequence]
+
+
+def run(comps):
+    """Execute a list of delayed computations, see :func:`schedule`."""
+    for call in schedule(comps):
+        call()
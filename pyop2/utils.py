@@ -259,6 +259,16 @@ def flatten(iterable):
     return (x for e in iterable for x in e)
 
 
+def resident_memory():
+    """Return the resident set size of this process in bytes, or 0
+    where it cannot be determined."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (IOError, OSError, ValueError):
+        return 0
+
+
 def parser(description=None, group=False):
     """Create default argparse.ArgumentParser parser for pyop2 programs."""
     parser = argparse.ArgumentParser(description=description,
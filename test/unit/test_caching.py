@@ -37,7 +37,12 @@ from six.moves import range
 import pytest
 import numpy
 import random
-from pyop2 import op2, base
+import ctypes
+import json
+import sqlite3
+import time
+from contextlib import closing
+from pyop2 import op2, base, compilation
 
 from coffee.base import *
 
@@ -399,6 +404,42 @@ class TestGeneratedCodeCache:
         base._trace.evaluate(set([a]), set())
         assert len(self.cache) == 2
 
+    def test_prefetch(self, skip_greedy, iterset, iter2ind1, x, a, reconfigure):
+        self.cache.clear()
+        kernel_cpy = "void kernel_cpy(unsigned int* dst, unsigned int* src) { *dst = *src; }"
+        with reconfigure(compile_threads=2):
+            op2.par_loop(op2.Kernel(kernel_cpy, "kernel_cpy"),
+                         iterset,
+                         a(op2.WRITE),
+                         x(op2.READ, iter2ind1[0]))
+            # Queued, not compiled yet
+            jitmodule, = self.cache.values()
+            assert jitmodule._fun is None
+
+            base._trace.evaluate(set([a]), set())
+        assert len(self.cache) == 1
+        assert jitmodule._fun is not None
+        assert not compilation._prefetched
+        assert all(a.data_ro == x.data_ro[iter2ind1.values[:, 0]])
+
+    def test_batch_compilation(self, skip_greedy, iterset, iter2ind1, x, a, b, reconfigure):
+        self.cache.clear()
+        kernel_cpy = "void kernel_cpy(unsigned int* dst, unsigned int* src) { *dst = *src; }"
+        kernel_inc = "void kernel_inc(unsigned int* dst) { *dst += 1; }"
+        with reconfigure(batch_compilation=True):
+            op2.par_loop(op2.Kernel(kernel_cpy, "kernel_cpy"),
+                         iterset,
+                         a(op2.WRITE),
+                         x(op2.READ, iter2ind1[0]))
+            op2.par_loop(op2.Kernel(kernel_inc, "kernel_inc"),
+                         iterset,
+                         b(op2.RW))
+            base._trace.evaluate_all()
+        assert len(self.cache) == 2
+        assert all(jitmodule._fun is not None for jitmodule in self.cache.values())
+        assert all(a.data_ro == x.data_ro[iter2ind1.values[:, 0]])
+        assert all(b.data_ro == numpy.arange(1, nelems + 1))
+
     def test_invert_arg_similar_shape(self, iterset, iter2ind1, x, y):
         self.cache.clear()
         assert len(self.cache) == 0
@@ -602,6 +643,196 @@ class TestKernelCache:
         k2 = op2.Kernel("void l(void *x) {}", 'l')
         assert k1 is not k2 and len(self.cache) == 2
 
+    def test_kernel_cache_stats(self):
+        """Kernel cache hits and misses should be counted."""
+        self.cache.clear()
+        before = dict(op2.compilation_stats()["memory"].get("Kernel", {"hits": 0, "misses": 0}))
+        op2.Kernel("void k(void *x) {}", 'k')
+        op2.Kernel("void k(void *x) {}", 'k')
+        stats = op2.compilation_stats()["memory"]["Kernel"]
+        assert stats["misses"] == before["misses"] + 1
+        assert stats["hits"] == before["hits"] + 1
+
+
+class TestDiskCache:
+
+    """
+    Compiled library cache tests.
+    """
+
+    @pytest.fixture(autouse=True)
+    def cache_dir(self, tmpdir, reconfigure):
+        with reconfigure(cache_dir=str(tmpdir)):
+            yield tmpdir
+
+    @pytest.fixture
+    def manifest(self, reconfigure):
+        # Loads are only recorded if the cache is bounded
+        with reconfigure(cache_max_size=1 << 40):
+            yield
+
+    @pytest.fixture
+    def libraries(self, cache_dir):
+        names = ["lib%d" % i for i in range(3)]
+        for i, name in enumerate(names):
+            lib = cache_dir.join(name + ".so")
+            lib.write("x" * 100)
+            cache_dir.join(name + "_p1.c").write("")
+            # lib0 is the least recently used
+            lib.setmtime(1000 * (i + 1))
+        return names
+
+    def test_prune_max_size(self, cache_dir, libraries):
+        compilation.prune_cache(max_size=250)
+        assert not cache_dir.join("lib0.so").check()
+        assert not cache_dir.join("lib0_p1.c").check()
+        assert cache_dir.join("lib1.so").check()
+        assert cache_dir.join("lib2.so").check()
+
+    def test_prune_accessed(self, cache_dir, libraries, manifest):
+        compilation.prune_cache()
+        compilation._record_access("lib0")
+        compilation.prune_cache(max_size=250)
+        assert cache_dir.join("lib0.so").check()
+        assert not cache_dir.join("lib1.so").check()
+
+    def test_evict_keeps_loaded(self, cache_dir, libraries, reconfigure):
+        # The libraries built before the manifest are evicted too
+        with reconfigure(cache_max_size=1):
+            compilation.load("int add_five(int x) { return x + 5; }", "c", "add_five")
+            compilation.load("int add_six(int x) { return x + 6; }", "c", "add_six")
+        assert not any(cache_dir.join(name + ".so").check() for name in libraries)
+        assert len(cache_dir.listdir("*.so")) == 2
+
+    def test_manifest_untouched_when_unbounded(self, cache_dir):
+        compilation.load("int add_seven(int x) { return x + 7; }", "c", "add_seven")
+        assert not cache_dir.join("manifest.sqlite").check()
+
+    def test_node_local_compilation(self, cache_dir, reconfigure):
+        with reconfigure(node_local_compilation=True,
+                         node_cache_dir=str(cache_dir.join("node"))):
+            fn = compilation.load("int add_one(int x) { return x + 1; }", "c", "add_one")
+        assert fn(1) == 2
+        assert len(cache_dir.join("node").listdir("*.so")) == 1
+
+    def test_node_local_prefetch(self, cache_dir, reconfigure):
+        src = "int add_eleven(int x) { return x + 11; }"
+        with reconfigure(node_local_compilation=True, compile_threads=2,
+                         node_cache_dir=str(cache_dir.join("node"))):
+            compilation.prefetch(src, "c")
+            # Built in the background by the rank assigned the library
+            assert len(compilation._prefetched) == 1
+            fn = compilation.load(src, "c", "add_eleven", argtypes=[ctypes.c_int],
+                                  restype=ctypes.c_int)
+        assert fn(1) == 12
+        assert not compilation._prefetched
+        assert len(cache_dir.listdir("*.so")) == 1
+        assert len(cache_dir.join("node").listdir("*.so")) == 1
+
+    def test_node_local_hit_recorded(self, cache_dir, manifest, reconfigure):
+        src = "int add_ten(int x) { return x + 10; }"
+        with reconfigure(node_local_compilation=True,
+                         node_cache_dir=str(cache_dir.join("node"))):
+            compilation.load(src, "c", "add_ten")
+            with closing(sqlite3.connect(str(cache_dir.join("manifest.sqlite")))) as conn, conn:
+                conn.execute("UPDATE libraries SET accessed = 0")
+            fn = compilation.load(src, "c", "add_ten")
+        assert fn(1) == 11
+        with closing(sqlite3.connect(str(cache_dir.join("manifest.sqlite")))) as conn:
+            (accessed, ), = conn.execute("SELECT accessed FROM libraries").fetchall()
+        assert accessed > 0
+
+    def test_precompile(self, cache_dir, reconfigure):
+        manifest = str(cache_dir.join("manifest.jsonl"))
+        with reconfigure(compilation_manifest=manifest):
+            fn = compilation.load("int add_two(int x) { return x + 2; }", "c", "add_two")
+        assert fn(1) == 3
+        lib, = cache_dir.listdir("*.so")
+        lib.remove()
+        assert compilation.precompile(manifest) == (1, 0)
+        assert lib.check()
+        assert compilation.precompile(manifest) == (0, 1)
+
+    def test_precompile_batch(self, cache_dir, reconfigure):
+        manifest = str(cache_dir.join("manifest.jsonl"))
+        requests = [("int sub_%d(int x) { return x - %d; }" % (i, i), "c", "sub_%d" % i,
+                     [], [], [ctypes.c_int], ctypes.c_int) for i in (1, 2)]
+        with reconfigure(compilation_manifest=manifest):
+            fns = compilation.load_batch(requests)
+        assert [fn(3) for fn in fns] == [2, 1]
+        lib, = cache_dir.listdir("batch_*.so")
+        lib.remove()
+        assert compilation.precompile(manifest) == (1, 0)
+        assert lib.check()
+
+    def test_load_batch_leaves_only_library(self, cache_dir):
+        requests = [("int mul_%d(int x) { return x * %d; }" % (i, i), "c", "mul_%d" % i,
+                     [], [], [ctypes.c_int], ctypes.c_int) for i in (2, 3)]
+        fns = compilation.load_batch(requests)
+        assert [fn(3) for fn in fns] == [6, 9]
+        if not cache_dir.listdir("batch_*.so"):
+            pytest.skip("Sources are built into separate libraries on this platform")
+        # Only the library, its build log and errors
+        assert all(f.basename.startswith("batch_") for f in cache_dir.listdir())
+        assert len(cache_dir.listdir()) == 3
+
+    def test_load_tiered(self, cache_dir):
+        src = "int add_three(int x) { return x + 3; }"
+        fn, optimised = compilation.load_tiered(src, "c", "add_three", restype=ctypes.c_int)
+        assert fn(1) == 4
+        optimised.interval = 1
+        start = time.time()
+        fn = optimised.poll()
+        while fn is None:
+            assert time.time() - start < 60
+            time.sleep(0.01)
+            fn = optimised.poll()
+        assert fn(1) == 4
+        assert len(cache_dir.listdir("*.so")) == 2
+        fn, optimised = compilation.load_tiered(src, "c", "add_three", restype=ctypes.c_int)
+        assert fn(1) == 4
+        assert optimised is None
+
+    def test_load_tiered_failure(self, cache_dir):
+        src = "int broken(int x) { return y; }"
+        compiler = compilation._compiler("c", [], [], None, None)
+        compiler.prefetch(src, "c", force=True)
+        fallback = object()
+        optimised = compilation.OptimisedFunction(compiler, src, "c", "broken",
+                                                  None, None, fallback)
+        optimised.interval = 1
+        start = time.time()
+        fn = optimised.poll()
+        while fn is None:
+            assert time.time() - start < 60
+            time.sleep(0.01)
+            fn = optimised.poll()
+        assert fn is fallback
+
+    def test_compilation_stats(self, cache_dir):
+        src = "int add_four(int x) { return x + 4; }"
+        before = op2.compilation_stats()
+        compilation.load(src, "c", "add_four")
+        compilation.load(src, "c", "add_four")
+        stats = op2.compilation_stats()
+        assert stats["disk"]["misses"] == before["disk"]["misses"] + 1
+        assert stats["disk"]["hits"] == before["disk"]["hits"] + 1
+        assert stats["loaded_libraries"] == before["loaded_libraries"] + 1
+        lib = stats["libraries"][-1]
+        assert lib["functions"] == ["add_four"]
+        assert lib["loads"] == 2
+        assert lib["size"] == cache_dir.listdir("*.so")[0].size()
+        assert lib["compile_time"] > 0
+        assert json.loads(json.dumps(stats)) == stats
+
+    def test_prune_max_age(self, cache_dir, libraries, manifest):
+        compilation.prune_cache()
+        compilation._record_access("lib0")
+        compilation.prune_cache(max_age=60)
+        assert cache_dir.join("lib0.so").check()
+        assert not cache_dir.join("lib1.so").check()
+        assert not cache_dir.join("lib2.so").check()
+
 
 class TestSparsityCache:
 
@@ -429,7 +429,14 @@ void comp_vol(double A[1], double *x[], double *y[])
         op2.par_loop(op2.Kernel(kernel_wtf, "kernel_wtf"), elements,
                      dat_coords(op2.READ, coords_map),
                      dat_f(op2.WRITE, field_map))
-        assert all(dat_f.data >= 0)
+
+        coords = dat_coords.data_ro
+        expected = numpy.full(len(dat_f.data_ro), -1.0)
+        for j in range(wedges):
+            nodes = coords_map.values + j * coords_map.offset
+            expected[field_map.values[:, 0] + j * field_map.offset[0]] = \
+                coords[nodes].sum(axis=(1, 2))
+        assert_allclose(dat_f.data_ro, expected)
 
     def test_indirect_coords_inc(self, elements, dat_coords,
                                  dat_field, coords_map, field_map, dat_c,
@@ -523,6 +530,80 @@ void comp_vol(double A[1], double *x[], double *y[])
         assert_allclose(sum(xtr_b.data), 6.0, eps)
 
 
+class TestLayerBatchedExtrusion:
+
+    """
+    Extruded Mesh Tests with layers gathered into batches
+    """
+
+    @pytest.fixture(autouse=True)
+    def layer_batch(self, reconfigure):
+        # Not a divisor of the number of wedges
+        with reconfigure(layer_batch=4):
+            yield
+
+    @staticmethod
+    def _expected_counts(m, size):
+        counts = numpy.zeros(size)
+        for j in range(wedges):
+            numpy.add.at(counts, m.values + j * m.offset, 1)
+        return counts
+
+    def test_batched_inc_shared_layers(self, elements, dat_c, coords_map):
+        """Vertices are shared between adjacent layers of a column."""
+        kernel_count = """void kernel_count(double* x[]) {
+                                                               for (int i=0; i<6; i++){
+                                                                 x[i][0] += 1;
+                                                                 x[i][1] += 2;
+                                                               }
+                                                            }\n"""
+        op2.par_loop(op2.Kernel(kernel_count, "kernel_count"), elements,
+                     dat_c(op2.INC, coords_map))
+
+        counts = self._expected_counts(coords_map, len(dat_c.data))
+        assert all(dat_c.data[:, 0] == counts)
+        assert all(dat_c.data[:, 1] == 2 * counts)
+
+    def test_batched_read_inc(self, elements, dat_coords, dat_field,
+                              coords_map, field_map, dat_c):
+        kernel_scale = """void kernel_scale(double* x[], double* f[], double* y[]) {
+                                                               for (int i=0; i<6; i++){
+                                                                 y[i][0] += f[0][0] * x[i][0];
+                                                                 y[i][1] += f[0][0] * x[i][1];
+                                                               }
+                                                            }\n"""
+        dat_field.data[:] = 2.0
+        op2.par_loop(op2.Kernel(kernel_scale, "kernel_scale"), elements,
+                     dat_coords(op2.READ, coords_map),
+                     dat_field(op2.READ, field_map),
+                     dat_c(op2.INC, coords_map))
+
+        counts = self._expected_counts(coords_map, len(dat_c.data))
+        expected = 2.0 * counts[:, numpy.newaxis] * dat_coords.data_ro
+        assert_allclose(dat_c.data, expected)
+
+    def test_unbatched_write(self, elements, dat_coords, coords_map, field_map, dat_f):
+        """Indirect writes are not batched, but still correct."""
+        kernel_wtf = """void kernel_wtf(double* x[], double* y[]) {
+                                                               double sum = 0.0;
+                                                               for (int i=0; i<6; i++){
+                                                                    sum += x[i][0] + x[i][1];
+                                                               }
+                                                               y[0][0] = sum;
+                                                            }\n"""
+        op2.par_loop(op2.Kernel(kernel_wtf, "kernel_wtf"), elements,
+                     dat_coords(op2.READ, coords_map),
+                     dat_f(op2.WRITE, field_map))
+
+        coords = dat_coords.data_ro
+        expected = numpy.full(len(dat_f.data_ro), -1.0)
+        for j in range(wedges):
+            nodes = coords_map.values + j * coords_map.offset
+            expected[field_map.values[:, 0] + j * field_map.offset[0]] = \
+                coords[nodes].sum(axis=(1, 2))
+        assert_allclose(dat_f.data_ro, expected)
+
+
 if __name__ == '__main__':
     import os
     pytest.main(os.path.abspath(__file__))
@@ -227,6 +227,18 @@ class TestIndirectLoop:
         assert all(expected == edge_vals.data)
 
 
+class TestPackedArgsIndirectLoop(TestIndirectLoop):
+
+    """
+    Indirect Loop Tests calling the generated code with packed arguments
+    """
+
+    @pytest.fixture(autouse=True)
+    def packed_args(self, reconfigure):
+        with reconfigure(packed_args=True):
+            yield
+
+
 @pytest.fixture
 def mset(indset, unitset):
     return op2.MixedSet((indset, unitset))
@@ -159,6 +159,217 @@ sum(unsigned int* sum, unsigned int* x)
         assert sum(y.data) == nelems
         assert not base._trace.in_queue(pl_copy)
 
+    def test_write_after_read(self, skip_greedy, iterset):
+        """Forcing a Dat evaluates earlier readers of the loops
+        writing it, and nothing else."""
+        x = op2.Dat(iterset, numpy.zeros(nelems), numpy.uint32, "x")
+        y = op2.Dat(iterset, numpy.zeros(nelems), numpy.uint32, "y")
+        z = op2.Dat(iterset, numpy.zeros(nelems), numpy.uint32, "z")
+        k_set = op2.Kernel("void k_set(unsigned int* x) { *x = 2; }", "k_set")
+        k_copy = op2.Kernel("void k_copy(unsigned int* y, unsigned int* x) { *y = *x; }", "k_copy")
+        k_add = op2.Kernel("void k_add(unsigned int* x) { *x += 1; }", "k_add")
+
+        pl_set = op2.par_loop(k_set, iterset, x(op2.WRITE))
+        pl_copy = op2.par_loop(k_copy, iterset, y(op2.WRITE), x(op2.READ))
+        pl_add = op2.par_loop(k_add, iterset, x(op2.RW))
+        pl_z = op2.par_loop(k_add, iterset, z(op2.RW))
+
+        assert all(x.data_ro == 3)
+        assert not base._trace.in_queue(pl_set)
+        assert not base._trace.in_queue(pl_copy)
+        assert not base._trace.in_queue(pl_add)
+        assert base._trace.in_queue(pl_z)
+        assert all(y._data == 2)
+        assert all(z.data_ro == 1)
+
+    def test_queued_twice(self, skip_greedy, iterset):
+        """The cached zero loop of a Dat may be queued again before
+        it has been executed."""
+        x = op2.Dat(iterset, numpy.ones(nelems), numpy.uint32, "x")
+        g = op2.Global(1, 0, numpy.uint32, "g")
+        k_add = op2.Kernel("void k_add(unsigned int* x) { *x += 1; }", "k_add")
+        k_sum = op2.Kernel("void k_sum(unsigned int* x, unsigned int* g) { *g += *x; }", "k_sum")
+
+        x.zero()
+        op2.par_loop(k_add, iterset, x(op2.RW))
+        op2.par_loop(k_sum, iterset, x(op2.READ), g(op2.INC))
+        x.zero()
+        op2.par_loop(k_add, iterset, x(op2.RW))
+
+        assert all(x.data_ro == 1)
+        assert g.data[0] == nelems
+
+    def test_dead_store_elimination(self, skip_greedy, iterset, reconfigure):
+        x = op2.Dat(iterset, numpy.ones(nelems), numpy.uint32, "x")
+        y = op2.Dat(iterset, numpy.zeros(nelems), numpy.uint32, "y")
+        k_set = op2.Kernel("void k_set(unsigned int* x) { *x = 2; }", "k_set")
+        k_copy = op2.Kernel("void k_copy(unsigned int* y, unsigned int* x) { *y = *x; }", "k_copy")
+        with reconfigure(dead_store_elimination=True):
+            dead = base._trace.dead_stores
+            x.zero()
+            pl_set = op2.par_loop(k_set, iterset, x(op2.WRITE))
+            op2.par_loop(k_copy, iterset, y(op2.WRITE), x(op2.READ))
+            # Read since: not dead
+            x.zero()
+            assert base._trace.dead_stores == dead + 1
+            assert base._trace.in_queue(pl_set)
+        assert all(y.data_ro == 2)
+        assert all(x.data_ro == 0)
+
+    def test_dead_store_keeps_earlier_writers_ordered(self, skip_greedy, iterset, reconfigure):
+        x = op2.Dat(iterset, numpy.zeros(nelems), numpy.uint32, "x")
+        k_one = op2.Kernel("void k_one(unsigned int* x) { *x = 1; }", "k_one")
+        k_inc = op2.Kernel("void k_inc(unsigned int* x) { *x += 1; }", "k_inc")
+        k_ten = op2.Kernel("void k_ten(unsigned int* x) { *x = 10; }", "k_ten")
+        with reconfigure(dead_store_elimination=True):
+            op2.par_loop(k_one, iterset, x(op2.WRITE))
+            op2.par_loop(k_inc, iterset, x(op2.RW))
+            op2.par_loop(k_ten, iterset, x(op2.WRITE))
+            assert all(x.data_ro == 10)
+            base._trace.evaluate_all()
+            assert all(x.data_ro == 10)
+
+    def test_flush_on_trace_bytes(self, skip_greedy, iterset, reconfigure):
+        x = op2.Dat(iterset, numpy.zeros(nelems), numpy.uint32, "x")
+        y = op2.Dat(iterset, numpy.zeros(nelems), numpy.uint32, "y")
+        k = op2.Kernel("void k(unsigned int *x) { *x += 1; }", "k")
+        with reconfigure(lazy_max_trace_bytes=x.nbytes + y.nbytes):
+            base._trace.evaluate_all()
+            flushes = base._trace.flushes["bytes"]
+            op2.par_loop(k, iterset, x(op2.RW))
+            op2.par_loop(k, iterset, x(op2.RW))
+            op2.par_loop(k, iterset, y(op2.RW))
+            assert base._trace._nbytes == x.nbytes + y.nbytes
+            assert base._trace.flushes["bytes"] == flushes
+            pl = op2.par_loop(k, iterset, x(op2.RW))
+            assert base._trace.flushes["bytes"] == flushes + 1
+            assert base._trace._trace == [pl]
+            assert base._trace._nbytes == x.nbytes
+        assert all(x.data_ro == 3)
+        assert all(y.data_ro == 1)
+
+    def test_concurrent_levels(self, skip_greedy, iterset):
+        x = op2.Dat(iterset, numpy.zeros(nelems), numpy.uint32, "x")
+        y = op2.Dat(iterset, numpy.zeros(nelems), numpy.uint32, "y")
+        a = op2.Global(1, 0, numpy.uint32, "a")
+        k = op2.Kernel("void k(unsigned int *x) { *x += 1; }", "k")
+        k2 = op2.Kernel("void k2(unsigned int *a, unsigned int *x) { *a += *x; }", "k2")
+
+        base._trace.clear()
+        pl_x = op2.par_loop(k, iterset, x(op2.RW))
+        pl_y = op2.par_loop(k, iterset, y(op2.RW))
+        pl_x2 = op2.par_loop(k, iterset, x(op2.RW))
+        pl_a = op2.par_loop(k2, iterset, a(op2.INC), y(op2.READ))
+        pl_y2 = op2.par_loop(k, iterset, y(op2.RW))
+        levels = base._concurrent_levels(base._trace._trace)
+        base._trace.clear()
+        assert levels == [[pl_x, pl_y], [pl_x2], [pl_a], [pl_y2]]
+
+    def test_concurrent_execution(self, skip_greedy, iterset, reconfigure):
+        k = op2.Kernel("void k(unsigned int *x) { *x += 1; }", "k")
+        dats = [op2.Dat(iterset, numpy.zeros(nelems), numpy.uint32) for _ in range(8)]
+        with reconfigure(loop_threads=4):
+            for _ in range(3):
+                for d in dats:
+                    op2.par_loop(k, iterset, d(op2.RW))
+            base._trace.evaluate_all()
+        for d in dats:
+            assert all(d.data_ro == 3)
+
+    def test_parloop_handle(self, iterset):
+        k = op2.Kernel("void k(unsigned int *x) { *x += 1; }", "k")
+        d = op2.Dat(iterset, numpy.zeros(nelems), numpy.uint32)
+        loop = op2.ParLoopHandle(k, iterset, d(op2.RW))
+        for _ in range(3):
+            loop()
+            assert all(d.data_ro == _ + 1)
+
+    def test_parloop_handle_queued_twice(self, skip_greedy, iterset):
+        k = op2.Kernel("void k(unsigned int *x) { *x += 1; }", "k")
+        d = op2.Dat(iterset, numpy.zeros(nelems), numpy.uint32)
+        loop = op2.ParLoopHandle(k, iterset, d(op2.RW))
+        first = loop()
+        second = loop()
+        assert first is loop.loop and second is not first
+        assert base._trace.in_queue(first) and base._trace.in_queue(second)
+        assert all(d.data_ro == 2)
+
+    def test_parloop_handle_dependencies(self, skip_greedy, iterset):
+        a = op2.Dat(iterset, numpy.ones(nelems), numpy.uint32)
+        b = op2.Dat(iterset, numpy.zeros(nelems), numpy.uint32)
+        g = op2.Global(1, 0, numpy.uint32)
+        copy = op2.ParLoopHandle(op2.Kernel("void k(unsigned int *a, unsigned int *b) { *b = *a; }", "k"),
+                                 iterset, a(op2.READ), b(op2.WRITE))
+        total = op2.ParLoopHandle(op2.Kernel("void s(unsigned int *b, unsigned int *g) { *g += *b; }", "s"),
+                                  iterset, b(op2.READ), g(op2.INC))
+        copy()
+        total()
+        a.data[:] = 2
+        copy()
+        total()
+        assert g.data[0] == 3 * nelems
+
+    def test_capture_replay(self, iterset):
+        k_axpy = op2.Kernel("void k_axpy(unsigned int* x, unsigned int* c) { *x += *c; }", "k_axpy")
+        k_add = op2.Kernel("void k_add(unsigned int* x) { *x += 1; }", "k_add")
+        k_sum = op2.Kernel("void k_sum(unsigned int* x, unsigned int* g) { *g += *x; }", "k_sum")
+        x = op2.Dat(iterset, numpy.zeros(nelems), numpy.uint32, "x")
+        y = op2.Dat(iterset, numpy.zeros(nelems), numpy.uint32, "y")
+        c = op2.Global(1, 1, numpy.uint32, "c")
+        g = op2.Global(1, 0, numpy.uint32, "g")
+
+        with op2.capture() as step:
+            op2.par_loop(k_axpy, iterset, x(op2.RW), c(op2.READ))
+            op2.par_loop(k_add, iterset, y(op2.RW))
+            op2.par_loop(k_sum, iterset, x(op2.READ), g(op2.INC))
+        op2.par_loop(k_add, iterset, y(op2.RW))
+        assert len(step) == 3
+        assert all(x.data_ro == 1)
+        assert g.data[0] == nelems
+
+        c.data = 2
+        step.replay()
+        assert all(x.data_ro == 3)
+        assert all(y.data_ro == 3)
+        assert g.data[0] == 3 * nelems
+
+    def test_expression_pending_across_replay(self, iterset):
+        k_add = op2.Kernel("void k_add(unsigned int* x) { *x += 1; }", "k_add")
+        x = op2.Dat(iterset, numpy.zeros(nelems), numpy.uint32, "x")
+        y = op2.Dat(iterset, numpy.ones(nelems), numpy.uint32, "y")
+
+        with op2.capture() as step:
+            op2.par_loop(k_add, iterset, x(op2.RW))
+        z = x + y
+        step.replay()
+        assert all(z.data_ro == 2)
+        assert all(x.data_ro == 2)
+
+    def test_compile_trace(self, skip_greedy, iterset, reconfigure):
+        from pyop2 import trace
+        k = op2.Kernel("void k(unsigned int *x) { *x += 1; }", "k")
+        s = op2.Kernel("void s(unsigned int *x, unsigned int *g) { *g += *x; }", "s")
+        a = op2.Dat(iterset, numpy.zeros(nelems), numpy.uint32)
+        b = op2.Dat(iterset, numpy.zeros(nelems), numpy.uint32)
+        g = op2.Global(1, 0, numpy.uint32)
+        with reconfigure(compile_trace=True):
+            for step in range(2):
+                op2.par_loop(k, iterset, a(op2.RW))
+                op2.par_loop(k, iterset, b(op2.RW))
+                op2.par_loop(s, iterset, a(op2.READ), g(op2.INC))
+                op2.par_loop(k, iterset, a(op2.RW))
+                op2.par_loop(k, iterset, b(op2.RW))
+                base._trace.evaluate_all()
+                if step == 0:
+                    ncached = len(trace.TraceModule._cache)
+                    sequence = next(reversed(trace._sequences.values()))
+        assert len(trace.TraceModule._cache) == ncached
+        # The reduction is fused, and the sequence reused
+        assert len(sequence.loops) == 5
+        assert next(reversed(trace._sequences.values())) is sequence
+        assert all(a.data_ro == 4) and all(b.data_ro == 4)
+        assert g.data[0] == 4 * nelems
+
 
 if __name__ == '__main__':
     import os
@@ -36,7 +36,7 @@ from __future__ import absolute_import, print_function, division
 import pytest
 import numpy as np
 
-from pyop2 import op2
+from pyop2 import op2, base
 
 nelems = 8
 
@@ -290,6 +290,41 @@ class TestLinAlgIop:
         assert yi.data.dtype == np.int64
 
 
+class TestLinAlgExpression:
+
+    """
+    Tests of fused pointwise expressions.
+    """
+
+    def test_fused_expression(self, x, y):
+        x._data = 2 * y.data
+        z = x * y + 2.0 * x - y / x
+        assert all(z.data == 2 * y.data * y.data + 4 * y.data - 0.5)
+
+    def test_expression_kernel_cached(self, x, y):
+        x._data = 2 * y.data
+        nkernels = len(base._expression_kernels)
+        z = (x + y) * x
+        assert all(z.data == 6 * y.data * y.data)
+        assert len(base._expression_kernels) == nkernels + 1
+        w = (y + x) * y
+        assert all(w.data == 3 * y.data * y.data)
+        assert len(base._expression_kernels) == nkernels + 1
+
+    def test_expression_reads_old_values(self, x, y):
+        x._data = 2 * y.data
+        z = x + y
+        x += y
+        assert all(z.data == 3 * y.data)
+        assert all(x.data == 3 * y.data)
+
+    def test_iop_pending_expression(self, x, y):
+        x._data = 2 * y.data
+        z = x - y
+        z *= x
+        assert all(z.data == 2 * y.data * y.data)
+
+
 class TestLinAlgScalar:
 
     """
@@ -0,0 +1,176 @@
+# This file is part of PyOP2
+#
+# PyOP2 is Copyright (c) 2012, Imperial College London and
+# others. Please see the AUTHORS file in the main source directory for
+# a full list of copyright holders.  All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * The name of Imperial College London or that of other
+#       contributors may not be used to endorse or promote products
+#       derived from this software without specific prior written
+#       permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTERS
+# ''AS IS'' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDERS OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED
+# OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""Tests for the OpenMP backend."""
+
+from __future__ import absolute_import, print_function, division
+
+import pytest
+import numpy as np
+
+from pyop2 import op2
+from pyop2 import openmp, sequential
+
+
+nnodes = 1024
+nedges = nnodes - 1
+
+
+@pytest.fixture(autouse=True)
+def use_openmp(reconfigure):
+    with reconfigure(openmp=True):
+        yield
+
+
+@pytest.fixture
+def nodes():
+    return op2.Set(nnodes, "nodes")
+
+
+@pytest.fixture
+def edges():
+    return op2.Set(nedges, "edges")
+
+
+@pytest.fixture
+def edge2node(edges, nodes):
+    return op2.Map(edges, nodes, 2,
+                   np.array([(i, i + 1) for i in range(nedges)], dtype=np.int32),
+                   "edge2node")
+
+
+class TestOpenMPLoops:
+
+    """
+    OpenMP par_loop tests
+    """
+
+    def test_backend_objects(self, nodes):
+        assert isinstance(op2.Dat(nodes, dtype=np.float64)(op2.READ), openmp.Arg)
+
+    def test_switch_per_loop(self, nodes, reconfigure):
+        d = op2.Dat(nodes, np.arange(nnodes, dtype=np.float64))
+        k = op2.Kernel("void k(double *d) { *d += 1.0; }", "k")
+        with reconfigure(openmp=False):
+            pl = op2.par_loop(k, nodes, d(op2.RW))
+        assert type(pl) is sequential.ParLoop
+        pl = op2.par_loop(k, nodes, d(op2.RW))
+        assert type(pl) is openmp.ParLoop
+        assert np.allclose(d.data_ro, np.arange(nnodes) + 2.0)
+
+    def test_direct_loop(self, nodes):
+        d = op2.Dat(nodes, np.arange(nnodes, dtype=np.float64))
+        k = op2.Kernel("void k(double *d) { *d *= 2.0; }", "k")
+        op2.par_loop(k, nodes, d(op2.RW))
+        assert np.allclose(d.data_ro, 2.0 * np.arange(nnodes))
+
+    def test_indirect_inc(self, edges, nodes, edge2node):
+        d = op2.Dat(nodes, dtype=np.float64)
+        k = op2.Kernel("void k(double *d[1]) { d[0][0] += 1.0; d[1][0] += 1.0; }", "k")
+        op2.par_loop(k, edges, d(op2.INC, edge2node))
+        expected = np.full(nnodes, 2.0)
+        expected[[0, -1]] = 1.0
+        assert np.allclose(d.data_ro, expected)
+
+    def test_indirect_inc_subset(self, edges, nodes, edge2node):
+        d = op2.Dat(nodes, dtype=np.float64)
+        ss = op2.Subset(edges, np.arange(0, nedges, 2, dtype=np.int32))
+        k = op2.Kernel("void k(double *d[1]) { d[0][0] += 1.0; d[1][0] += 1.0; }", "k")
+        op2.par_loop(k, ss, d(op2.INC, edge2node))
+        assert np.allclose(d.data_ro[:2 * len(ss.indices)], 1.0)
+
+    def test_global_reduction(self, edges, nodes, edge2node):
+        d = op2.Dat(nodes, np.ones(nnodes, dtype=np.float64))
+        g = op2.Global(1, 0.0, np.float64)
+        k = op2.Kernel("void k(double *d[1], double *g) { *g += d[0][0] + d[1][0]; }", "k")
+        op2.par_loop(k, edges, d(op2.READ, edge2node), g(op2.INC))
+        assert g.data[0] == 2.0 * nedges
+
+
+class TestAtomicIncrements:
+
+    """
+    OpenMP par_loop tests with atomic increments
+    """
+
+    def test_vec_map_inc(self, edges, nodes, edge2node):
+        d = op2.Dat(nodes, dtype=np.float64)
+        k = op2.Kernel("void k(double *d[1]) { d[0][0] += 1.0; d[1][0] += 1.0; }", "k")
+        pl = op2.par_loop(k, edges, d(op2.INC, edge2node), atomic_inc=True)
+        assert pl._atomic_inc
+        assert pl._plan.ncolours == 1
+        expected = np.full(nnodes, 2.0)
+        expected[[0, -1]] = 1.0
+        assert np.allclose(d.data_ro, expected)
+
+    def test_indexed_map_inc(self, edges, nodes, edge2node):
+        d = op2.Dat(nodes ** 2, dtype=np.float64)
+        k = op2.Kernel("""void k(double *a, double *b) {
+        a[0] += 1.0; a[1] += 2.0; b[0] += 1.0; b[1] += 2.0; }""", "k")
+        op2.par_loop(k, edges, d(op2.INC, edge2node[0]), d(op2.INC, edge2node[1]),
+                     atomic_inc=True)
+        expected = np.full((nnodes, 2), [2.0, 4.0])
+        expected[[0, -1]] = [1.0, 2.0]
+        assert np.allclose(d.data_ro, expected)
+
+    def test_itspace_inc(self, edges, nodes, edge2node):
+        d = op2.Dat(nodes, dtype=np.float64)
+        k = op2.Kernel("void k(double *d) { d[0] += 1.0; d[1] += 1.0; }", "k")
+        op2.par_loop(k, edges, d(op2.INC, edge2node[op2.i[0]]), atomic_inc=True)
+        expected = np.full(nnodes, 2.0)
+        expected[[0, -1]] = 1.0
+        assert np.allclose(d.data_ro, expected)
+
+    def test_configuration(self, edges, nodes, edge2node, reconfigure):
+        d = op2.Dat(nodes, dtype=np.float64)
+        k = op2.Kernel("void k(double *d[1]) { d[0][0] += 1.0; }", "k")
+        with reconfigure(openmp_atomics=True):
+            assert op2.par_loop(k, edges, d(op2.INC, edge2node))._atomic_inc
+            assert not op2.par_loop(k, edges, d(op2.INC, edge2node),
+                                    atomic_inc=False)._atomic_inc
+
+    def test_rw_is_coloured(self, edges, nodes, edge2node):
+        d = op2.Dat(nodes, dtype=np.float64)
+        k = op2.Kernel("void k(double *a, double *b) { *a += 1.0; *b += 1.0; }", "k")
+        pl = op2.par_loop(k, edges, d(op2.INC, edge2node[0]), d(op2.RW, edge2node[1]),
+                          atomic_inc=True)
+        assert not pl._atomic_inc
+        expected = np.full(nnodes, 2.0)
+        expected[[0, -1]] = 1.0
+        assert np.allclose(d.data_ro, expected)
+
+
+if __name__ == '__main__':
+    import os
+    pytest.main(os.path.abspath(__file__))
@@ -0,0 +1,145 @@
+# This file is part of PyOP2
+#
+# PyOP2 is Copyright (c) 2012, Imperial College London and
+# others. Please see the AUTHORS file in the main source directory for
+# a full list of copyright holders.  All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * The name of Imperial College London or that of other
+#       contributors may not be used to endorse or promote products
+#       derived from this software without specific prior written
+#       permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTERS
+# ''AS IS'' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDERS OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED
+# OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""Tests for the partitioning and colouring of iteration sets."""
+
+from __future__ import absolute_import, print_function, division
+
+import pytest
+import numpy as np
+
+from pyop2 import op2
+from pyop2.plan import Plan, colour
+
+
+nnodes = 1024
+nedges = nnodes - 1
+
+
+@pytest.fixture
+def nodes():
+    return op2.Set(nnodes, "nodes")
+
+
+@pytest.fixture
+def edges():
+    return op2.Set(nedges, "edges")
+
+
+@pytest.fixture
+def edge2node(edges, nodes):
+    values = np.array([(i, i + 1) for i in range(nedges)], dtype=np.int32)
+    np.random.RandomState(0).shuffle(values)
+    return op2.Map(edges, nodes, 2, values, "edge2node")
+
+
+@pytest.fixture
+def dat(nodes):
+    return op2.Dat(nodes, dtype=np.float64)
+
+
+def assert_no_conflicts(targets):
+    targets = np.concatenate([np.unique(t) for t in targets] + [np.empty(0, dtype=int)])
+    assert len(targets) == len(np.unique(targets))
+
+
+class TestColour:
+
+    """
+    Colouring tests
+    """
+
+    @pytest.mark.parametrize(('n', 'ntargets'),
+                             [(0, 10), (1000, 300), (200, 10)])
+    def test_colour_valid(self, n, ntargets):
+        rng = np.random.RandomState(0)
+        ptr = np.concatenate(([0], np.cumsum(rng.randint(0, 6, size=n))))
+        targets = rng.randint(0, ntargets, size=ptr[-1])
+        colours = colour(ptr, targets, ntargets)
+        assert colours.shape == (n, )
+        for c in np.unique(colours):
+            assert_no_conflicts([targets[ptr[i]:ptr[i+1]] for i in np.where(colours == c)[0]])
+
+    def test_colour_more_than_64_colours(self):
+        """All items touch the same target, so every item needs a
+        colour of its own."""
+        colours = colour(np.arange(101), np.zeros(100, dtype=int), 1)
+        assert sorted(colours) == list(range(100))
+
+
+class TestPlan:
+
+    """
+    Plan tests
+    """
+
+    def test_plan_cached(self, edges, edge2node, dat):
+        p = Plan(edges, dat(op2.INC, edge2node))
+        assert Plan(edges, dat(op2.INC, edge2node)) is p
+        assert Plan(edges, op2.Dat(dat.dataset)(op2.INC, edge2node)) is p
+
+    def test_plan_not_cached_different_partition_size(self, edges, edge2node, dat):
+        p = Plan(edges, dat(op2.INC, edge2node), partition_size=64)
+        assert Plan(edges, dat(op2.INC, edge2node), partition_size=128) is not p
+
+    def test_plan_blocks(self, edges, edge2node, dat):
+        p = Plan(edges, dat(op2.INC, edge2node), partition_size=64)
+        assert p.nblocks == (nedges + 63) // 64
+        assert p.nelems.sum() == nedges
+        assert p.stats['max_block_size'] == 64
+
+    def test_plan_block_colours(self, edges, edge2node, dat):
+        p = Plan(edges, dat(op2.INC, edge2node), partition_size=64)
+        blkmap, offsets = p.blocks(edges.core_part)
+        assert offsets[-1] - offsets[0] == p.nblocks
+        for c in range(p.ncolours):
+            assert_no_conflicts([edge2node.values[p.offset[b]:p.offset[b] + p.nelems[b]]
+                                 for b in blkmap[offsets[c]:offsets[c+1]]])
+
+    def test_plan_thread_colours(self, edges, edge2node, dat):
+        p = Plan(edges, dat(op2.INC, edge2node), partition_size=64)
+        for b in range(p.nblocks):
+            elements = np.arange(p.offset[b], p.offset[b] + p.nelems[b])
+            for c in range(p.nthrcol[b]):
+                assert_no_conflicts(edge2node.values[elements[p.thrcol[elements] == c]])
+
+    def test_plan_direct_uncoloured(self, edges, edge2node, dat):
+        p = Plan(edges, dat(op2.READ, edge2node))
+        assert p.ncolours == 1
+        assert p.stats['nconflicts'] == 0
+
+
+if __name__ == '__main__':
+    import os
+    pytest.main(os.path.abspath(__file__))
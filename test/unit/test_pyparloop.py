@@ -37,6 +37,7 @@ import pytest
 import numpy as np
 
 from pyop2 import op2
+from pyop2.pyparloop import vectorised
 
 
 @pytest.fixture
@@ -202,6 +203,180 @@ class TestPyParLoop:
         assert (mat.values == expected).all()
 
 
+class TestVectorisedPyParLoop:
+
+    """
+    Vectorised Python par_loop tests
+    """
+
+    def test_direct(self, s1, d1):
+
+        @vectorised
+        def fn(a):
+            a[:] = 1.0
+
+        op2.par_loop(fn, s1, d1(op2.WRITE))
+        assert np.allclose(d1.data, 1.0)
+
+    def test_indirect_read_direct(self, s1, d1, d2, m12):
+        d2.data[:] = range(4)
+
+        @vectorised
+        def fn(a, b):
+            a[:, 0] = b[:, 0, 0] + 1.0
+
+        op2.par_loop(fn, s1, d1(op2.WRITE), d2(op2.READ, m12))
+        assert np.allclose(d1.data, d2.data[m12.values[:, 0]] + 1.0)
+
+    def test_indirect_inc(self, s1, d2, m2):
+        d2.data[:] = 0.0
+
+        @vectorised
+        def fn(a):
+            a[:] += 1.0
+
+        op2.par_loop(fn, s1, d2(op2.INC, m2))
+        assert np.allclose(d2.data, 2.0)
+
+    def test_global_inc(self, s1, d1):
+        d1.data[:] = range(4)
+        g = op2.Global(1, 0.0, dtype=np.float64)
+
+        @vectorised
+        def fn(a, b):
+            a[0] += b.sum()
+
+        op2.par_loop(fn, s1, g(op2.INC), d1(op2.READ))
+        assert g.data[0] == 6.0
+
+    def test_global_read_stays_writable(self, s1, d1):
+        g = op2.Global(1, 2.0, dtype=np.float64)
+
+        @vectorised
+        def fn(a, b):
+            a[:] = b[0]
+
+        op2.par_loop(fn, s1, d1(op2.WRITE), g(op2.READ))
+        assert np.allclose(d1.data, 2.0)
+        g.data = 3.0
+        assert g.data[0] == 3.0
+
+    def test_direct_subset(self, s1, d1):
+        subset = op2.Subset(s1, [1, 3])
+        d1.data[:] = 1.0
+
+        @vectorised
+        def fn(a):
+            a[:] = 0.0
+
+        op2.par_loop(fn, subset, d1(op2.WRITE))
+
+        expect = np.ones_like(d1.data)
+        expect[subset.indices] = 0.0
+        assert np.allclose(d1.data, expect)
+
+    def test_cant_write_to_read(self, s1, d1):
+
+        @vectorised
+        def fn(a):
+            a[:] = 1.0
+
+        with pytest.raises((RuntimeError, ValueError)):
+            op2.par_loop(fn, s1, d1(op2.READ))
+
+    def test_matrix_addto(self, s1, m2, mat):
+
+        @vectorised
+        def fn(a):
+            a[:, :, :] = 1.0
+
+        expected = np.array([[2., 1., 0., 1.],
+                             [1., 2., 1., 0.],
+                             [0., 1., 2., 1.],
+                             [1., 0., 1., 2.]])
+
+        op2.par_loop(fn, s1, mat(op2.INC, (m2[op2.i[0]], m2[op2.i[0]])))
+
+        assert (mat.values == expected).all()
+
+
+class TestNumbaPyParLoop:
+
+    """
+    Numba-compiled Python par_loop tests
+    """
+
+    @pytest.fixture(autouse=True)
+    def numba(self, reconfigure):
+        pytest.importorskip("numba")
+        with reconfigure(numba=True):
+            yield
+
+    def test_direct(self, s1, d1):
+
+        def fn(a):
+            a[0] = 1.0
+
+        op2.par_loop(fn, s1, d1(op2.WRITE))
+        assert np.allclose(d1.data, 1.0)
+
+    def test_indirect_read_direct(self, s1, d1, d2, m12):
+        d2.data[:] = range(4)
+
+        def fn(a, b):
+            a[0] = b[0] + 1.0
+
+        op2.par_loop(fn, s1, d1(op2.WRITE), d2(op2.READ, m12))
+        assert np.allclose(d1.data, d2.data[m12.values[:, 0]] + 1.0)
+
+    def test_indirect_inc(self, s1, d2, m2):
+        d2.data[:] = 0.0
+
+        def fn(a):
+            a[0] += 1.0
+            a[1] += 1.0
+
+        op2.par_loop(fn, s1, d2(op2.INC, m2))
+        assert np.allclose(d2.data, 2.0)
+
+    def test_direct_subset(self, s1, d1):
+        subset = op2.Subset(s1, [1, 3])
+        d1.data[:] = 1.0
+
+        def fn(a):
+            a[0] = 0.0
+
+        op2.par_loop(fn, subset, d1(op2.WRITE))
+
+        expect = np.ones_like(d1.data)
+        expect[subset.indices] = 0.0
+        assert np.allclose(d1.data, expect)
+
+    def test_loop_cached_on_function(self, s1, d1):
+
+        def fn(a):
+            a[0] += 1.0
+
+        op2.par_loop(fn, s1, d1(op2.INC))
+        op2.par_loop(fn, s1, d1(op2.INC))
+        assert np.allclose(d1.data, 2.0)
+        assert len(fn._pyop2_numba_cache) == 1
+
+    def test_matrix_addto(self, s1, m2, mat):
+
+        def fn(a):
+            a[:, :] = 1.0
+
+        expected = np.array([[2., 1., 0., 1.],
+                             [1., 2., 1., 0.],
+                             [0., 1., 2., 1.],
+                             [1., 0., 1., 2.]])
+
+        op2.par_loop(fn, s1, mat(op2.INC, (m2[op2.i[0]], m2[op2.i[0]])))
+
+        assert (mat.values == expected).all()
+
+
 if __name__ == '__main__':
     import os
     pytest.main(os.path.abspath(__file__))
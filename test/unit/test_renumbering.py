@@ -0,0 +1,157 @@
+# This file is part of PyOP2
+#
+# PyOP2 is Copyright (c) 2012, Imperial College London and
+# others. Please see the AUTHORS file in the main source directory for
+# a full list of copyright holders.  All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * The name of Imperial College London or that of other
+#       contributors may not be used to endorse or promote products
+#       derived from this software without specific prior written
+#       permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTERS
+# ''AS IS'' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDERS OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED
+# OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""Tests for the renumbering of sets, maps and dats."""
+
+from __future__ import absolute_import, print_function, division
+
+import pytest
+import numpy as np
+
+from pyop2 import op2
+from pyop2 import renumbering
+from pyop2.exceptions import MapValueError, SetValueError
+
+n = 16
+
+
+@pytest.fixture
+def quads():
+    return op2.Set((n - 1) ** 2, "quads")
+
+
+@pytest.fixture
+def vertices():
+    return op2.Set(n * n, "vertices")
+
+
+@pytest.fixture
+def shuffle():
+    return np.random.RandomState(0).permutation(n * n)
+
+
+@pytest.fixture
+def quad2vertex(quads, vertices, shuffle):
+    v = np.arange(n * n).reshape(n, n)
+    values = np.stack([v[:-1, :-1].ravel(), v[1:, :-1].ravel(),
+                       v[1:, 1:].ravel(), v[:-1, 1:].ravel()], axis=1)
+    return op2.Map(quads, vertices, 4, shuffle[values], "quad2vertex")
+
+
+@pytest.fixture
+def coords(vertices, shuffle):
+    x, y = np.meshgrid(np.arange(n, dtype=np.float64), np.arange(n, dtype=np.float64),
+                       indexing='ij')
+    data = np.empty((n * n, 2))
+    data[shuffle] = np.stack([x.ravel(), y.ravel()], axis=1)
+    return op2.Dat(vertices ** 2, data, np.float64, "coords")
+
+
+def bandwidth(m):
+    return (m.values.max(axis=1) - m.values.min(axis=1)).max()
+
+
+class TestRenumbering:
+
+    """
+    Renumbering tests
+    """
+
+    def test_rcm_reduces_bandwidth(self, vertices, quad2vertex):
+        before = bandwidth(quad2vertex)
+        renumbering.renumber(renumbering.rcm(vertices, [quad2vertex]),
+                             maps=[quad2vertex])
+        assert bandwidth(quad2vertex) < before
+        assert bandwidth(quad2vertex) <= 2 * n + 2
+
+    def test_morton_reduces_bandwidth(self, vertices, quad2vertex, coords):
+        before = bandwidth(quad2vertex)
+        renumbering.renumber(renumbering.morton(vertices, coords),
+                             maps=[quad2vertex], dats=[coords])
+        assert bandwidth(quad2vertex) < before
+
+    def test_renumber_preserves_data(self, vertices, quad2vertex, coords):
+        expect = coords.data_ro[quad2vertex.values]
+        r = renumbering.rcm(vertices, [quad2vertex])
+        renumbering.renumber(r, maps=[quad2vertex], dats=[coords])
+        assert (coords.data_ro[quad2vertex.values] == expect).all()
+
+    def test_renumber_iterset(self, quads, quad2vertex):
+        expect = quad2vertex.values.copy()
+        r = renumbering.rcm(quads, [quad2vertex])
+        renumbering.renumber(r, maps=[quad2vertex])
+        assert (quad2vertex.values == expect[r.perm]).all()
+
+    def test_to_original(self, vertices, quad2vertex, coords):
+        expect = coords.data_ro.copy()
+        r = renumbering.rcm(vertices, [quad2vertex])
+        renumbering.renumber(r, dats=[coords])
+        assert (r.to_original(coords.data_ro) == expect).all()
+        assert (r.from_original(expect) == coords.data_ro).all()
+
+    def test_par_loop_after_renumber(self, quads, vertices, quad2vertex):
+        count = op2.Dat(vertices, dtype=np.int32)
+        r = renumbering.rcm(vertices, [quad2vertex])
+        renumbering.renumber(r, maps=[quad2vertex], dats=[count])
+        k = op2.Kernel("void k(int *c[1]) { for (int i = 0; i < 4; i++) c[i][0]++; }", "k")
+        op2.par_loop(k, quads, count(op2.INC, quad2vertex))
+        expect = np.bincount(quad2vertex.values.reshape(-1), minlength=n * n)
+        assert (count.data_ro == expect).all()
+
+    def test_partitions_preserved(self):
+        s = op2.Set((4, 8, 10, 12))
+        m = op2.Map(s, s, 2, np.stack([np.arange(12), (np.arange(12) + 5) % 12], axis=1))
+        r = renumbering.rcm(s, [m])
+        for lo, hi in [(0, 4), (4, 8), (8, 10), (10, 12)]:
+            assert sorted(r.perm[lo:hi]) == list(range(lo, hi))
+
+    def test_invalid_permutation(self, vertices):
+        with pytest.raises(SetValueError):
+            renumbering.Renumbering(vertices, np.zeros(n * n))
+
+    def test_permutation_across_parts(self):
+        s = op2.Set((2, 4, 4, 4))
+        with pytest.raises(SetValueError):
+            renumbering.Renumbering(s, [2, 1, 0, 3])
+
+    def test_unrelated_map(self, quads, vertices):
+        other = op2.Set(3)
+        m = op2.Map(other, other, 1, [0, 1, 2])
+        with pytest.raises(MapValueError):
+            renumbering.rcm(vertices, [m])
+
+
+if __name__ == '__main__':
+    import os
+    pytest.main(os.path.abspath(__file__))
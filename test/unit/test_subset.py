@@ -210,6 +210,39 @@ inc(unsigned int* v1, unsigned int* v2) {
         assert np.sum(dat1.data) == nelems
         assert np.sum(dat2.data) == nelems
 
+    def test_ranges(self, iterset):
+        """Subsets made of long runs are stored as ranges"""
+        ss = op2.Subset(iterset, np.r_[0:10, 20:30])
+        assert (ss._ranges == [[0, 0], [10, 20], [20, 30]]).all()
+        assert iterset(np.arange(0, nelems, 2))._ranges is None
+
+    def test_ranges_sub_subset(self, iterset):
+        """Composed subsets keep their runs"""
+        ss = op2.Subset(iterset, np.r_[0:10, 20:30])
+        sss = ss(np.r_[5:15])
+        assert (sss.indices == np.r_[5:10, 20:25]).all()
+        assert (sss._ranges == [[0, 5], [5, 20], [10, 25]]).all()
+
+    def test_direct_indirect_loop_ranges(self, iterset):
+        """Test par_loops over a subset passed as ranges"""
+        indices = np.r_[1:9, 12:17, 20:31]
+        ss = op2.Subset(iterset, indices)
+        assert ss._ranges is not None
+
+        indset = op2.Set(nelems, "indset")
+        map = op2.Map(iterset, indset, 1, [nelems - 1 - i for i in range(nelems)])
+        dat1 = op2.Dat(iterset ** 1, data=np.arange(nelems), dtype=np.uint32)
+        dat2 = op2.Dat(indset ** 1, data=None, dtype=np.uint32)
+
+        k = op2.Kernel("void inc(unsigned int* v, unsigned int* d) { *d += *v; *v = 0; }", "inc")
+        op2.par_loop(k, ss, dat1(op2.RW), dat2(op2.INC, map[0]))
+
+        expected = np.arange(nelems)
+        expected[indices] = 0
+        assert (dat1.data == expected).all()
+        assert (dat2.data[nelems - 1 - indices] == indices).all()
+        assert dat2.data.sum() == indices.sum()
+
     def test_matrix(self):
         """Test a indirect par_loop with a matrix argument"""
         iterset = op2.Set(2)
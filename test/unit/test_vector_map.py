@@ -35,8 +35,9 @@ from __future__ import absolute_import, print_function, division
 
 import pytest
 import numpy
+import re
 
-from pyop2 import op2
+from pyop2 import op2, base
 
 
 def _seed():
@@ -234,6 +235,80 @@ void kernel_sum(unsigned int* nodes[1], unsigned int *edge)
         assert all(vd2.data[:, 1] == expected[:, 1])
 
 
+class TestBatchedVectorMap:
+
+    """
+    Vector Map Tests with elements gathered into batches
+    """
+
+    @pytest.fixture(autouse=True)
+    def simd_batch(self, reconfigure):
+        with reconfigure(simd_batch=8):
+            yield
+
+    def test_batched_sum_nodes_to_edges(self):
+        """The number of edges is not a multiple of the batch size."""
+        nedges = nnodes - 1
+        nodes = op2.Set(nnodes, "nodes")
+        edges = op2.Set(nedges, "edges")
+        node_vals = op2.Dat(nodes ** 2, numpy.arange(2 * nnodes, dtype=numpy.float64))
+        edge_vals = op2.Dat(edges, numpy.zeros(nedges, dtype=numpy.float64))
+        edge2node = op2.Map(edges, nodes, 2,
+                            numpy.array([(i, i + 1) for i in range(nedges)], dtype=numpy.int32))
+
+        kernel_sum = """
+void kernel_sum(double *nodes[2], double *edge)
+{ *edge = nodes[0][0] + nodes[0][1] + nodes[1][0] + nodes[1][1]; }
+"""
+        op2.par_loop(op2.Kernel(kernel_sum, "kernel_sum"), edges,
+                     node_vals(op2.READ, edge2node),
+                     edge_vals(op2.WRITE))
+        expected = numpy.arange(nedges) * 8 + 6
+        assert all(edge_vals.data == expected)
+
+    def test_batched_subset(self, node, d2, vd2, node2ele):
+        vd2.data[:] = numpy.arange(nele * 2).reshape(nele, 2)
+        ss = op2.Subset(node, numpy.arange(1, nnodes, 3, dtype=numpy.int32))
+        k = """
+        void k(int *d, int *vd[2]) {
+        d[0] = vd[0][0];
+        d[1] = vd[0][1];
+        }"""
+        op2.par_loop(op2.Kernel(k, 'k'), ss,
+                     d2(op2.WRITE),
+                     vd2(op2.READ, node2ele))
+        assert all(d2.data[ss.indices] == vd2.data[ss.indices // 2])
+
+    def test_batched_wrapper_code(self, node, d1, vd1, node2ele):
+        """The kernel is called for each element of a batch in a loop
+        under ``omp simd``, and defined along with the wrapper, so that
+        the compiler can inline it and vectorise the loop."""
+        k = """
+        void k_simd_code(int *d, int *vd[1]) {
+        d[0] = vd[0][0];
+        }"""
+        pl = base._build_par_loop(op2.Kernel(k, 'k_simd_code'), node,
+                                  d1(op2.WRITE),
+                                  vd1(op2.READ, node2ele))
+        code = pl._make_jitmodule(delay=True)._build_args()[0]
+        assert code.index("void k_simd_code(") < code.index("void wrap_k_simd_code(")
+        assert re.search(r"#pragma omp simd\s*"
+                         r"for \( int l = 0; l < 8; l\+\+ \) \{[^}]*"
+                         r"k_simd_code\(", code)
+
+    def test_unbatched_inc(self, node, d1, vd1, node2ele):
+        """Indirect increments are not batched, but still correct."""
+        d1.data[:] = 1
+        k = """
+        void k(int *d, int *vd[1]) {
+        vd[0][0] += *d;
+        }"""
+        op2.par_loop(op2.Kernel(k, 'k'), node,
+                     d1(op2.READ),
+                     vd1(op2.INC, node2ele))
+        assert all(vd1.data == 2)
+
+
 if __name__ == '__main__':
     import os
     pytest.main(os.path.abspath(__file__))